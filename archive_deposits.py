@@ -0,0 +1,139 @@
+"""
+Перенос закрытых и отклоненных вкладов в холодный архив.
+
+Вклады со статусом closed/rejected, закрытые (для отклоненных - открытые)
+раньше даты отсечки, вместе с их операциями переносятся в
+deposits_archive и transactions_archive. Каждая пачка - одна
+транзакция с одним SQL-оператором, поэтому прерванный перенос
+безопасен: следующий запуск просто продолжит с оставшихся вкладов.
+Клиентам пачки после фиксации приходит событие 'archived' (deposit_events).
+
+    python archive_deposits.py                      # старше года
+    python archive_deposits.py --before 2023-01-01 --batch-size 5000
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional
+
+import psycopg2
+
+from config import DB_CONFIG
+
+ARCHIVE_BATCH_SQL = """
+    WITH batch AS (
+        SELECT id FROM deposits
+        WHERE status IN ('closed', 'rejected')
+          AND COALESCE(close_date, open_date) < %(cutoff)s
+        ORDER BY id
+        LIMIT %(limit)s
+        FOR UPDATE SKIP LOCKED
+    ),
+    moved_transactions AS (
+        DELETE FROM transactions t USING batch b
+        WHERE t.deposit_id = b.id
+        RETURNING t.id, t.deposit_id, t.type, t.amount, t.description, t.transaction_date
+    ),
+    archived_transactions AS (
+        INSERT INTO transactions_archive (id, deposit_id, type, amount, description, transaction_date)
+        SELECT * FROM moved_transactions
+        RETURNING 1
+    ),
+    moved_deposits AS (
+        DELETE FROM deposits d USING batch b
+        WHERE d.id = b.id
+        RETURNING d.id, d.client_id, d.deposit_plan_id, d.deposit_type, d.amount, d.interest_rate,
+                  d.open_date, d.close_date, d.status, d.maturity_date, d.auto_renew
+    ),
+    archived_deposits AS (
+        INSERT INTO deposits_archive (id, client_id, deposit_plan_id, deposit_type, amount,
+                                      interest_rate, open_date, close_date, status,
+                                      maturity_date, auto_renew)
+        SELECT * FROM moved_deposits
+        RETURNING 1
+    ),
+    -- DELETE не вызывает trg_deposits_notify: одно событие на клиента пачки,
+    -- чтобы подписчики (кэш сводок, кабинеты) перечитали его вклады
+    notified AS (
+        SELECT pg_notify('deposit_events', json_build_object(
+                   'type', 'archived', 'client_id', client_id, 'deposits', COUNT(*))::text)
+        FROM moved_deposits
+        GROUP BY client_id
+    )
+    SELECT (SELECT COUNT(*) FROM archived_deposits), (SELECT COUNT(*) FROM archived_transactions),
+           (SELECT COUNT(*) FROM notified)
+"""
+
+
+@dataclass
+class ArchiveRunReport:
+    cutoff: date
+    deposits: int = 0
+    transactions: int = 0
+    batches: int = 0
+    duration_seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Дата отсечки: {self.cutoff}\n"
+            f"Перенесено вкладов: {self.deposits}, операций: {self.transactions}\n"
+            f"Пачек: {self.batches}, время: {self.duration_seconds:.1f} с"
+        )
+
+
+def archive_batch(conn, cutoff: date, batch_size: int):
+    """Перенос одной пачки; (вкладов, операций)"""
+    try:
+        with conn.cursor() as cur:
+            cur.execute(ARCHIVE_BATCH_SQL, {'cutoff': cutoff, 'limit': batch_size})
+            result = cur.fetchone()[:2]
+        conn.commit()
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def run_archival(db_config: dict = DB_CONFIG, cutoff: Optional[date] = None,
+                 batch_size: int = 1000, max_batches: Optional[int] = None,
+                 pause_seconds: float = 0.0) -> ArchiveRunReport:
+    """Перенос всех подходящих вкладов пачками до исчерпания (или max_batches)"""
+    cutoff = cutoff or date.today() - timedelta(days=365)
+    report = ArchiveRunReport(cutoff=cutoff)
+    started = time.perf_counter()
+
+    conn = psycopg2.connect(**db_config)
+    try:
+        while max_batches is None or report.batches < max_batches:
+            deposits, transactions = archive_batch(conn, cutoff, batch_size)
+            if not deposits:
+                break
+            report.deposits += deposits
+            report.transactions += transactions
+            report.batches += 1
+            # Пауза между пачками снижает нагрузку на рабочую базу
+            if pause_seconds:
+                time.sleep(pause_seconds)
+    finally:
+        conn.close()
+
+    report.duration_seconds = time.perf_counter() - started
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Архивация закрытых и отклоненных вкладов")
+    parser.add_argument("--before", type=date.fromisoformat, default=None,
+                        help="дата отсечки (по умолчанию - год назад)")
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--max-batches", type=int, default=None)
+    parser.add_argument("--pause", type=float, default=0.0, help="пауза между пачками, с")
+    args = parser.parse_args()
+
+    report = run_archival(DB_CONFIG, args.before, args.batch_size, args.max_batches, args.pause)
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
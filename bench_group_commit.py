@@ -0,0 +1,109 @@
+"""
+Нагрузочный тест записи: "всплеск" одновременных create_client с групповой
+фиксацией и без нее.
+
+Без групповой фиксации каждый поток пишет через свое соединение и делает
+свой COMMIT (свой fsync WAL); с ней все потоки пишут через один
+DatabaseManager, и операции фиксируются пачками. Созданные клиенты
+удаляются после замера.
+
+    python bench_group_commit.py --concurrency 64 --requests 5000
+    python bench_group_commit.py --mode group --interval-ms 2
+"""
+import argparse
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench_login import describe
+from config import DB_CONFIG
+from database.database_manager import DatabaseManager
+from database.models import Client
+
+
+def make_client(prefix: str, n: int) -> Client:
+    return Client(id=None, full_name=f"Bench Client {n}", passport_data=f"{prefix}{n:08d}",
+                  phone_number="0", email="", address="")
+
+
+def timed_write(db, client):
+    start = time.perf_counter()
+    try:
+        db.create_client(client)
+        status = "ok"
+    except Exception as e:
+        status = type(e).__name__
+    return status, time.perf_counter() - start
+
+
+def run_burst(mode: str, prefix: str, concurrency: int, requests: int,
+              interval_ms: float) -> tuple:
+    """(результаты (статус, задержка), время всплеска) для режима direct/group"""
+    managers = []
+    local = threading.local()
+    lock = threading.Lock()
+
+    def manager():
+        # direct - свое соединение на поток, group - общий писатель
+        if mode == 'group':
+            return managers[0]
+        if not hasattr(local, 'db'):
+            local.db = DatabaseManager(DB_CONFIG, create_schema=False)
+            with lock:
+                managers.append(local.db)
+        return local.db
+
+    if mode == 'group':
+        db = DatabaseManager(DB_CONFIG, create_schema=False)
+        db.enable_group_commit(interval_ms)
+        managers.append(db)
+
+    try:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            # Соединения по возможности открываются до замера, чтобы не мерить connect()
+            if mode == 'direct':
+                list(pool.map(lambda _: manager(), range(concurrency)))
+            start = time.perf_counter()
+            futures = [pool.submit(lambda n=n: timed_write(manager(), make_client(prefix, n)))
+                       for n in range(requests)]
+            results = [f.result() for f in futures]
+            elapsed = time.perf_counter() - start
+    finally:
+        for db in managers:
+            db.close()
+    return results, elapsed
+
+
+def cleanup(prefix: str):
+    db = DatabaseManager(DB_CONFIG, create_schema=False)
+    try:
+        with db.conn.cursor() as cur:
+            cur.execute("DELETE FROM clients WHERE passport_data LIKE %s", (prefix + '%',))
+        db.conn.commit()
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк групповой фиксации записей")
+    parser.add_argument("--mode", choices=['direct', 'group', 'both'], default='both')
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--interval-ms", type=float, default=5)
+    args = parser.parse_args()
+
+    modes = ['direct', 'group'] if args.mode == 'both' else [args.mode]
+    for mode in modes:
+        # Паспорт уникален: свой префикс на каждый режим и запуск (до 20 символов)
+        prefix = f"GC{mode[0].upper()}{int(time.time()) % 100000:05d}"
+        try:
+            results, elapsed = run_burst(mode, prefix, args.concurrency, args.requests,
+                                         args.interval_ms)
+        finally:
+            cleanup(prefix)
+        describe(f"create_client ({mode})", [lat for _, lat in results],
+                 [status for status, _ in results], elapsed)
+
+
+if __name__ == "__main__":
+    main()
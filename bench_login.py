@@ -0,0 +1,114 @@
+"""
+Нагрузочный тест входа: "шторм" логинов и задержка остальных маршрутов.
+
+Параллельно с потоком /api/login опрашивается /api/plans, чтобы видеть,
+не вытесняет ли проверка паролей другие запросы.
+
+    python bench_login.py --email user@example.com --password secret
+    python bench_login.py --register --concurrency 64 --requests 2000
+"""
+import argparse
+import json
+import statistics
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+
+def post_json(url, payload):
+    req = urllib.request.Request(url, data=json.dumps(payload).encode('utf-8'),
+                                 headers={'Content-Type': 'application/json'})
+    try:
+        with urllib.request.urlopen(req, timeout=30) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def get(url):
+    try:
+        with urllib.request.urlopen(url, timeout=30) as resp:
+            resp.read()
+            return resp.status
+    except urllib.error.HTTPError as e:
+        return e.code
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    status = func(*args)
+    return status, time.perf_counter() - start
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    index = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+def describe(name, latencies, statuses, elapsed):
+    print(f"{name}:")
+    print(f"  запросов: {len(latencies)}, {len(latencies) / elapsed:.1f} rps")
+    print(f"  p50 {percentile(latencies, 50) * 1000:.1f} мс, "
+          f"p95 {percentile(latencies, 95) * 1000:.1f} мс, "
+          f"p99 {percentile(latencies, 99) * 1000:.1f} мс")
+    codes = {}
+    for status in statuses:
+        codes[status] = codes.get(status, 0) + 1
+    print(f"  коды ответов: {dict(sorted(codes.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк пропускной способности входа")
+    parser.add_argument("--url", default="http://127.0.0.1:5000")
+    parser.add_argument("--email", default="bench@example.com")
+    parser.add_argument("--password", default="bench-password")
+    parser.add_argument("--register", action="store_true",
+                        help="создать тестового клиента перед замером")
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    if args.register:
+        post_json(f"{args.url}/api/register", {
+            "full_name": "Bench User", "passport": f"BENCH{int(time.time())}",
+            "phone": "0", "email": args.email, "password": args.password,
+        })
+
+    login_payload = {"email": args.email, "password": args.password}
+    login_results = []
+    probe_results = []
+    done = threading.Event()
+
+    def probe_other_routes():
+        # Фоновый опрос "легкого" маршрута на протяжении всего шторма
+        while not done.is_set():
+            probe_results.append(timed(get, f"{args.url}/api/plans"))
+            time.sleep(0.05)
+
+    probe = threading.Thread(target=probe_other_routes, daemon=True)
+    start = time.perf_counter()
+    probe.start()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        futures = [pool.submit(timed, post_json, f"{args.url}/api/login", login_payload)
+                   for _ in range(args.requests)]
+        login_results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+    done.set()
+    probe.join()
+
+    describe("/api/login", [lat for _, lat in login_results],
+             [status for status, _ in login_results], elapsed)
+    describe("/api/plans во время шторма", [lat for _, lat in probe_results],
+             [status for status, _ in probe_results], elapsed)
+    if probe_results:
+        print(f"  среднее: {statistics.mean(lat for _, lat in probe_results) * 1000:.1f} мс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Инкрементальное построение снимков остатков (см. database/snapshots.py).
+
+Строятся снимки по завершенные дни: по умолчанию по вчера включительно.
+Операции могут появляться задним числом (например, закрытие по сроку
+при запуске планировщика с опозданием), поэтому каждый запуск
+перестраивает последние --lookback-days дней; для большего охвата -
+--rebuild-from.
+
+    python build_snapshots.py                        # ежедневно, после maturity_scheduler.py
+    python build_snapshots.py --rebuild-from 2024-01-01
+"""
+import argparse
+import time
+from dataclasses import dataclass
+from datetime import date, timedelta
+from typing import Optional
+
+import psycopg2
+
+from config import DB_CONFIG
+from database.snapshots import build_deposit_snapshots, build_portfolio_snapshots
+
+
+@dataclass
+class SnapshotRunReport:
+    through: date
+    rebuild_from: Optional[date]
+    deposit_months: int = 0
+    portfolio_days: int = 0
+    duration_seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Снимки по {self.through} (перестроены с {self.rebuild_from or '-'})\n"
+            f"Месяцев по вкладам: {self.deposit_months}, дней по портфелю: {self.portfolio_days}\n"
+            f"Время: {self.duration_seconds:.1f} с"
+        )
+
+
+def run_snapshots(db_config: dict = DB_CONFIG, through: Optional[date] = None,
+                  rebuild_from: Optional[date] = None, lookback_days: int = 7) -> SnapshotRunReport:
+    through = through or date.today() - timedelta(days=1)
+    if rebuild_from is None and lookback_days:
+        rebuild_from = through - timedelta(days=lookback_days)
+    report = SnapshotRunReport(through=through, rebuild_from=rebuild_from)
+    started = time.perf_counter()
+
+    conn = psycopg2.connect(**db_config)
+    try:
+        report.deposit_months = build_deposit_snapshots(conn, through, rebuild_from)
+        report.portfolio_days = build_portfolio_snapshots(conn, through, rebuild_from)
+    finally:
+        conn.close()
+
+    report.duration_seconds = time.perf_counter() - started
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Построение снимков остатков вкладов и портфеля")
+    parser.add_argument("--through", type=date.fromisoformat, default=None,
+                        help="последний день снимков (по умолчанию вчера)")
+    parser.add_argument("--rebuild-from", type=date.fromisoformat, default=None,
+                        help="перестроить снимки начиная с этой даты")
+    parser.add_argument("--lookback-days", type=int, default=7,
+                        help="сколько последних дней перестраивать без --rebuild-from")
+    args = parser.parse_args()
+
+    report = run_snapshots(DB_CONFIG, args.through, args.rebuild_from, args.lookback_days)
+    print(report.summary())
+
+
+if __name__ == "__main__":
+    main()
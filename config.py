@@ -1,4 +1,6 @@
 # Конфигурация приложения
+import os
+
 DB_CONFIG = {
     'dbname': 'deposit_system',
     'user': 'postgres', 
@@ -21,4 +23,66 @@ DEFAULT_INTEREST_RATES = {
     "Валютный": 3.0,
     "Накопительный с капитализацией": 6.0,
     "Пенсионный": 6.5
-}
\ No newline at end of file
+}
+
+# Кэш ответов API по версии данных (ETag)
+RESPONSE_CACHE_ENABLED = True
+RESPONSE_CACHE_MAX_ENTRIES = 1024
+
+# Кэш сводок по вкладам клиентов (вклады + проценты на сегодня), предел в байтах; 0 - выключен
+DEPOSIT_CACHE_MAX_BYTES = 16 * 1024 * 1024
+
+# Ответы меньше этого размера (байт) не сжимаются
+COMPRESSION_MIN_SIZE = 1024
+
+# Интервал комментария-пинга в потоке SSE /api/events (секунды)
+SSE_HEARTBEAT_SECONDS = 15
+# Сколько потоков SSE держит один воркер; сверх - 503, браузер переподключится позже.
+# Поток SSE не занимает соединение с БД, но занимает поток воркера (см. gunicorn.conf.py)
+SSE_MAX_STREAMS = int(os.environ.get('SSE_MAX_STREAMS', 16))
+
+# Пул процессов для хеширования и проверки паролей
+PASSWORD_HASH_WORKERS = 2
+# Сколько операций может ждать в очереди пула; сверх лимита - 503
+PASSWORD_HASH_MAX_PENDING = 32
+
+# Групповая фиксация записей DatabaseManager (несколько операций - один COMMIT)
+GROUP_COMMIT_ENABLED = False
+GROUP_COMMIT_INTERVAL_MS = 5
+# Сколько операция пачки ждет блокировку строки: дольше - ошибка только этой операции
+GROUP_COMMIT_LOCK_TIMEOUT_MS = 1000
+# Сколько секунд запрос ждет COMMIT своей пачки (больше - TimeoutError)
+GROUP_COMMIT_RESULT_TIMEOUT = 30
+
+# Реплики для читающих запросов (словари в формате DB_CONFIG); пусто - только основной сервер
+DB_REPLICAS = []
+# Сколько секунд после записи сессия читает с основного сервера
+READ_YOUR_WRITES_SECONDS = 5
+# Реплика с большим отставанием (секунды) не используется
+MAX_REPLICA_LAG_SECONDS = 10
+
+# Токен для /api/export (заголовок Authorization: Bearer <токен>); None - выгрузка отключена
+EXPORT_TOKEN = None
+
+# Токен для /api/cache_metrics (Bearer, как выгрузка); None - метрики кэшей недоступны
+METRICS_TOKEN = None
+
+# Профилирование отдельных запросов и действий GUI (profiler.py).
+# Без PROFILE_DIR выключено полностью: хуки не регистрируются.
+PROFILE_DIR = os.environ.get('PROFILE_DIR')
+# Имена endpoint'ов Flask через запятую или '*'
+PROFILE_ROUTES = os.environ.get('PROFILE_ROUTES', '')
+# Значение заголовка X-Profile, включающее профилирование запроса
+PROFILE_TOKEN = os.environ.get('PROFILE_TOKEN')
+# Обработчики Tk (__qualname__) через запятую или '*'
+PROFILE_GUI_ACTIONS = os.environ.get('PROFILE_GUI_ACTIONS', '')
+# Доля выбранных по имени запросов, которые профилируются
+PROFILE_SAMPLE_RATE = float(os.environ.get('PROFILE_SAMPLE_RATE', '1.0'))
+PROFILE_INTERVAL_MS = float(os.environ.get('PROFILE_INTERVAL_MS', '2'))
+# Профили быстрее этого порога (мс) не сохраняются
+PROFILE_MIN_MS = float(os.environ.get('PROFILE_MIN_MS', '0'))
+
+# Трассировка запросов server.py (tracing.py): файл трасс; None - выключено
+TRACE_FILE = os.environ.get('TRACE_FILE')
+# 'jsonl' - спан на строку, 'otlp' - OTLP/JSON
+TRACE_FORMAT = os.environ.get('TRACE_FORMAT', 'jsonl')
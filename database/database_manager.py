@@ -1,15 +1,93 @@
+import contextvars
+import itertools
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import contextmanager
 import psycopg2
+from psycopg2.pool import ThreadedConnectionPool
 from datetime import date
 from decimal import Decimal
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 from database.models import Client, Deposit, Transaction, DepositPlan
+from database.interest import calculate_net_interest
+from database.group_commit import GroupCommitWriter
+from database.deposit_cache import DepositSummaryCache
+from database.snapshots import DEPOSIT_AS_OF_SQL, PORTFOLIO_AS_OF_SQL
+
+def normalize_email(email: str) -> str:
+    """Email в форме, по которой построен уникальный индекс"""
+    return (email or "").strip().lower()
+
+# Колонки списка клиентов (clients c + client_summary s) и допустимые сортировки
+CLIENT_LIST_COLUMNS = """
+    c.id, c.full_name, c.passport_data, c.phone_number, c.email, c.address, c.created_at,
+    c.updated_at, s.active_count, s.active_balance, s.last_activity
+"""
+CLIENT_LIST_ORDER = {
+    'created': "c.created_at DESC",
+    'name': "c.full_name",
+    'balance': "s.active_balance DESC, s.client_id",
+}
+
+class DepositConflictError(ValueError):
+    """Заявка уже обработана или захвачена другим банкиром"""
+
+# Поля постраничной выдачи (имя в API -> колонка)
+DEPOSIT_PAGE_FIELDS = {
+    'id': 'd.id', 'type': 'd.deposit_type', 'amount': 'd.amount', 'rate': 'd.interest_rate',
+    'open_date': 'd.open_date', 'close_date': 'd.close_date', 'maturity_date': 'd.maturity_date',
+    'status': 'd.status', 'plan_id': 'd.deposit_plan_id', 'auto_renew': 'd.auto_renew',
+}
+TRANSACTION_PAGE_FIELDS = {
+    'id': 't.id', 'deposit_id': 't.deposit_id', 'type': 't.type', 'amount': 't.amount',
+    'description': 't.description', 'date': 't.transaction_date',
+}
+
+# Ключ сессии для read-your-writes (например, id пользователя в запросе Flask)
+_read_session = contextvars.ContextVar('db_read_session', default=None)
+# Время последней записи сессии (time.time()) в виде {'last_write_at': ...}:
+# приходит извне (например, из cookie) и видно всем процессам сервера
+_session_writes = contextvars.ContextVar('db_session_writes', default=None)
+# Реплика, закрепленная за текущим запросом (все чтения запроса - с одного сервера)
+_UNPINNED = object()
+_pinned_replica = contextvars.ContextVar('db_pinned_replica', default=_UNPINNED)
 
 class DatabaseManager:
-    def __init__(self, db_config: dict):
+    def __init__(self, db_config: dict, pool_size: int = 5,
+                 replica_configs: Optional[List[dict]] = None,
+                 read_your_writes_seconds: float = 5.0,
+                 max_replica_lag_seconds: float = 10.0,
+                 create_schema: bool = True):
         self.db_config = db_config
+        # Соединение для DDL и прогрева; методы запросов работают через пул,
+        # потому что DatabaseManager используют сразу несколько потоков
         self.conn = None
+        # Пулы соединений: None - основной сервер, 0..N-1 - реплики.
+        # Создаются лениво; к ним же - потоки для параллельных запросов.
+        self.pool_size = pool_size
+        self.pools = {}
+        self.executor = None
+        self._pool_lock = threading.Lock()
+
+        # Реплики для читающих методов
+        self.replica_configs = list(replica_configs or [])
+        self.read_your_writes_seconds = read_your_writes_seconds
+        self.max_replica_lag_seconds = max_replica_lag_seconds
+        self._last_write = {}
+        self._replica_health = {}
+        self._replica_cycle = itertools.cycle(range(len(self.replica_configs)))
+        # Групповая фиксация записей (включается enable_group_commit)
+        self.group_writer = None
+        self.group_result_timeout = None
+        # Кэш сводок по вкладам клиентов (включается enable_deposit_cache)
+        self.deposit_cache = None
+        # Активные планы для расчета предложений: (версия 'plans', {id: план})
+        self._quote_plans = (None, {})
         self.connect()
-        self.create_tables()
+        # Воркеры pre-fork сервера схему не трогают: DDL выполняется один раз до их запуска
+        if create_schema:
+            self.create_tables()
 
     def connect(self):
         """Установка соединения с базой данных"""
@@ -19,6 +97,174 @@ class DatabaseManager:
         except psycopg2.Error as e:
             raise ConnectionError(f"Не удалось подключиться к базе данных: {e}")
 
+    def _get_pool(self, replica: Optional[int] = None):
+        """(пул, семафор) для основного сервера (None) или реплики"""
+        with self._pool_lock:
+            if replica not in self.pools:
+                config = self.db_config if replica is None else self.replica_configs[replica]
+                # ThreadedConnectionPool не ждет свободного соединения, а падает,
+                # поэтому число одновременных getconn ограничивается семафором
+                self.pools[replica] = (ThreadedConnectionPool(1, self.pool_size, **config),
+                                       threading.BoundedSemaphore(self.pool_size))
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.pool_size,
+                                                   thread_name_prefix="db-pool")
+            return self.pools[replica]
+
+    @contextmanager
+    def pooled_cursor(self, replica: Optional[int] = None):
+        """Курсор на отдельном соединении из пула (для параллельных запросов)"""
+        pool, slots = self._get_pool(replica)
+        with slots:
+            conn = pool.getconn()
+            try:
+                with conn.cursor() as cur:
+                    yield cur
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            finally:
+                pool.putconn(conn)
+
+    def run_parallel(self, *funcs):
+        """Параллельное выполнение функций вида f(cur) на соединениях из пула"""
+        self._get_pool()
+        replica = self._pick_replica()
+
+        def run(func):
+            with self.pooled_cursor(replica) as cur:
+                return func(cur)
+
+        # Потоки пула получают контекст вызывающего (сессия чтения, трассировка)
+        futures = [self.executor.submit(contextvars.copy_context().run, run, func)
+                   for func in funcs]
+        return [future.result() for future in futures]
+
+    def copy_to(self, build_sql, out):
+        """
+        COPY ... TO STDOUT в файловый объект out на соединении из пула
+        (с реплики, если можно). build_sql(cur) возвращает текст COPY.
+        """
+        replica = self._pick_replica()
+        pool, slots = self._get_pool(replica)
+        with slots:
+            conn = pool.getconn()
+            broken = True
+            try:
+                with conn.cursor() as cur:
+                    cur.copy_expert(build_sql(cur), out)
+                conn.commit()
+                broken = False
+            finally:
+                # Прерванный COPY оставляет соединение в неопределенном состоянии
+                pool.putconn(conn, close=broken)
+
+    # --- МАРШРУТИЗАЦИЯ ЧТЕНИЙ НА РЕПЛИКИ ---
+
+    @contextmanager
+    def read_session(self, key, last_write_at: Optional[float] = None, primary: bool = False):
+        """
+        Контекст запроса: сессия key и одна реплика на все его чтения.
+
+        Данные одной реплики не "откатываются" назад, поэтому версия,
+        прочитанная в начале запроса, не опережает прочитанные после нее
+        данные (важно для кэша ответов по версии).
+
+        last_write_at - время последней записи сессии (time.time()) из
+        хранилища, общего для процессов: запись могла пройти в другом
+        воркере, и его self._last_write отсюда не виден. Контекст отдает
+        словарь, в котором mark_write обновляет 'last_write_at', - его
+        нужно сохранить обратно (см. server.py).
+
+        primary=True - все чтения запроса с основного сервера: для ответов,
+        чья версия (ETag) должна сразу отражать только что
+        зафиксированную запись (например, перечитывание по NOTIFY).
+        """
+        writes = {'last_write_at': last_write_at}
+        session_token = _read_session.set(key)
+        writes_token = _session_writes.set(writes)
+        recent = (last_write_at is not None
+                  and time.time() - last_write_at < self.read_your_writes_seconds)
+        pin_token = _pinned_replica.set(None if recent or primary else self._pick_replica())
+        try:
+            yield writes
+        finally:
+            _pinned_replica.reset(pin_token)
+            _session_writes.reset(writes_token)
+            _read_session.reset(session_token)
+
+    def mark_write(self):
+        """Отметка записи: сессия читает с основного сервера еще N секунд"""
+        if not self.replica_configs:
+            return
+        now = time.monotonic()
+        if len(self._last_write) > 10000:
+            self._last_write = {key: at for key, at in self._last_write.items()
+                                if now - at < self.read_your_writes_seconds}
+        self._last_write[_read_session.get()] = now
+        writes = _session_writes.get()
+        if writes is not None:
+            writes['last_write_at'] = time.time()
+        # Остаток текущего запроса тоже читает с основного сервера
+        if _pinned_replica.get() is not _UNPINNED:
+            _pinned_replica.set(None)
+
+    def _replica_lag(self, replica: int) -> float:
+        """Отставание реплики в секундах (кэшируется на пару секунд)"""
+        checked_at, lag = self._replica_health.get(replica, (0.0, None))
+        if time.monotonic() - checked_at < 2.0:
+            return lag
+        try:
+            with self.pooled_cursor(replica) as cur:
+                # Реплика, воспроизведшая весь полученный WAL, не отстает,
+                # даже если на основном сервере давно не было записей
+                cur.execute("""
+                    SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+                                ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+                           END
+                """)
+                lag = float(cur.fetchone()[0])
+        except psycopg2.Error:
+            lag = float('inf')
+        self._replica_health[replica] = (time.monotonic(), lag)
+        return lag
+
+    def _pick_replica(self) -> Optional[int]:
+        """Реплика для чтения или None, если читать нужно с основного сервера"""
+        if not self.replica_configs:
+            return None
+        pinned = _pinned_replica.get()
+        if pinned is not _UNPINNED:
+            return pinned
+        last_write = self._last_write.get(_read_session.get())
+        if last_write is not None and time.monotonic() - last_write < self.read_your_writes_seconds:
+            return None
+        for _ in range(len(self.replica_configs)):
+            replica = next(self._replica_cycle)
+            if self._replica_lag(replica) <= self.max_replica_lag_seconds:
+                return replica
+        return None
+
+    @contextmanager
+    def _read_cursor(self, primary: bool = False):
+        """
+        Курсор для читающего метода: реплика, если можно, иначе основной
+        сервер. Соединение берется из пула на время вызова: self.conn общий
+        для всех потоков, и транзакции параллельных запросов смешались бы.
+        """
+        with self.pooled_cursor(None if primary else self._pick_replica()) as cur:
+            yield cur
+
+    @contextmanager
+    def _write_cursor(self):
+        """
+        Курсор записи на своем соединении основного сервера: COMMIT при
+        выходе, ROLLBACK при исключении (только своей транзакции)
+        """
+        with self.pooled_cursor() as cur:
+            yield cur
+
     def create_tables(self):
         """Создание таблиц в базе данных"""
         with self.conn.cursor() as cur:
@@ -89,10 +335,384 @@ class DatabaseManager:
             cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_deposit_id ON transactions(deposit_id)")
             cur.execute("CREATE INDEX IF NOT EXISTS idx_deposit_plans_active ON deposit_plans(is_active)")
 
+            # Отметка последнего изменения клиента (водяной знак для
+            # инкрементального обновления списка клиентов в GUI)
+            cur.execute("ALTER TABLE clients ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP")
+            # updated_at - время изменения, а не фиксации: транзакция может
+            # зафиксироваться позже чтения с большей отметкой. Водяной знак
+            # строится по xid изменившей транзакции (см. get_clients_changed_since)
+            cur.execute("ALTER TABLE clients ADD COLUMN IF NOT EXISTS change_xid BIGINT NOT NULL DEFAULT txid_current()")
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION touch_updated_at() RETURNS trigger AS $$
+                BEGIN
+                    NEW.updated_at := CURRENT_TIMESTAMP;
+                    NEW.change_xid := txid_current();
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            cur.execute("DROP TRIGGER IF EXISTS trg_clients_touch ON clients")
+            cur.execute("""
+                CREATE TRIGGER trg_clients_touch BEFORE UPDATE ON clients
+                FOR EACH ROW EXECUTE FUNCTION touch_updated_at()
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_clients_updated_at ON clients(updated_at)")
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_clients_change_xid ON clients(change_xid)")
+
+            # Версии данных для ETag: 'plans' - таблица планов,
+            # 'deposits:<client_id>' - депозиты конкретного клиента
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS data_versions (
+                    scope VARCHAR(50) PRIMARY KEY,
+                    version BIGINT NOT NULL DEFAULT 0
+                )
+            """)
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION bump_data_version(p_scope TEXT) RETURNS void AS $$
+                BEGIN
+                    INSERT INTO data_versions (scope, version) VALUES (p_scope, 1)
+                    ON CONFLICT (scope) DO UPDATE SET version = data_versions.version + 1;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION bump_plans_version() RETURNS trigger AS $$
+                BEGIN
+                    PERFORM bump_data_version('plans');
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION bump_deposits_version() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                        PERFORM bump_data_version('deposits:' || OLD.client_id);
+                    END IF;
+                    IF TG_OP IN ('INSERT', 'UPDATE')
+                       AND (TG_OP = 'INSERT' OR NEW.client_id IS DISTINCT FROM OLD.client_id) THEN
+                        PERFORM bump_data_version('deposits:' || NEW.client_id);
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            cur.execute("DROP TRIGGER IF EXISTS trg_deposit_plans_version ON deposit_plans")
+            cur.execute("""
+                CREATE TRIGGER trg_deposit_plans_version
+                AFTER INSERT OR UPDATE OR DELETE ON deposit_plans
+                FOR EACH STATEMENT EXECUTE FUNCTION bump_plans_version()
+            """)
+            cur.execute("DROP TRIGGER IF EXISTS trg_deposits_version ON deposits")
+            cur.execute("""
+                CREATE TRIGGER trg_deposits_version
+                AFTER INSERT OR DELETE OR UPDATE OF client_id, deposit_type, amount,
+                    interest_rate, open_date, close_date, status ON deposits
+                FOR EACH ROW EXECUTE FUNCTION bump_deposits_version()
+            """)
+
+            # Дата окончания срока вклада: открытие + срок плана.
+            # Ставится триггером, для старых активных вкладов - дозаполняется.
+            cur.execute("ALTER TABLE deposits ADD COLUMN IF NOT EXISTS maturity_date DATE")
+            cur.execute("ALTER TABLE deposits ADD COLUMN IF NOT EXISTS auto_renew BOOLEAN DEFAULT FALSE")
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION set_maturity_date() RETURNS trigger AS $$
+                BEGIN
+                    SELECT (NEW.open_date + make_interval(months => p.duration_months))::date
+                    INTO NEW.maturity_date
+                    FROM deposit_plans p WHERE p.id = NEW.deposit_plan_id;
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            cur.execute("DROP TRIGGER IF EXISTS trg_deposits_maturity ON deposits")
+            cur.execute("""
+                CREATE TRIGGER trg_deposits_maturity
+                BEFORE INSERT OR UPDATE OF open_date, deposit_plan_id ON deposits
+                FOR EACH ROW EXECUTE FUNCTION set_maturity_date()
+            """)
+            cur.execute("""
+                UPDATE deposits d
+                SET maturity_date = (d.open_date + make_interval(months => p.duration_months))::date
+                FROM deposit_plans p
+                WHERE p.id = d.deposit_plan_id AND d.maturity_date IS NULL
+                  AND d.status IN ('pending', 'active')
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_deposits_active_maturity
+                ON deposits(maturity_date) WHERE status = 'active'
+            """)
+
+            # Вход по email: уникальный индекс по нормализованному адресу.
+            # Если в старых данных есть дубликаты, остается обычный индекс.
+            cur.execute("SAVEPOINT email_index")
+            try:
+                cur.execute("""
+                    CREATE UNIQUE INDEX IF NOT EXISTS idx_clients_email_lower
+                    ON clients (LOWER(email)) WHERE email IS NOT NULL AND email <> ''
+                """)
+                cur.execute("RELEASE SAVEPOINT email_index")
+            except psycopg2.IntegrityError:
+                cur.execute("ROLLBACK TO SAVEPOINT email_index")
+                cur.execute("""
+                    CREATE INDEX IF NOT EXISTS idx_clients_email_lower_nonunique
+                    ON clients (LOWER(email)) WHERE email IS NOT NULL AND email <> ''
+                """)
+
+            # Очередь заявок для нескольких банкиров: захват с арендой
+            cur.execute("ALTER TABLE deposits ADD COLUMN IF NOT EXISTS claimed_by VARCHAR(50)")
+            cur.execute("ALTER TABLE deposits ADD COLUMN IF NOT EXISTS claim_expires_at TIMESTAMP")
+            # Ключи постраничной выдачи истории клиента
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_deposits_client_page ON deposits(client_id, id)")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_transactions_deposit_page
+                ON transactions(deposit_id, transaction_date, id)
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_deposits_pending_queue
+                ON deposits(open_date, id) WHERE status = 'pending'
+            """)
+
+            # Уведомления о смене статуса депозита (LISTEN deposit_events).
+            # NOTIFY доставляется слушателям только после COMMIT.
+            cur.execute("""
+                CREATE OR REPLACE FUNCTION notify_deposit_status() RETURNS trigger AS $$
+                BEGIN
+                    IF TG_OP = 'INSERT' OR NEW.status IS DISTINCT FROM OLD.status THEN
+                        PERFORM pg_notify('deposit_events', json_build_object(
+                            'id', NEW.id,
+                            'client_id', NEW.client_id,
+                            'status', NEW.status,
+                            'old_status', CASE WHEN TG_OP = 'UPDATE' THEN OLD.status END
+                        )::text);
+                    END IF;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            """)
+            cur.execute("DROP TRIGGER IF EXISTS trg_deposits_notify ON deposits")
+            cur.execute("""
+                CREATE TRIGGER trg_deposits_notify
+                AFTER INSERT OR UPDATE OF status ON deposits
+                FOR EACH ROW EXECUTE FUNCTION notify_deposit_status()
+            """)
+
+            # Холодный архив закрытых и отклоненных вкладов (archive_deposits.py).
+            # Представления all_* объединяют горячие и архивные строки.
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS deposits_archive (
+                    id INTEGER PRIMARY KEY,
+                    client_id INTEGER,
+                    deposit_plan_id INTEGER,
+                    deposit_type VARCHAR(50) NOT NULL,
+                    amount DECIMAL(15,2) NOT NULL,
+                    interest_rate DECIMAL(5,2) NOT NULL,
+                    open_date DATE NOT NULL,
+                    close_date DATE,
+                    status VARCHAR(20),
+                    maturity_date DATE,
+                    auto_renew BOOLEAN,
+                    archived_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS transactions_archive (
+                    id INTEGER PRIMARY KEY,
+                    deposit_id INTEGER,
+                    type VARCHAR(20) NOT NULL,
+                    amount DECIMAL(15,2) NOT NULL,
+                    description TEXT,
+                    transaction_date TIMESTAMP
+                )
+            """)
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_deposits_archive_client ON deposits_archive(client_id, id)")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_transactions_archive_deposit
+                ON transactions_archive(deposit_id, transaction_date, id)
+            """)
+            cur.execute("""
+                CREATE OR REPLACE VIEW all_deposits AS
+                SELECT id, client_id, deposit_plan_id, deposit_type, amount, interest_rate,
+                       open_date, close_date, status, maturity_date, auto_renew, FALSE AS archived
+                FROM deposits
+                UNION ALL
+                SELECT id, client_id, deposit_plan_id, deposit_type, amount, interest_rate,
+                       open_date, close_date, status, maturity_date, auto_renew, TRUE
+                FROM deposits_archive
+            """)
+            cur.execute("""
+                CREATE OR REPLACE VIEW all_transactions AS
+                SELECT id, deposit_id, type, amount, description, transaction_date FROM transactions
+                UNION ALL
+                SELECT id, deposit_id, type, amount, description, transaction_date FROM transactions_archive
+            """)
+
+            # Снимки остатков для запросов на дату (строятся build_snapshots.py)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS deposit_balance_snapshots (
+                    deposit_id INTEGER NOT NULL,
+                    snapshot_date DATE NOT NULL,
+                    balance DECIMAL(15,2) NOT NULL,
+                    PRIMARY KEY (deposit_id, snapshot_date)
+                )
+            """)
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_deposit_snapshots_date
+                ON deposit_balance_snapshots(snapshot_date)
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS portfolio_balance_snapshots (
+                    snapshot_date DATE PRIMARY KEY,
+                    balance DECIMAL(18,2) NOT NULL,
+                    deposit_count INTEGER NOT NULL
+                )
+            """)
+            cur.execute("""
+                CREATE TABLE IF NOT EXISTS snapshot_watermarks (
+                    grain VARCHAR(20) PRIMARY KEY,
+                    built_through DATE
+                )
+            """)
+            # Хвост журнала после снимка выбирается по дате операции
+            cur.execute("CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(transaction_date)")
+            cur.execute("""
+                CREATE INDEX IF NOT EXISTS idx_transactions_archive_date
+                ON transactions_archive(transaction_date)
+            """)
+
+            self._create_client_summary(cur)
+
             self._create_default_deposit_plans()
 
             self.conn.commit()
 
+    def _create_client_summary(self, cur):
+        """
+        Сводка по клиенту для списка клиентов: число и сумма действующих
+        вкладов, время последнего изменения вкладов. Поддерживается
+        триггерами уровня оператора: изменения оператора суммируются по
+        клиентам и применяются одним upsert в порядке client_id, поэтому
+        массовые операции (закрытие по сроку) не блокируют строки сводки
+        вразнобой.
+        """
+        cur.execute("SELECT to_regclass('client_summary') IS NULL")
+        created = cur.fetchone()[0]
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS client_summary (
+                client_id INTEGER PRIMARY KEY REFERENCES clients(id) ON DELETE CASCADE,
+                active_count INTEGER NOT NULL DEFAULT 0,
+                active_balance DECIMAL(18,2) NOT NULL DEFAULT 0,
+                last_activity TIMESTAMP
+            )
+        """)
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_client_summary_balance
+            ON client_summary(active_balance DESC, client_id)
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_client_summary_activity ON client_summary(last_activity)")
+        # xid последней изменившей сводку транзакции (как clients.change_xid)
+        cur.execute("ALTER TABLE client_summary ADD COLUMN IF NOT EXISTS change_xid BIGINT NOT NULL DEFAULT txid_current()")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_client_summary_change_xid ON client_summary(change_xid)")
+
+        # Изменения (client_id, d_count, d_balance, activity) -> upsert сводки.
+        # last_activity только растет: GREATEST игнорирует NULL.
+        upsert = """
+            INSERT INTO client_summary AS s (client_id, active_count, active_balance, last_activity)
+            SELECT client_id, SUM(d_count), SUM(d_balance), MAX(activity)
+            FROM ({changes}) changes
+            GROUP BY client_id
+            ORDER BY client_id
+            ON CONFLICT (client_id) DO UPDATE
+            SET active_count = s.active_count + EXCLUDED.active_count,
+                active_balance = s.active_balance + EXCLUDED.active_balance,
+                last_activity = GREATEST(s.last_activity, EXCLUDED.last_activity),
+                change_xid = txid_current();
+        """
+        contribution = """
+            SELECT {row}.client_id,
+                   CASE WHEN {row}.status = 'active' THEN {sign}1 ELSE 0 END AS d_count,
+                   CASE WHEN {row}.status = 'active' THEN {sign}{row}.amount ELSE 0 END AS d_balance,
+                   {activity}::timestamp AS activity
+            FROM {source}
+        """
+        changed = """
+            old_rows o JOIN new_rows n ON n.id = o.id
+            WHERE (o.client_id, o.status, o.amount) IS DISTINCT FROM (n.client_id, n.status, n.amount)
+        """
+        on_insert = upsert.format(changes=contribution.format(
+            row='n', sign='', activity='CURRENT_TIMESTAMP', source='new_rows n'))
+        # Архивация удаляет только закрытые и отклоненные вклады - это не активность
+        on_delete = upsert.format(changes=contribution.format(
+            row='o', sign='-', activity='NULL', source="old_rows o WHERE o.status = 'active'"))
+        on_update = upsert.format(changes=(
+            contribution.format(row='o', sign='-', activity='CURRENT_TIMESTAMP', source=changed)
+            + " UNION ALL " +
+            contribution.format(row='n', sign='', activity='CURRENT_TIMESTAMP', source=changed)))
+        cur.execute(f"""
+            CREATE OR REPLACE FUNCTION update_client_summary() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    {on_insert}
+                ELSIF TG_OP = 'DELETE' THEN
+                    {on_delete}
+                ELSE
+                    {on_update}
+                END IF;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        # Таблицы переходов нельзя объявить у триггера на несколько событий
+        for event, referencing in (('INSERT', 'NEW TABLE AS new_rows'),
+                                   ('DELETE', 'OLD TABLE AS old_rows'),
+                                   ('UPDATE', 'OLD TABLE AS old_rows NEW TABLE AS new_rows')):
+            cur.execute(f"DROP TRIGGER IF EXISTS trg_deposits_summary_{event.lower()} ON deposits")
+            cur.execute(f"""
+                CREATE TRIGGER trg_deposits_summary_{event.lower()}
+                AFTER {event} ON deposits
+                REFERENCING {referencing}
+                FOR EACH STATEMENT EXECUTE FUNCTION update_client_summary()
+            """)
+
+        # У каждого клиента есть строка сводки: список сортируется без LEFT JOIN
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION create_client_summary() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO client_summary (client_id) VALUES (NEW.id)
+                ON CONFLICT (client_id) DO NOTHING;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        cur.execute("DROP TRIGGER IF EXISTS trg_clients_summary ON clients")
+        cur.execute("""
+            CREATE TRIGGER trg_clients_summary AFTER INSERT ON clients
+            FOR EACH ROW EXECUTE FUNCTION create_client_summary()
+        """)
+
+        # Полный пересчет: при создании таблицы и после загрузки данных
+        # с отключенными триггерами (см. explain_audit.py)
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION rebuild_client_summary() RETURNS void AS $$
+                INSERT INTO client_summary AS s (client_id, active_count, active_balance, last_activity)
+                SELECT c.id,
+                       COUNT(d.id) FILTER (WHERE d.status = 'active'),
+                       COALESCE(SUM(d.amount) FILTER (WHERE d.status = 'active'), 0),
+                       MAX(GREATEST(d.open_date, d.close_date))::timestamp
+                FROM clients c
+                LEFT JOIN deposits d ON d.client_id = c.id
+                GROUP BY c.id
+                ORDER BY c.id
+                ON CONFLICT (client_id) DO UPDATE
+                SET active_count = EXCLUDED.active_count,
+                    active_balance = EXCLUDED.active_balance,
+                    last_activity = GREATEST(s.last_activity, EXCLUDED.last_activity),
+                    change_xid = txid_current()
+            $$ LANGUAGE sql
+        """)
+        if created:
+            cur.execute("SELECT rebuild_client_summary()")
+
     def _create_default_deposit_plans(self):
         """Создание стандартных депозитных планов при инициализации"""
         default_plans = [
@@ -118,118 +738,303 @@ class DatabaseManager:
                 """, plan)
 
 
+    # --- ЗАПИСЬ: СРАЗУ ИЛИ ЧЕРЕЗ ГРУППОВУЮ ФИКСАЦИЮ ---
+    # Операции записи оформлены как функции op(cur, *args) без commit.
+    # Без групповой фиксации каждая выполняется в своей транзакции,
+    # с ней - попадает в общую транзакцию пачки (см. GroupCommitWriter).
+
+    def enable_group_commit(self, interval_ms: float = 5, max_batch: int = 500,
+                            lock_timeout_ms: int = 1000, result_timeout: Optional[float] = 30.0):
+        """
+        Включение режима групповой фиксации записей. result_timeout - сколько
+        секунд метод записи ждет COMMIT пачки; по истечении операция снимается
+        с очереди и поднимается TimeoutError. Зафиксироваться после этого
+        может только операция, которую писатель уже начал выполнять.
+        """
+        if self.group_writer is None:
+            self.group_result_timeout = result_timeout
+            self.group_writer = GroupCommitWriter(self.db_config, interval_ms, max_batch,
+                                                  lock_timeout_ms)
+            self.group_writer.start()
+
+    def disable_group_commit(self):
+        if self.group_writer is not None:
+            self.group_writer.stop()
+            self.group_writer = None
+
+    def _execute_write(self, op, *args):
+        self.mark_write()
+        if self.group_writer is not None:
+            future = self._submit_group_write(op, args)
+            try:
+                return future.result(timeout=self.group_result_timeout)
+            except FutureTimeoutError:
+                # Операция, до которой писатель еще не дошел, снимается с очереди;
+                # зафиксироваться может только уже выполняемая
+                future.cancel()
+                raise
+        owner = self._deposit_owner(op, args)
+        with self._write_cursor() as cur:
+            result = op(cur, *args)
+        self._invalidate_deposit_summary(owner)
+        return result
+
+    def _submit_group_write(self, op, args) -> Future:
+        owner = self._deposit_owner(op, args)
+        future = self.group_writer.submit(op, *args)
+        # Сводка сбрасывается после COMMIT пачки, до того как ждущий увидит результат,
+        # и даже если ждущий уже ушел по таймауту
+        future.add_done_callback(
+            lambda f: not f.cancelled() and f.exception() is None
+            and self._invalidate_deposit_summary(owner))
+        return future
+
+    def submit_write(self, operation: str, *args) -> Future:
+        """
+        Постановка записи в очередь: operation - имя метода записи
+        ('create_client', 'open_deposit', 'approve_deposit', 'reject_deposit',
+        'close_deposit'). Возвращает Future с результатом метода.
+        """
+        op = self._write_ops[operation]
+        self.mark_write()
+        if self.group_writer is not None:
+            return self._submit_group_write(op, args)
+        future = Future()
+        try:
+            future.set_result(self._execute_write(op, *args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+    # --- КЭШ СВОДОК ПО ВКЛАДАМ ---
+
+    def enable_deposit_cache(self, max_bytes: int = 16 * 1024 * 1024):
+        """Включение кэша сводок по вкладам клиентов (ограничение в байтах)"""
+        if self.deposit_cache is None:
+            self.deposit_cache = DepositSummaryCache(max_bytes)
+
+    def _deposit_owner(self, op, args) -> Optional[int]:
+        """Клиент, чьи вклады меняет операция записи (None - не меняет или кэш выключен)"""
+        if self.deposit_cache is None:
+            return None
+        if op == self._open_deposit_op:
+            return args[0].client_id
+        if op in (self._approve_deposit_op, self._reject_deposit_op, self._close_deposit_op):
+            # Владелец вклада не меняется, поэтому его можно узнать до записи
+            with self.pooled_cursor() as cur:
+                cur.execute("SELECT client_id FROM deposits WHERE id = %s", (args[0],))
+                row = cur.fetchone()
+            return row[0] if row else None
+        return None
+
+    def _invalidate_deposit_summary(self, client_id: Optional[int]):
+        if client_id is not None and self.deposit_cache is not None:
+            self.deposit_cache.invalidate(client_id)
+
+    def get_client_deposit_summary(self, client_id: int, primary: bool = False) -> List[tuple]:
+        """
+        Вклады клиента с процентами, накопленными на сегодня: [(Deposit, profit)].
+        С включенным кэшем результат общий для всех вызывающих - не изменять.
+        primary=True - без кэша читать с основного сервера (кэш и так заполняется с него).
+        """
+        today = date.today()
+        cache = self.deposit_cache
+        if cache is None:
+            with self._read_cursor(primary) as cur:
+                return self._fetch_deposit_summary(cur, client_id, today)
+
+        # Версия с основного сервера: сброс по LISTEN из другого процесса
+        # может еще не дойти, а версия в БД уже новая
+        version = self.get_data_version(f"deposits:{client_id}", primary=True)
+        summary = cache.get(client_id, today, version)
+        if summary is not None:
+            return summary
+        started = cache.begin()
+        # Только с основного сервера: сводка с отстающей реплики осталась бы
+        # в кэше до следующей записи по клиенту. Сводка читается после версии,
+        # поэтому не старше нее
+        with self.pooled_cursor() as cur:
+            summary = self._fetch_deposit_summary(cur, client_id, today)
+        cache.put(client_id, summary, started, today, version)
+        return summary
+
+    def _fetch_deposit_summary(self, cur, client_id: int, today: date) -> List[tuple]:
+        cur.execute("""
+            SELECT id, client_id, deposit_type, amount, interest_rate, 
+                   open_date, close_date, status
+            FROM deposits 
+            WHERE client_id = %s
+            ORDER BY open_date DESC
+        """, (client_id,))
+        result = []
+        for row in cur.fetchall():
+            deposit = self._deposit_from_row(row)
+            # Проценты считаются по уже загруженной строке, без запроса на депозит
+            profit = (calculate_net_interest(deposit.amount, deposit.interest_rate,
+                                             deposit.open_date, deposit.status,
+                                             deposit.close_date, today)
+                      if deposit.status == 'active' else Decimal(0))
+            result.append((deposit, profit))
+        return result
+
+    @property
+    def _write_ops(self):
+        return {
+            'create_client': self._create_client_op,
+            'open_deposit': self._open_deposit_op,
+            'approve_deposit': self._approve_deposit_op,
+            'reject_deposit': self._reject_deposit_op,
+            'close_deposit': self._close_deposit_op,
+        }
+
     def create_client(self, client: Client) -> int:
         """Создание нового клиента"""
-        with self.conn.cursor() as cur:
-            try:
-                cur.execute("""
-                    INSERT INTO clients (full_name, passport_data, phone_number, email, address) 
-                    VALUES (%s, %s, %s, %s, %s) RETURNING id
-                """, (client.full_name, client.passport_data, client.phone_number, 
-                      client.email, client.address))
-                client_id = cur.fetchone()[0]
-                self.conn.commit()
-                return client_id
-            except psycopg2.IntegrityError:
-                self.conn.rollback()
-                raise ValueError("Клиент с такими паспортными данными уже существует")
+        return self._execute_write(self._create_client_op, client)
 
-    def get_all_clients(self) -> List[Client]:
-        """Получение списка всех клиентов"""
-        with self.conn.cursor() as cur:
+    def _create_client_op(self, cur, client: Client) -> int:
+        try:
             cur.execute("""
-                SELECT id, full_name, passport_data, phone_number, email, address, created_at
-                FROM clients 
-                ORDER BY created_at DESC
+                INSERT INTO clients (full_name, passport_data, phone_number, email, address) 
+                VALUES (%s, %s, %s, %s, %s) RETURNING id
+            """, (client.full_name, client.passport_data, client.phone_number, 
+                  client.email, client.address))
+        except psycopg2.IntegrityError:
+            raise ValueError("Клиент с такими паспортными данными уже существует")
+        return cur.fetchone()[0]
+
+    def get_all_clients(self, order_by: str = 'created') -> List[Client]:
+        """Получение списка всех клиентов со сводкой по вкладам"""
+        with self._read_cursor() as cur:
+            cur.execute(f"""
+                SELECT {CLIENT_LIST_COLUMNS}
+                FROM clients c
+                JOIN client_summary s ON s.client_id = c.id
+                ORDER BY {CLIENT_LIST_ORDER[order_by]}
             """)
-            clients = []
-            for row in cur.fetchall():
-                clients.append(Client(
-                    id=row[0], full_name=row[1], passport_data=row[2],
-                    phone_number=row[3], email=row[4] or "", address=row[5] or "",
-                    created_at=row[6]
-                ))
-            return clients
+            return [self._client_from_row(row) for row in cur.fetchall()]
 
-    def search_clients(self, search_term: str) -> List[Client]:
-        """Поиск клиентов по ФИО, паспорту или телефону"""
-        with self.conn.cursor() as cur:
+    def get_clients_changed_since(self, since: Optional[int],
+                                  order_by: str = 'created') -> Tuple[List[Client], int]:
+        """
+        Клиенты, измененные транзакциями с xid >= since (сами данные клиента
+        или сводка по его вкладам), и водяной знак для следующего вызова.
+        При since=None - весь список в порядке order_by.
+
+        Водяной знак - xmin снимка, взятого до чтения на том же соединении:
+        все транзакции с меньшим xid к этому моменту завершены и видны
+        чтению, а любая незафиксированная получит xid не меньше знака,
+        сколько бы она ни длилась.
+        """
+        with self._read_cursor() as cur:
+            cur.execute("SELECT txid_snapshot_xmin(txid_current_snapshot())")
+            watermark = cur.fetchone()[0]
+            if since is None:
+                cur.execute(f"""
+                    SELECT {CLIENT_LIST_COLUMNS}
+                    FROM clients c
+                    JOIN client_summary s ON s.client_id = c.id
+                    ORDER BY {CLIENT_LIST_ORDER[order_by]}
+                """)
+            else:
+                cur.execute(f"""
+                    SELECT {CLIENT_LIST_COLUMNS}
+                    FROM clients c
+                    JOIN client_summary s ON s.client_id = c.id
+                    WHERE c.id IN (SELECT id FROM clients WHERE change_xid >= %s
+                                   UNION
+                                   SELECT client_id FROM client_summary WHERE change_xid >= %s)
+                    ORDER BY c.created_at
+                """, (since, since))
+            return [self._client_from_row(row) for row in cur.fetchall()], watermark
+
+    @staticmethod
+    def _client_from_row(row) -> Client:
+        client = Client(
+            id=row[0], full_name=row[1], passport_data=row[2],
+            phone_number=row[3], email=row[4] or "", address=row[5] or "",
+            created_at=row[6], updated_at=row[7]
+        )
+        if len(row) > 8:
+            client.active_deposits, client.active_balance, client.last_activity = row[8:11]
+        return client
+
+    def get_client_credentials(self, email: str):
+        """(id, full_name, password_hash) клиента по email (без учета регистра)"""
+        # Всегда с основного сервера: вход сразу после регистрации
+        with self.pooled_cursor() as cur:
             cur.execute("""
-                SELECT id, full_name, passport_data, phone_number, email, address, created_at
-                FROM clients 
-                WHERE full_name ILIKE %s OR passport_data ILIKE %s OR phone_number ILIKE %s
-                ORDER BY full_name
+                SELECT id, full_name, password_hash FROM clients
+                WHERE LOWER(email) = %s AND email <> ''
+            """, (normalize_email(email),))
+            return cur.fetchone()
+
+    def search_clients(self, search_term: str, order_by: str = 'name') -> List[Client]:
+        """Поиск клиентов по ФИО, паспорту или телефону (со сводкой по вкладам)"""
+        with self._read_cursor() as cur:
+            cur.execute(f"""
+                SELECT {CLIENT_LIST_COLUMNS}
+                FROM clients c
+                JOIN client_summary s ON s.client_id = c.id
+                WHERE c.full_name ILIKE %s OR c.passport_data ILIKE %s OR c.phone_number ILIKE %s
+                ORDER BY {CLIENT_LIST_ORDER[order_by]}
             """, (f'%{search_term}%', f'%{search_term}%', f'%{search_term}%'))
-            
-            clients = []
-            for row in cur.fetchall():
-                clients.append(Client(
-                    id=row[0], full_name=row[1], passport_data=row[2],
-                    phone_number=row[3], email=row[4] or "", address=row[5] or "",
-                    created_at=row[6]
-                ))
-            return clients
+            return [self._client_from_row(row) for row in cur.fetchall()]
 
     def create_deposit_plan(self, plan: DepositPlan) -> int:
         """Создание нового депозитного плана"""
-        with self.conn.cursor() as cur:
-            try:
+        self.mark_write()
+        try:
+            with self._write_cursor() as cur:
                 cur.execute("""
                     INSERT INTO deposit_plans (name, description, interest_rate, min_amount, 
                                              max_amount, duration_months, early_withdrawal_penalty, is_active)
                     VALUES (%s, %s, %s, %s, %s, %s, %s, %s) RETURNING id
                 """, (plan.name, plan.description, plan.interest_rate, plan.min_amount,
                       plan.max_amount, plan.duration_months, plan.early_withdrawal_penalty, plan.is_active))
-                plan_id = cur.fetchone()[0]
-                self.conn.commit()
-                return plan_id
-            except psycopg2.IntegrityError:
-                self.conn.rollback()
-                raise ValueError("План с таким названием уже существует")
+                return cur.fetchone()[0]
+        except psycopg2.IntegrityError:
+            raise ValueError("План с таким названием уже существует")
 
     def get_all_deposit_plans(self) -> List[DepositPlan]:
         """Получение всех депозитных планов"""
-        with self.conn.cursor() as cur:
+        with self._read_cursor() as cur:
             cur.execute("""
                 SELECT id, name, description, interest_rate, min_amount, max_amount,
                        duration_months, early_withdrawal_penalty, is_active, created_at
                 FROM deposit_plans 
                 ORDER BY name
             """)
-            plans = []
-            for row in cur.fetchall():
-                plans.append(DepositPlan(
-                    id=row[0], name=row[1], description=row[2],
-                    interest_rate=row[3], min_amount=row[4], max_amount=row[5],
-                    duration_months=row[6], early_withdrawal_penalty=row[7],
-                    is_active=row[8], created_at=row[9]
-                ))
-            return plans
+            return [self._plan_from_row(row) for row in cur.fetchall()]
 
     def get_active_deposit_plans(self) -> List[DepositPlan]:
         """Получение активных депозитных планов"""
-        with self.conn.cursor() as cur:
-            cur.execute("""
-                SELECT id, name, description, interest_rate, min_amount, max_amount,
-                       duration_months, early_withdrawal_penalty, is_active, created_at
-                FROM deposit_plans 
-                WHERE is_active = TRUE
-                ORDER BY name
-            """)
-            plans = []
-            for row in cur.fetchall():
-                plans.append(DepositPlan(
-                    id=row[0], name=row[1], description=row[2],
-                    interest_rate=row[3], min_amount=row[4], max_amount=row[5],
-                    duration_months=row[6], early_withdrawal_penalty=row[7],
-                    is_active=row[8], created_at=row[9]
-                ))
-            return plans
+        with self._read_cursor() as cur:
+            return self._fetch_active_plans(cur)
+
+    def _fetch_active_plans(self, cur) -> List[DepositPlan]:
+        cur.execute("""
+            SELECT id, name, description, interest_rate, min_amount, max_amount,
+                   duration_months, early_withdrawal_penalty, is_active, created_at
+            FROM deposit_plans 
+            WHERE is_active = TRUE
+            ORDER BY name
+        """)
+        return [self._plan_from_row(row) for row in cur.fetchall()]
+
+    @staticmethod
+    def _plan_from_row(row) -> DepositPlan:
+        return DepositPlan(
+            id=row[0], name=row[1], description=row[2],
+            interest_rate=row[3], min_amount=row[4], max_amount=row[5],
+            duration_months=row[6], early_withdrawal_penalty=row[7],
+            is_active=row[8], created_at=row[9]
+        )
 
     def update_deposit_plan(self, plan: DepositPlan) -> bool:
         """Обновление депозитного плана"""
-        with self.conn.cursor() as cur:
-            try:
+        self.mark_write()
+        try:
+            with self._write_cursor() as cur:
                 cur.execute("""
                     UPDATE deposit_plans 
                     SET name = %s, description = %s, interest_rate = %s, min_amount = %s,
@@ -239,15 +1044,14 @@ class DatabaseManager:
                 """, (plan.name, plan.description, plan.interest_rate, plan.min_amount,
                       plan.max_amount, plan.duration_months, plan.early_withdrawal_penalty,
                       plan.is_active, plan.id))
-                self.conn.commit()
                 return cur.rowcount > 0
-            except psycopg2.IntegrityError:
-                self.conn.rollback()
-                raise ValueError("План с таким названием уже существует")
+        except psycopg2.IntegrityError:
+            raise ValueError("План с таким названием уже существует")
 
     def delete_deposit_plan(self, plan_id: int) -> bool:
         """Удаление депозитного плана"""
-        with self.conn.cursor() as cur:
+        self.mark_write()
+        with self._write_cursor() as cur:
             # Проверяем, нет ли активных депозитов с этим планом
             cur.execute("""
                 SELECT COUNT(*) FROM deposits 
@@ -259,12 +1063,48 @@ class DatabaseManager:
                 raise ValueError("Нельзя удалить план, с которым связаны активные депозиты")
             
             cur.execute("DELETE FROM deposit_plans WHERE id = %s", (plan_id,))
-            self.conn.commit()
             return cur.rowcount > 0
 
+    def get_data_version(self, scope: str, primary: bool = False) -> int:
+        """
+        Текущая версия данных области scope ('plans', 'deposits:<client_id>').
+        'deposits' - все вклады: сумма версий клиентов (версии только растут,
+        поэтому сумма меняется при любой записи по вкладам).
+        primary=True - с основного сервера (реплика может еще не знать о записи)
+        """
+        with self._read_cursor(primary) as cur:
+            if scope == 'deposits':
+                cur.execute("""
+                    SELECT COALESCE(SUM(version), 0) FROM data_versions
+                    WHERE scope LIKE 'deposits:%'
+                """)
+            else:
+                cur.execute("SELECT version FROM data_versions WHERE scope = %s", (scope,))
+            row = cur.fetchone()
+            return row[0] if row else 0
+
+    def get_deposit_quote(self, plan_id: int, amount: Decimal, term_months: Optional[int] = None,
+                          capitalization: bool = False):
+        """
+        Предложение по активному плану: график выплат, итог по окончании
+        срока и выплаты при досрочном снятии (см. database/quotes.py).
+        Планы перечитываются только при смене их версии.
+        """
+        from database.quotes import quote_deposit
+
+        version = self.get_data_version("plans")
+        cached_version, plans = self._quote_plans
+        if cached_version != version:
+            plans = {plan.id: plan for plan in self.get_active_deposit_plans()}
+            self._quote_plans = (version, plans)
+        plan = plans.get(plan_id)
+        if plan is None:
+            raise ValueError("Депозитный план не найден или не активен")
+        return quote_deposit(plan, amount, term_months, capitalization)
+
     def get_deposit_plan_stats(self, plan_id: int) -> dict:
         """Получение статистики по депозитному плану"""
-        with self.conn.cursor() as cur:
+        with self._read_cursor() as cur:
             cur.execute("""
                 SELECT 
                     COUNT(*) as total_deposits,
@@ -290,90 +1130,227 @@ class DatabaseManager:
         Создание заявки на депозит (Статус 'pending'). 
         Транзакция открытия НЕ создается, пока банкир не одобрит.
         """
-        with self.conn.cursor() as cur:
-            try:
-                # Статус по умолчанию теперь 'pending'
-                cur.execute("""
-                    INSERT INTO deposits (client_id, deposit_plan_id, deposit_type, 
-                                        amount, interest_rate, open_date, status)
-                    VALUES (%s, %s, %s, %s, %s, %s, 'pending') RETURNING id
-                """, (deposit.client_id, plan_id, deposit.deposit_type, 
-                      deposit.amount, deposit.interest_rate, deposit.open_date))
-                deposit_id = cur.fetchone()[0]
-                self.conn.commit()
-                return deposit_id
-            except Exception as e:
-                self.conn.rollback()
-                raise e
+        return self._execute_write(self._open_deposit_op, deposit, plan_id)
+
+    def _open_deposit_op(self, cur, deposit: Deposit, plan_id: Optional[int] = None) -> int:
+        # Статус по умолчанию теперь 'pending'
+        cur.execute("""
+            INSERT INTO deposits (client_id, deposit_plan_id, deposit_type, 
+                                amount, interest_rate, open_date, status)
+            VALUES (%s, %s, %s, %s, %s, %s, 'pending') RETURNING id
+        """, (deposit.client_id, plan_id, deposit.deposit_type, 
+              deposit.amount, deposit.interest_rate, deposit.open_date))
+        return cur.fetchone()[0]
             
-    def approve_deposit(self, deposit_id: int):
+    def claim_pending_deposits(self, banker_id: str, limit: int = 50,
+                               lease_seconds: int = 300) -> list:
+        """
+        Захват пачки заявок банкиром на время аренды.
+        Строки, заблокированные другими банкирами, пропускаются (SKIP LOCKED),
+        поэтому параллельные вызовы получают непересекающиеся пачки.
+        """
+        self.mark_write()
+        with self._write_cursor() as cur:
+            cur.execute("""
+                WITH batch AS (
+                    SELECT id FROM deposits
+                    WHERE status = 'pending'
+                      AND (claimed_by IS NULL OR claimed_by = %s
+                           OR claim_expires_at < CURRENT_TIMESTAMP)
+                    ORDER BY open_date, id
+                    LIMIT %s
+                    FOR UPDATE SKIP LOCKED
+                )
+                UPDATE deposits d
+                SET claimed_by = %s,
+                    claim_expires_at = CURRENT_TIMESTAMP + make_interval(secs => %s)
+                FROM batch, clients c
+                WHERE d.id = batch.id AND c.id = d.client_id
+                RETURNING d.id, c.full_name, d.deposit_type, d.amount, d.open_date
+            """, (banker_id, limit, banker_id, lease_seconds))
+            rows = cur.fetchall()
+        return sorted(rows, key=lambda row: (row[4], row[0]))
+
+    def release_claims(self, banker_id: str, deposit_ids: Optional[List[int]] = None) -> int:
+        """Возврат захваченных заявок в общую очередь"""
+        self.mark_write()
+        with self._write_cursor() as cur:
+            cur.execute("""
+                UPDATE deposits SET claimed_by = NULL, claim_expires_at = NULL
+                WHERE claimed_by = %s AND status = 'pending'
+                  AND (%s::int[] IS NULL OR id = ANY(%s::int[]))
+            """, (banker_id, deposit_ids, deposit_ids))
+            return cur.rowcount
+
+    def _transition_pending(self, cur, deposit_id: int, new_status: str,
+                            banker_id: Optional[str]):
+        """
+        Условный переход pending -> new_status. Проходит, только если заявка
+        еще в статусе pending и не захвачена другим банкиром с живой арендой.
+        """
+        cur.execute("""
+            UPDATE deposits
+            SET status = %s, claimed_by = NULL, claim_expires_at = NULL
+            WHERE id = %s AND status = 'pending'
+              AND (claimed_by IS NULL OR claimed_by = %s
+                   OR claim_expires_at < CURRENT_TIMESTAMP)
+            RETURNING amount
+        """, (new_status, deposit_id, banker_id))
+        res = cur.fetchone()
+        if res:
+            return res
+
+        cur.execute("SELECT status, claimed_by FROM deposits WHERE id = %s", (deposit_id,))
+        current = cur.fetchone()
+        if not current:
+            raise ValueError("Депозит не найден")
+        status, claimed_by = current
+        if status != 'pending':
+            raise DepositConflictError(f"Заявка №{deposit_id} уже обработана (статус: {status})")
+        raise DepositConflictError(f"Заявка №{deposit_id} в работе у банкира {claimed_by}")
+
+    def approve_deposit(self, deposit_id: int, banker_id: Optional[str] = None):
         """Одобрение заявки банкиром"""
-        with self.conn.cursor() as cur:
-            try:
-                # 1. Получаем данные депозита
-                cur.execute("SELECT amount, open_date FROM deposits WHERE id = %s", (deposit_id,))
-                res = cur.fetchone()
-                if not res: raise ValueError("Депозит не найден")
-                amount, open_date = res
-
-                # 2. Меняем статус на active
-                cur.execute("UPDATE deposits SET status = 'active' WHERE id = %s", (deposit_id,))
-                
-                # 3. Создаем транзакцию открытия (деньги зачислены)
-                cur.execute("""
-                    INSERT INTO transactions (deposit_id, type, amount, description, transaction_date)
-                    VALUES (%s, 'open', %s, 'Вклад одобрен и открыт', CURRENT_TIMESTAMP)
-                """, (deposit_id, amount))
-                
-                self.conn.commit()
-            except Exception as e:
-                self.conn.rollback()
-                raise e
-
-    def reject_deposit(self, deposit_id: int):
+        return self._execute_write(self._approve_deposit_op, deposit_id, banker_id)
+
+    def _approve_deposit_op(self, cur, deposit_id: int, banker_id: Optional[str] = None):
+        # 1. Меняем статус на active (только из pending)
+        amount, = self._transition_pending(cur, deposit_id, 'active', banker_id)
+        
+        # 2. Создаем транзакцию открытия (деньги зачислены)
+        cur.execute("""
+            INSERT INTO transactions (deposit_id, type, amount, description, transaction_date)
+            VALUES (%s, 'open', %s, 'Вклад одобрен и открыт', CURRENT_TIMESTAMP)
+        """, (deposit_id, amount))
+
+    def reject_deposit(self, deposit_id: int, banker_id: Optional[str] = None):
         """Отклонение заявки"""
-        with self.conn.cursor() as cur:
-            cur.execute("UPDATE deposits SET status = 'rejected' WHERE id = %s", (deposit_id,))
-            self.conn.commit()
+        return self._execute_write(self._reject_deposit_op, deposit_id, banker_id)
 
-    def get_pending_deposits(self):
-        """Получение списка заявок на одобрение"""
-        with self.conn.cursor() as cur:
+    def _reject_deposit_op(self, cur, deposit_id: int, banker_id: Optional[str] = None):
+        self._transition_pending(cur, deposit_id, 'rejected', banker_id)
+
+    def process_deposits(self, banker_id: str, approve_ids: List[int] = (),
+                         reject_ids: List[int] = ()) -> dict:
+        """
+        Обработка пачки заявок. Каждая заявка - отдельная транзакция,
+        конфликты не прерывают пачку, а попадают в отчет.
+        """
+        report = {'approved': [], 'rejected': [], 'conflicts': []}
+        for ids, action, key in ((approve_ids, self.approve_deposit, 'approved'),
+                                 (reject_ids, self.reject_deposit, 'rejected')):
+            for deposit_id in ids:
+                try:
+                    action(deposit_id, banker_id)
+                    report[key].append(deposit_id)
+                except ValueError as e:
+                    report['conflicts'].append((deposit_id, str(e)))
+        return report
+
+    def get_pending_deposits(self, deposit_ids: Optional[List[int]] = None, primary: bool = False):
+        """
+        Получение списка заявок на одобрение (всех или только deposit_ids).
+        По уведомлению о новой заявке - primary=True: реплика ее может еще не видеть.
+        """
+        with self._read_cursor(primary) as cur:
             cur.execute("""
                 SELECT d.id, c.full_name, d.deposit_type, d.amount, d.open_date
                 FROM deposits d
                 JOIN clients c ON d.client_id = c.id
                 WHERE d.status = 'pending'
-                ORDER BY d.open_date
-            """)
+                  AND (%s::int[] IS NULL OR d.id = ANY(%s::int[]))
+                ORDER BY d.open_date, d.id
+            """, (deposit_ids, deposit_ids))
             return cur.fetchall()
         
-    def get_client_deposits(self, client_id: int) -> List[Deposit]:
-        """Получение депозитов клиента"""
-        with self.conn.cursor() as cur:
-            cur.execute("""
+    def get_client_deposits(self, client_id: int, include_archived: bool = False) -> List[Deposit]:
+        """Получение депозитов клиента (с архивом - если include_archived)"""
+        table = "all_deposits" if include_archived else "deposits"
+        with self._read_cursor() as cur:
+            cur.execute(f"""
                 SELECT id, client_id, deposit_type, amount, interest_rate, 
                        open_date, close_date, status
-                FROM deposits 
+                FROM {table} 
                 WHERE client_id = %s
                 ORDER BY open_date DESC
             """, (client_id,))
             
-            deposits = []
-            for row in cur.fetchall():
-                deposits.append(Deposit(
-                    id=row[0], client_id=row[1], deposit_type=row[2],
-                    amount=row[3], interest_rate=row[4], open_date=row[5],
-                    close_date=row[6], status=row[7]
-                ))
-            return deposits
+            return [self._deposit_from_row(row) for row in cur.fetchall()]
+
+    def get_deposits_page(self, client_id: int, fields: List[str], status: Optional[str] = None,
+                          date_from: Optional[date] = None, date_to: Optional[date] = None,
+                          after_id: Optional[int] = None, limit: int = 50,
+                          include_archived: bool = False) -> List[dict]:
+        """
+        Страница вкладов клиента, новые первыми (курсор - id последнего
+        вклада предыдущей страницы). Выбираются только колонки fields;
+        возвращается до limit + 1 строк, лишняя означает, что есть еще.
+        """
+        columns = ", ".join(f"{DEPOSIT_PAGE_FIELDS[name]} AS {name}" for name in fields)
+        table = "all_deposits" if include_archived else "deposits"
+        with self._read_cursor() as cur:
+            cur.execute(f"""
+                SELECT {columns}
+                FROM {table} d
+                WHERE d.client_id = %(client_id)s
+                  AND (%(status)s::varchar IS NULL OR d.status = %(status)s)
+                  AND (%(date_from)s::date IS NULL OR d.open_date >= %(date_from)s)
+                  AND (%(date_to)s::date IS NULL OR d.open_date <= %(date_to)s)
+                  AND (%(after_id)s::int IS NULL OR d.id < %(after_id)s)
+                ORDER BY d.id DESC
+                LIMIT %(limit)s
+            """, {'client_id': client_id, 'status': status, 'date_from': date_from,
+                  'date_to': date_to, 'after_id': after_id, 'limit': limit + 1})
+            return [dict(zip(fields, row)) for row in cur.fetchall()]
+
+    def get_transactions_page(self, client_id: int, deposit_id: int, fields: List[str],
+                              tx_type: Optional[str] = None, date_from: Optional[date] = None,
+                              date_to: Optional[date] = None, after: Optional[tuple] = None,
+                              limit: int = 50, include_archived: bool = False) -> Optional[List[dict]]:
+        """
+        Страница операций по вкладу клиента, новые первыми. Курсор -
+        (дата, id) последней операции предыдущей страницы. None - вклад
+        не найден или принадлежит другому клиенту.
+        """
+        columns = ", ".join(f"{TRANSACTION_PAGE_FIELDS[name]} AS {name}" for name in fields)
+        after_date, after_id = after or (None, None)
+        deposits, transactions = (("all_deposits", "all_transactions") if include_archived
+                                  else ("deposits", "transactions"))
+        with self._read_cursor() as cur:
+            cur.execute(f"SELECT 1 FROM {deposits} WHERE id = %s AND client_id = %s",
+                        (deposit_id, client_id))
+            if cur.fetchone() is None:
+                return None
+            cur.execute(f"""
+                SELECT {columns}
+                FROM {transactions} t
+                WHERE t.deposit_id = %(deposit_id)s
+                  AND (%(tx_type)s::varchar IS NULL OR t.type = %(tx_type)s)
+                  AND (%(date_from)s::date IS NULL OR t.transaction_date >= %(date_from)s)
+                  AND (%(date_to)s::date IS NULL OR t.transaction_date < %(date_to)s::date + 1)
+                  AND (%(after_date)s::timestamp IS NULL
+                       OR (t.transaction_date, t.id) < (%(after_date)s, %(after_id)s))
+                ORDER BY t.transaction_date DESC, t.id DESC
+                LIMIT %(limit)s
+            """, {'deposit_id': deposit_id, 'tx_type': tx_type, 'date_from': date_from,
+                  'date_to': date_to, 'after_date': after_date, 'after_id': after_id,
+                  'limit': limit + 1})
+            return [dict(zip(fields, row)) for row in cur.fetchall()]
+
+    @staticmethod
+    def _deposit_from_row(row) -> Deposit:
+        return Deposit(
+            id=row[0], client_id=row[1], deposit_type=row[2],
+            amount=row[3], interest_rate=row[4], open_date=row[5],
+            close_date=row[6], status=row[7]
+        )
 
     def calculate_interest(self, deposit_id: int) -> Decimal:
         """
         Расчет процентов с учетом налога 13%.
         Формула: Interest = (P * R * T / 365) * (1 - 0.13)
         """
-        with self.conn.cursor() as cur:
+        with self._read_cursor() as cur:
             cur.execute("""
                 SELECT amount, interest_rate, open_date, status, close_date
                 FROM deposits 
@@ -383,66 +1360,105 @@ class DatabaseManager:
             
             if not result: return Decimal(0)
             
-            amount, rate, open_date, status, close_date = result
-            
-            # Если закрыт, считаем до даты закрытия, если активен - до сегодня
-            end_date = close_date if status == 'closed' and close_date else date.today()
-            days = (end_date - open_date).days
-            
-            if days <= 0: return Decimal(0)
+            return calculate_net_interest(*result)
 
-            # Грязная прибыль
-            gross_interest = amount * (rate / 100) * days / 365
-            
-            # Налог 13%
-            tax_rate = Decimal('0.13')
-            net_interest = gross_interest * (1 - tax_rate)
-            
-            return net_interest.quantize(Decimal('0.01'))
+    def calculate_portfolio_interest(self, deposit_ids: Optional[List[int]] = None,
+                                     today: Optional[date] = None) -> Dict[int, Decimal]:
+        """
+        Проценты с учетом налога по множеству вкладов сразу (векторный
+        расчет в копейках, результат совпадает с calculate_interest).
+        """
+        from database.interest_engine import simple_net_interest, from_kopecks
+        import numpy as np
+
+        with self._read_cursor() as cur:
+            # Копейки, сотые доли процента и дни считаются на стороне БД
+            cur.execute("""
+                SELECT id, (amount * 100)::bigint, (interest_rate * 100)::bigint,
+                       CASE WHEN status = 'closed' AND close_date IS NOT NULL
+                            THEN close_date ELSE %s::date END - open_date
+                FROM deposits
+                WHERE %s::int[] IS NULL OR id = ANY(%s::int[])
+            """, (today or date.today(), deposit_ids, deposit_ids))
+            rows = cur.fetchall()
+
+        if not rows:
+            return {}
+        ids, amounts, rates, days = (np.array(col, dtype=np.int64) for col in zip(*rows))
+        return dict(zip(ids.tolist(), from_kopecks(simple_net_interest(amounts, rates, days))))
+
+    def get_client_dashboard(self, client_id: int) -> dict:
+        """
+        Данные личного кабинета одним вызовом: профиль, депозиты с
+        накопленными процентами и активные планы. Запросы выполняются
+        параллельно на соединениях из пула.
+        """
+        def fetch_profile(cur):
+            cur.execute("""
+                SELECT id, full_name, passport_data, phone_number, email, address, created_at, updated_at
+                FROM clients WHERE id = %s
+            """, (client_id,))
+            row = cur.fetchone()
+            return self._client_from_row(row) if row else None
+
+        def fetch_deposits(cur):
+            return self._fetch_deposit_summary(cur, client_id, date.today())
+
+        if self.deposit_cache is not None:
+            deposits = self.get_client_deposit_summary(client_id)
+            profile, plans = self.run_parallel(fetch_profile, self._fetch_active_plans)
+        else:
+            profile, deposits, plans = self.run_parallel(fetch_profile, fetch_deposits,
+                                                         self._fetch_active_plans)
+        return {
+            'profile': profile,
+            'deposits': deposits,
+            'plans': plans,
+            'total_accrued': sum((profit for _, profit in deposits), Decimal(0)),
+        }
 
     def close_deposit(self, deposit_id: int) -> Decimal:
         """Закрытие депозита и расчет итоговой суммы"""
-        with self.conn.cursor() as cur:
-            try:
-                # Получаем информацию о депозите
-                cur.execute("""
-                    SELECT amount, interest_rate, open_date 
-                    FROM deposits 
-                    WHERE id = %s AND status = 'active'
-                """, (deposit_id,))
-                result = cur.fetchone()
-                
-                if not result:
-                    raise ValueError("Активный депозит не найден")
-                
-                amount, rate, open_date = result
-                total_amount = amount + self.calculate_interest(deposit_id)
-                
-                # Обновляем статус депозита
-                cur.execute("""
-                    UPDATE deposits 
-                    SET status = 'closed', close_date = %s 
-                    WHERE id = %s
-                """, (date.today(), deposit_id))
-                
-                # Фиксируем операцию закрытия
-                cur.execute("""
-                    INSERT INTO transactions (deposit_id, type, amount, description)
-                    VALUES (%s, 'close', %s, 'Закрытие депозита с выплатой')
-                """, (deposit_id, total_amount))
-                
-                self.conn.commit()
-                return total_amount
-            except Exception as e:
-                self.conn.rollback()
-                raise e
-
-    def get_deposit_transactions(self, deposit_id: int) -> List[Transaction]:
-        """Получение транзакций по депозиту"""
-        with self.conn.cursor() as cur:
-            cur.execute("""
+        return self._execute_write(self._close_deposit_op, deposit_id)
+
+    def _close_deposit_op(self, cur, deposit_id: int) -> Decimal:
+        # Получаем информацию о депозите (строка блокируется до конца транзакции)
+        cur.execute("""
+            SELECT amount, interest_rate, open_date 
+            FROM deposits 
+            WHERE id = %s AND status = 'active'
+            FOR UPDATE
+        """, (deposit_id,))
+        result = cur.fetchone()
+        
+        if not result:
+            raise ValueError("Активный депозит не найден")
+        
+        amount, rate, open_date = result
+        total_amount = amount + calculate_net_interest(amount, rate, open_date, 'active', None)
+        
+        # Обновляем статус депозита
+        cur.execute("""
+            UPDATE deposits 
+            SET status = 'closed', close_date = %s 
+            WHERE id = %s
+        """, (date.today(), deposit_id))
+        
+        # Фиксируем операцию закрытия
+        cur.execute("""
+            INSERT INTO transactions (deposit_id, type, amount, description)
+            VALUES (%s, 'close', %s, 'Закрытие депозита с выплатой')
+        """, (deposit_id, total_amount))
+        
+        return total_amount
+
+    def get_deposit_transactions(self, deposit_id: int, include_archived: bool = False) -> List[Transaction]:
+        """Получение транзакций по депозиту (с архивом - если include_archived)"""
+        table = "all_transactions" if include_archived else "transactions"
+        with self._read_cursor() as cur:
+            cur.execute(f"""
                 SELECT id, deposit_id, type, amount, description, transaction_date
-                FROM transactions
+                FROM {table}
                 WHERE deposit_id = %s
                 ORDER BY transaction_date DESC
             """, (deposit_id,))
@@ -455,14 +1471,92 @@ class DatabaseManager:
                 ))
             return transactions
 
+    # --- ОСТАТКИ НА ДАТУ ---
+
+    def get_balance_as_of(self, deposit_id: int, as_of: date) -> Decimal:
+        """
+        Остаток вклада на конец дня as_of: ближайший месячный снимок
+        плюс операции вклада после него (см. database/snapshots.py).
+        """
+        with self._read_cursor() as cur:
+            cur.execute(DEPOSIT_AS_OF_SQL, {'deposit_id': deposit_id, 'as_of': as_of})
+            return cur.fetchone()[0]
+
+    def get_portfolio_as_of(self, as_of: date) -> dict:
+        """
+        Остаток всего портфеля и число действующих вкладов на конец дня
+        as_of: ближайший дневной снимок плюс операции после него.
+        """
+        with self._read_cursor() as cur:
+            cur.execute(PORTFOLIO_AS_OF_SQL, {'as_of': as_of})
+            balance, deposit_count, snapshot_date = cur.fetchone()
+            return {'as_of': as_of, 'balance': balance, 'deposits': deposit_count,
+                    'snapshot_date': snapshot_date}
+
+    def close(self):
+        """Закрытие соединения, пулов и писателя групповой фиксации"""
+        self.disable_group_commit()
+        if self.conn:
+            self.conn.close()
+            self.conn = None
+        for pool, _ in self.pools.values():
+            pool.closeall()
+        self.pools = {}
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
     def __del__(self):
         """Закрытие соединения при уничтожении объекта"""
         if self.conn:
             self.conn.close()
+        for pool, _ in self.pools.values():
+            pool.closeall()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False)
+
+    def warmup(self):
+        """
+        Прогрев перед приемом запросов: пулы открываются на полный размер,
+        и на каждом соединении выполняются горячие чтения. Так backend'ы
+        PostgreSQL заранее загружают кэши каталога и отношений, а первые
+        запросы пользователей не платят за установку соединений.
+        """
+        def hot_reads(cur):
+            self._fetch_active_plans(cur)
+            cur.execute("SELECT version FROM data_versions WHERE scope = 'plans'")
+            cur.execute("SELECT id FROM deposits WHERE client_id = 0 ORDER BY id DESC LIMIT 1")
+            cur.execute("""
+                SELECT id FROM transactions WHERE deposit_id = 0
+                ORDER BY transaction_date DESC, id DESC LIMIT 1
+            """)
+            cur.execute("SELECT id, password_hash FROM clients WHERE LOWER(email) = '-' AND email <> ''")
+
+        with self.conn.cursor() as cur:
+            hot_reads(cur)
+        self.conn.commit()
+
+        for replica in [None] + list(range(len(self.replica_configs))):
+            pool, slots = self._get_pool(replica)
+            conns = []
+            try:
+                for _ in range(self.pool_size):
+                    conns.append(pool.getconn())
+                for conn in conns:
+                    with conn.cursor() as cur:
+                        hot_reads(cur)
+                    conn.commit()
+            except psycopg2.Error:
+                # Недоступная реплика не мешает старту: чтения уйдут на основной сервер
+                if replica is None:
+                    raise
+            finally:
+                for conn in conns:
+                    pool.putconn(conn)
     
     def get_deposits_by_type_stats(self):
         """Получение данных для круговой диаграммы (распределение по типам)"""
-        with self.conn.cursor() as cur:
+        with self._read_cursor() as cur:
             cur.execute("""
                 SELECT deposit_type, COUNT(*), SUM(amount)
                 FROM deposits
@@ -473,7 +1567,7 @@ class DatabaseManager:
 
     def get_deposits_timeline(self):
         """Получение динамики открытия депозитов по датам"""
-        with self.conn.cursor() as cur:
+        with self._read_cursor() as cur:
             cur.execute("""
                 SELECT open_date, SUM(amount)
                 FROM deposits
@@ -484,6 +1578,6 @@ class DatabaseManager:
 
     def get_all_active_amounts(self):
         """Получение списка сумм всех активных депозитов для статистики"""
-        with self.conn.cursor() as cur:
+        with self._read_cursor() as cur:
             cur.execute("SELECT amount FROM deposits WHERE status='active'")
             return [row[0] for row in cur.fetchall()]
\ No newline at end of file
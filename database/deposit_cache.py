@@ -0,0 +1,159 @@
+import sys
+import threading
+from collections import OrderedDict
+from dataclasses import fields, is_dataclass
+from datetime import date
+from typing import Optional
+
+
+def estimate_size(value) -> int:
+    """Приблизительный размер объекта в памяти вместе с вложенными (байт)"""
+    size = sys.getsizeof(value)
+    if is_dataclass(value):
+        size += sys.getsizeof(value.__dict__)
+        size += sum(estimate_size(getattr(value, f.name)) for f in fields(value))
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    elif isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    return size
+
+
+class DepositSummaryCache:
+    """
+    Ограниченный по памяти LRU-кэш сводок по вкладам клиентов:
+    client_id -> (рабочая дата, версия, [(Deposit, накопленные проценты)]).
+
+    Проценты растут каждый день, поэтому запись действительна только для
+    той рабочей даты, на которую посчитана. Записи сбрасываются методом
+    invalidate после каждой записи по вкладам клиента; записи других
+    процессов приходят через LISTEN с задержкой, поэтому запись хранит
+    еще и версию данных клиента ('deposits:<client_id>' в data_versions)
+    и при другой версии считается промахом.
+
+    Чтение из БД и запись в кэш не атомарны: сводка, прочитанная до
+    фиксации изменения, могла бы попасть в кэш уже после сброса. Поэтому
+    чтение начинается с begin(), а put() отбрасывает сводку, если клиент
+    был сброшен после этого момента.
+    """
+
+    # Сколько последних сбросов помнить поименно (сверх - общий порог)
+    MAX_TRACKED_INVALIDATIONS = 10000
+
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        # Номер последнего сброса: общий и по клиентам
+        self._sequence = 0
+        self._invalidated = {}
+        self._floor = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.rejected = 0
+
+    def begin(self) -> int:
+        """Отметка начала чтения из БД (передается в put)"""
+        with self._lock:
+            return self._sequence
+
+    def get(self, client_id: int, business_date: Optional[date] = None,
+            version: Optional[int] = None):
+        """Сводка клиента на рабочую дату и версию данных или None"""
+        business_date = business_date or date.today()
+        with self._lock:
+            entry = self._entries.get(client_id)
+            if entry is None or entry[0] != business_date or entry[1] != version:
+                if entry is not None:
+                    self._remove(client_id)
+                self.misses += 1
+                return None
+            self._entries.move_to_end(client_id)
+            self.hits += 1
+            return entry[2]
+
+    def put(self, client_id: int, summary: list, started: int,
+            business_date: Optional[date] = None, version: Optional[int] = None) -> bool:
+        """Сохранение сводки, прочитанной после begin() -> started"""
+        business_date = business_date or date.today()
+        size = estimate_size(summary)
+        with self._lock:
+            if started < self._floor or self._invalidated.get(client_id, -1) > started:
+                self.rejected += 1
+                return False
+            if size > self.max_bytes:
+                return False
+            if client_id in self._entries:
+                self._remove(client_id)
+            self._entries[client_id] = (business_date, version, summary, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+            return True
+
+    def invalidate(self, client_id: int):
+        """Сброс сводки клиента (после фиксации записи по его вкладам)"""
+        with self._lock:
+            self._sequence += 1
+            self._invalidated[client_id] = self._sequence
+            if len(self._invalidated) > self.MAX_TRACKED_INVALIDATIONS:
+                # Все чтения, начатые раньше, считаются устаревшими
+                self._invalidated.clear()
+                self._floor = self._sequence
+            if client_id in self._entries:
+                self._remove(client_id)
+            self.invalidations += 1
+
+    def clear(self):
+        """Сброс всех сводок (например, после потери уведомлений)"""
+        with self._lock:
+            self._sequence += 1
+            self._invalidated.clear()
+            self._floor = self._sequence
+            self._entries.clear()
+            self._bytes = 0
+            self.invalidations += 1
+
+    def _remove(self, client_id: int):
+        *_, size = self._entries.pop(client_id)
+        self._bytes -= size
+
+    def metrics(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'rejected_puts': self.rejected,
+            }
+
+
+def follow_deposit_events(cache: DepositSummaryCache, listener):
+    """
+    Сброс сводок по уведомлениям DepositEventListener: записи других
+    процессов (GUI банкира, другие воркеры) тоже меняют вклады клиентов.
+    """
+    subscription = listener.subscribe()
+
+    def run():
+        while True:
+            event = subscription.get()
+            if event.get('type') == 'resync':
+                cache.clear()
+            elif event.get('client_id') is not None:
+                cache.invalidate(event['client_id'])
+
+    thread = threading.Thread(target=run, name="deposit-cache-events", daemon=True)
+    thread.start()
+    return thread
@@ -0,0 +1,234 @@
+"""
+Потоковая выгрузка операций и вкладов (CSV, Parquet).
+
+Данные идут из COPY ... TO STDOUT напрямую в получателя: в очередь
+ответа Flask или в писатель Parquet. В памяти Python одновременно
+лежит лишь несколько блоков, поэтому объем выгрузки не ограничен.
+"""
+import os
+import queue
+import threading
+from dataclasses import dataclass
+from datetime import date
+from typing import Optional
+
+# Выгружаемые наборы: колонки и таблицы запроса (горячие таблицы или
+# представления с архивом - подставляются при сборке запроса)
+EXPORT_QUERIES = {
+    'transactions': """
+        SELECT t.id, t.deposit_id, d.client_id, d.deposit_plan_id, t.type, t.amount,
+               t.description, t.transaction_date
+        FROM {transactions} t
+        JOIN {deposits} d ON d.id = t.deposit_id
+    """,
+    'deposits': """
+        SELECT d.id, d.client_id, d.deposit_plan_id, d.deposit_type, d.amount,
+               d.interest_rate, d.open_date, d.close_date, d.maturity_date, d.status
+        FROM {deposits} d
+    """,
+}
+
+# Колонка даты для фильтра и порядок строк каждого набора
+EXPORT_DATE_COLUMNS = {'transactions': 't.transaction_date', 'deposits': 'd.open_date'}
+EXPORT_ORDER = {'transactions': 't.id', 'deposits': 'd.id'}
+
+_QUEUE_CHUNKS = 64
+_PUT_TIMEOUT = 0.5
+
+
+class ExportCancelled(Exception):
+    """Получатель выгрузки отключился"""
+
+
+@dataclass
+class ExportFilters:
+    date_from: Optional[date] = None
+    date_to: Optional[date] = None
+    client_id: Optional[int] = None
+    plan_id: Optional[int] = None
+    # Вместе с холодным архивом (представления all_deposits/all_transactions)
+    include_archived: bool = False
+
+
+def build_export_query(cur, dataset: str, filters: ExportFilters) -> str:
+    """Готовый (с подставленными параметрами) запрос для COPY"""
+    if dataset not in EXPORT_QUERIES:
+        raise ValueError(f"Неизвестный набор данных: {dataset}")
+    date_column = EXPORT_DATE_COLUMNS[dataset]
+    conditions, params = [], []
+    if filters.date_from is not None:
+        conditions.append(f"{date_column} >= %s")
+        params.append(filters.date_from)
+    if filters.date_to is not None:
+        # Дата включительно, в том числе для колонки TIMESTAMP
+        conditions.append(f"{date_column} < %s::date + 1")
+        params.append(filters.date_to)
+    if filters.client_id is not None:
+        conditions.append("d.client_id = %s")
+        params.append(filters.client_id)
+    if filters.plan_id is not None:
+        conditions.append("d.deposit_plan_id = %s")
+        params.append(filters.plan_id)
+
+    if filters.include_archived:
+        query = EXPORT_QUERIES[dataset].format(deposits="all_deposits", transactions="all_transactions")
+    else:
+        query = EXPORT_QUERIES[dataset].format(deposits="deposits", transactions="transactions")
+    if conditions:
+        query += " WHERE " + " AND ".join(conditions)
+    query += f" ORDER BY {EXPORT_ORDER[dataset]}"
+    # COPY не принимает параметры, поэтому запрос собирается через mogrify
+    return cur.mogrify(query, params).decode()
+
+
+def copy_csv(db, dataset: str, filters: ExportFilters, out):
+    """COPY набора в CSV (с заголовком) в файловый объект out"""
+    db.copy_to(lambda cur: f"COPY ({build_export_query(cur, dataset, filters)}) "
+                           f"TO STDOUT WITH (FORMAT csv, HEADER)", out)
+
+
+class _QueueWriter:
+    """Файловый объект, отдающий записанные блоки в ограниченную очередь"""
+
+    def __init__(self, chunks: queue.Queue, cancelled: threading.Event):
+        self.chunks = chunks
+        self.cancelled = cancelled
+        self.position = 0
+        self.closed = False
+
+    def write(self, data):
+        data = bytes(data)
+        while True:
+            if self.cancelled.is_set():
+                raise ExportCancelled()
+            try:
+                self.chunks.put(data, timeout=_PUT_TIMEOUT)
+                break
+            except queue.Full:
+                continue
+        self.position += len(data)
+        return len(data)
+
+    # ParquetWriter пишет последовательно, но спрашивает позицию для футера
+    def tell(self):
+        return self.position
+
+    def writable(self):
+        return True
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def _produce(target, writer: _QueueWriter):
+    """target(writer) в отдельном потоке; конец данных - None, ошибка - исключение в очереди"""
+    def run():
+        try:
+            target(writer)
+            writer.chunks.put(None)
+        except ExportCancelled:
+            pass
+        except Exception as e:
+            writer.chunks.put(e)
+
+    thread = threading.Thread(target=run, name="export", daemon=True)
+    thread.start()
+    return thread
+
+
+def _consume(chunks: queue.Queue, cancelled: threading.Event, thread):
+    try:
+        while True:
+            chunk = chunks.get()
+            if chunk is None:
+                break
+            if isinstance(chunk, Exception):
+                raise chunk
+            yield chunk
+    finally:
+        # Клиент отключился или выгрузка упала - останавливаем COPY
+        cancelled.set()
+        while thread.is_alive():
+            # Освобождаем место в очереди, чтобы поток не повис на put
+            try:
+                chunks.get(timeout=_PUT_TIMEOUT)
+            except queue.Empty:
+                pass
+
+
+def iter_csv(db, dataset: str, filters: ExportFilters):
+    """Генератор блоков CSV для потокового ответа (COPY стартует при первом next)"""
+    chunks, cancelled = queue.Queue(_QUEUE_CHUNKS), threading.Event()
+    writer = _QueueWriter(chunks, cancelled)
+    thread = _produce(lambda out: copy_csv(db, dataset, filters, out), writer)
+    yield from _consume(chunks, cancelled, thread)
+
+
+def _parquet_schema(dataset: str):
+    import pyarrow as pa
+
+    money, rate = pa.decimal128(15, 2), pa.decimal128(5, 2)
+    columns = {
+        'transactions': [('id', pa.int32()), ('deposit_id', pa.int32()),
+                         ('client_id', pa.int32()), ('deposit_plan_id', pa.int32()),
+                         ('type', pa.string()), ('amount', money),
+                         ('description', pa.string()), ('transaction_date', pa.timestamp('us'))],
+        'deposits': [('id', pa.int32()), ('client_id', pa.int32()),
+                     ('deposit_plan_id', pa.int32()), ('deposit_type', pa.string()),
+                     ('amount', money), ('interest_rate', rate), ('open_date', pa.date32()),
+                     ('close_date', pa.date32()), ('maturity_date', pa.date32()),
+                     ('status', pa.string())],
+    }[dataset]
+    return pa.schema(columns)
+
+
+def write_parquet(db, dataset: str, filters: ExportFilters, sink, block_size: int = 1 << 20):
+    """
+    Выгрузка набора в Parquet.
+
+    CSV из COPY идет через pipe в потоковый CSV-ридер pyarrow, каждая
+    прочитанная пачка сразу пишется группой строк в sink (путь или
+    файловый объект; подойдет и поток без seek).
+    """
+    import pyarrow.csv as pa_csv
+    import pyarrow.parquet as pq
+
+    schema = _parquet_schema(dataset)
+    read_fd, write_fd = os.pipe()
+    errors = []
+
+    def produce():
+        try:
+            with os.fdopen(write_fd, 'wb') as pipe:
+                copy_csv(db, dataset, filters, pipe)
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=produce, name="export-parquet", daemon=True)
+    thread.start()
+    try:
+        with os.fdopen(read_fd, 'rb') as pipe:
+            reader = pa_csv.open_csv(
+                pipe,
+                read_options=pa_csv.ReadOptions(block_size=block_size),
+                convert_options=pa_csv.ConvertOptions(column_types=schema,
+                                                      strings_can_be_null=True),
+            )
+            with pq.ParquetWriter(sink, schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+    finally:
+        thread.join()
+    if errors:
+        raise errors[0]
+
+
+def iter_parquet(db, dataset: str, filters: ExportFilters):
+    """Генератор блоков Parquet для потокового ответа"""
+    chunks, cancelled = queue.Queue(_QUEUE_CHUNKS), threading.Event()
+    writer = _QueueWriter(chunks, cancelled)
+    thread = _produce(lambda out: write_parquet(db, dataset, filters, out), writer)
+    yield from _consume(chunks, cancelled, thread)
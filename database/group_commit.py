@@ -0,0 +1,126 @@
+import contextvars
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import psycopg2
+import psycopg2.errors
+
+_STOP = object()
+
+
+class GroupCommitWriter:
+    """
+    Групповая фиксация записей.
+
+    Операции вида op(cur, *args) ставятся в очередь, а поток-писатель
+    собирает их в пачку (до interval_ms миллисекунд или max_batch штук)
+    и выполняет одной транзакцией с одним COMMIT, то есть с одним fsync
+    WAL на всю пачку. Каждая операция идет под своей точкой сохранения:
+    ошибка одной операции откатывает только ее. Результаты отдаются
+    через Future после успешного COMMIT.
+
+    Операции пачки выполняются друг за другом, поэтому операция, ждущая
+    блокировку строки, задержала бы всю пачку. Транзакция пачки идет с
+    lock_timeout: такая операция получает ошибку, остальные фиксируются.
+    """
+
+    def __init__(self, db_config: dict, interval_ms: float = 5, max_batch: int = 500,
+                 lock_timeout_ms: int = 1000):
+        self.db_config = db_config
+        self.interval = interval_ms / 1000
+        self.max_batch = max_batch
+        self.lock_timeout_ms = lock_timeout_ms
+        self._queue = queue.Queue()
+        self._thread = None
+        self._conn = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Остановка писателя; операции, уже стоящие в очереди, выполняются"""
+        self._queue.put(_STOP)
+        if self._thread is not None:
+            self._thread.join()
+
+    def submit(self, op, *args) -> Future:
+        future = Future()
+        # Операция выполняется в контексте отправителя (спан трассы, сессия чтения)
+        self._queue.put((future, op, args, contextvars.copy_context()))
+        return future
+
+    def _collect_batch(self, first):
+        batch = [first]
+        deadline = time.monotonic() + self.interval
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                item = self._queue.get(timeout=remaining)
+            except queue.Empty:
+                break
+            if item is _STOP:
+                self._queue.put(_STOP)
+                break
+            batch.append(item)
+        return batch
+
+    def _execute_batch(self, batch):
+        outcomes = []
+        with self._conn.cursor() as cur:
+            if self.lock_timeout_ms:
+                cur.execute("SET LOCAL lock_timeout = %s", (f"{int(self.lock_timeout_ms)}ms",))
+            for future, op, args, context in batch:
+                if not future.set_running_or_notify_cancel():
+                    continue
+                cur.execute("SAVEPOINT group_op")
+                try:
+                    value = context.run(op, cur, *args)
+                    cur.execute("RELEASE SAVEPOINT group_op")
+                    outcomes.append((future, None, value))
+                except psycopg2.errors.LockNotAvailable as e:
+                    # Ошибка одной операции, соединение исправно
+                    cur.execute("ROLLBACK TO SAVEPOINT group_op")
+                    outcomes.append((future, e, None))
+                except (psycopg2.OperationalError, psycopg2.InterfaceError):
+                    raise
+                except Exception as e:
+                    cur.execute("ROLLBACK TO SAVEPOINT group_op")
+                    outcomes.append((future, e, None))
+        self._conn.commit()
+        return outcomes
+
+    def _run(self):
+        while True:
+            first = self._queue.get()
+            if first is _STOP:
+                break
+            batch = self._collect_batch(first)
+            try:
+                if self._conn is None or self._conn.closed:
+                    self._conn = psycopg2.connect(**self.db_config)
+                outcomes = self._execute_batch(batch)
+            except Exception as e:
+                # Пачка не зафиксирована целиком - ошибка для всех ее операций
+                if self._conn is not None and not self._conn.closed:
+                    try:
+                        self._conn.rollback()
+                    except psycopg2.Error:
+                        self._conn.close()
+                for future, *_ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+
+            for future, error, value in outcomes:
+                if error is not None:
+                    future.set_exception(error)
+                else:
+                    future.set_result(value)
+
+        if self._conn is not None and not self._conn.closed:
+            self._conn.close()
@@ -0,0 +1,45 @@
+from datetime import date
+from decimal import Decimal
+from typing import Optional
+
+TAX_RATE = Decimal('0.13')
+
+def calculate_net_interest(amount: Decimal, rate: Decimal, open_date: date,
+                           status: str, close_date: Optional[date],
+                           today: Optional[date] = None) -> Decimal:
+    """
+    Расчет процентов с учетом налога 13% по данным строки депозита.
+    Формула: Interest = (P * R * T / 365) * (1 - 0.13)
+    """
+    # Если закрыт, считаем до даты закрытия, если активен - до сегодня
+    end_date = close_date if status == 'closed' and close_date else (today or date.today())
+    days = (end_date - open_date).days
+
+    if days <= 0: return Decimal(0)
+
+    # Грязная прибыль
+    gross_interest = amount * (rate / 100) * days / 365
+
+    # Налог 13%
+    net_interest = gross_interest * (1 - TAX_RATE)
+
+    return net_interest.quantize(Decimal('0.01'))
+
+def calculate_compound_net_interest(amount: Decimal, rate: Decimal, days: int,
+                                    period_days: int = 30) -> Decimal:
+    """
+    Проценты с капитализацией каждые period_days дней с учетом налога 13%.
+    Проценты за период округляются до копеек и прибавляются к сумме;
+    неполный последний период считается по простой формуле.
+    """
+    if days <= 0: return Decimal(0)
+
+    principal = amount
+    gross_total = Decimal(0)
+    full_periods, tail = divmod(days, period_days)
+    for period in [period_days] * full_periods + ([tail] if tail else []):
+        gross = (principal * (rate / 100) * period / 365).quantize(Decimal('0.01'))
+        principal += gross
+        gross_total += gross
+
+    return (gross_total * (1 - TAX_RATE)).quantize(Decimal('0.01'))
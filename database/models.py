@@ -12,6 +12,11 @@ class Client:
     email: str = ""
     address: str = ""
     created_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+    # Из client_summary (поддерживается триггерами на deposits)
+    active_deposits: int = 0
+    active_balance: Decimal = Decimal(0)
+    last_activity: Optional[datetime] = None
 
 @dataclass
 class Deposit:
@@ -0,0 +1,139 @@
+import json
+import queue
+import select
+import threading
+import time
+from typing import Optional
+
+import psycopg2
+import psycopg2.extensions
+
+# Канал NOTIFY, в который триггер на deposits пишет смену статуса
+DEPOSIT_EVENTS_CHANNEL = 'deposit_events'
+
+# Событие для подписчиков после переподключения: часть уведомлений
+# могла быть потеряна, данные нужно перечитать целиком
+RESYNC_EVENT = {'type': 'resync'}
+
+
+class DepositEventListener:
+    """
+    Слушатель PostgreSQL LISTEN/NOTIFY.
+
+    Один поток держит отдельное соединение с LISTEN и раздает события
+    всем подписчикам через их очереди. Медленный подписчик теряет самые
+    старые события, но не блокирует остальных.
+    """
+
+    def __init__(self, db_config: dict, channel: str = DEPOSIT_EVENTS_CHANNEL,
+                 queue_size: int = 100, poll_timeout: float = 5.0):
+        self.db_config = db_config
+        self.channel = channel
+        self.queue_size = queue_size
+        self.poll_timeout = poll_timeout
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stopped = threading.Event()
+
+    def start(self):
+        """Запуск потока слушателя (повторный вызов ничего не делает)"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run, name=f"listen-{self.channel}",
+                                            daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+
+    def subscribe(self, client_id: Optional[int] = None) -> queue.Queue:
+        """Подписка на события; client_id ограничивает события одним клиентом"""
+        q = queue.Queue(maxsize=self.queue_size)
+        with self._lock:
+            self._subscribers[q] = client_id
+        return q
+
+    def unsubscribe(self, q: queue.Queue):
+        with self._lock:
+            self._subscribers.pop(q, None)
+
+    def publish(self, event: dict):
+        """Раздача события подписчикам (вызывается из потока слушателя)"""
+        with self._lock:
+            subscribers = list(self._subscribers.items())
+
+        client_id = event.get('client_id')
+        for q, client_filter in subscribers:
+            if client_filter is not None and client_id is not None and client_filter != client_id:
+                continue
+            while True:
+                try:
+                    q.put_nowait(event)
+                    break
+                except queue.Full:
+                    try:
+                        q.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def _connect(self):
+        conn = psycopg2.connect(**self.db_config)
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        with conn.cursor() as cur:
+            cur.execute(f"LISTEN {self.channel}")
+        return conn
+
+    def _run(self):
+        conn = None
+        connected_before = False
+        reconnect_delay = 1
+        while not self._stopped.is_set():
+            try:
+                if conn is None:
+                    conn = self._connect()
+                    reconnect_delay = 1
+                    # Пока соединения не было, уведомления могли потеряться
+                    if connected_before:
+                        self.publish(RESYNC_EVENT)
+                    connected_before = True
+
+                if select.select([conn], [], [], self.poll_timeout) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    try:
+                        event = json.loads(notify.payload)
+                    except ValueError:
+                        continue
+                    event.setdefault('type', 'deposit')
+                    self.publish(event)
+            except psycopg2.Error:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except psycopg2.Error:
+                        pass
+                conn = None
+                time.sleep(reconnect_delay)
+                reconnect_delay = min(reconnect_delay * 2, 30)
+
+        if conn is not None:
+            conn.close()
+
+
+_shared_listeners = {}
+_shared_lock = threading.Lock()
+
+def shared_listener(db_config: dict, channel: str = DEPOSIT_EVENTS_CHANNEL) -> DepositEventListener:
+    """Общий для процесса запущенный слушатель канала (один поток LISTEN на процесс)"""
+    key = (tuple(sorted((k, str(v)) for k, v in db_config.items())), channel)
+    with _shared_lock:
+        listener = _shared_listeners.get(key)
+        if listener is None:
+            listener = _shared_listeners[key] = DepositEventListener(db_config, channel)
+    listener.start()
+    return listener
@@ -0,0 +1,197 @@
+"""
+Снимки остатков для запросов "на дату" без прохода по всему журналу.
+
+Остаток вклада - сумма операций со знаком: 'open' добавляет сумму
+вклада, 'close' возвращает вложенную сумму (проценты в выплате - доход
+клиента, а не остаток). Сумма аддитивна, поэтому
+    остаток(D) = снимок(S) + операции в (S, D],   S <= D
+и запрос на дату читает один ближайший снимок и короткий хвост журнала.
+
+Снимки строятся инкрементально: по вкладам - на конец месяца (только
+ненулевые остатки), по портфелю - на конец каждого дня. Журнал читается
+через all_transactions/all_deposits, поэтому снимки не ломаются после
+переноса вкладов в архив.
+"""
+from datetime import date, timedelta
+from typing import Optional
+
+# Изменение остатка вклада операцией t (d - вклад операции)
+SIGNED_AMOUNT = """
+    CASE t.type WHEN 'open' THEN t.amount WHEN 'close' THEN -d.amount ELSE 0 END
+"""
+# Изменение числа действующих вкладов
+SIGNED_COUNT = "CASE t.type WHEN 'open' THEN 1 WHEN 'close' THEN -1 ELSE 0 END"
+
+# Снимок вклада на конец месяца: предыдущий снимок + операции за месяц
+DEPOSIT_SNAPSHOT_SQL = f"""
+    INSERT INTO deposit_balance_snapshots (deposit_id, snapshot_date, balance)
+    SELECT deposit_id, %(snapshot_date)s, SUM(balance)
+    FROM (
+        SELECT deposit_id, balance FROM deposit_balance_snapshots
+        WHERE snapshot_date = %(previous)s
+        UNION ALL
+        SELECT t.deposit_id, {SIGNED_AMOUNT}
+        FROM all_transactions t
+        JOIN all_deposits d ON d.id = t.deposit_id
+        WHERE (%(previous)s::date IS NULL OR t.transaction_date >= %(previous)s::date + 1)
+          AND t.transaction_date < %(snapshot_date)s::date + 1
+    ) balances
+    GROUP BY deposit_id
+    HAVING SUM(balance) <> 0
+"""
+
+# Снимки портфеля на каждый день (from_date, to_date]: последний снимок
+# + нарастающий итог дневных изменений, одним проходом по журналу
+PORTFOLIO_SNAPSHOT_SQL = f"""
+    WITH base AS (
+        SELECT COALESCE((SELECT balance FROM portfolio_balance_snapshots
+                         WHERE snapshot_date = %(from_date)s), 0) AS balance,
+               COALESCE((SELECT deposit_count FROM portfolio_balance_snapshots
+                         WHERE snapshot_date = %(from_date)s), 0) AS deposit_count
+    ),
+    daily AS (
+        SELECT t.transaction_date::date AS day, SUM({SIGNED_AMOUNT}) AS balance,
+               SUM({SIGNED_COUNT}) AS deposit_count
+        FROM all_transactions t
+        JOIN all_deposits d ON d.id = t.deposit_id
+        WHERE (%(from_date)s::date IS NULL OR t.transaction_date >= %(from_date)s::date + 1)
+          AND t.transaction_date < %(to_date)s::date + 1
+        GROUP BY 1
+    ),
+    days AS (
+        SELECT generate_series(COALESCE(%(from_date)s::date + 1,
+                                        (SELECT MIN(day) FROM daily), %(to_date)s::date),
+                               %(to_date)s::date, interval '1 day')::date AS day
+    )
+    INSERT INTO portfolio_balance_snapshots (snapshot_date, balance, deposit_count)
+    SELECT days.day,
+           base.balance + COALESCE(SUM(daily.balance) OVER w, 0),
+           base.deposit_count + COALESCE(SUM(daily.deposit_count) OVER w, 0)
+    FROM days
+    CROSS JOIN base
+    LEFT JOIN daily ON daily.day = days.day
+    WINDOW w AS (ORDER BY days.day)
+"""
+
+# Остаток вклада на дату: ближайший снимок + хвост операций вклада
+DEPOSIT_AS_OF_SQL = f"""
+    WITH snapshot AS (
+        SELECT snapshot_date, balance FROM deposit_balance_snapshots
+        WHERE deposit_id = %(deposit_id)s AND snapshot_date <= %(as_of)s
+        ORDER BY snapshot_date DESC
+        LIMIT 1
+    )
+    SELECT COALESCE((SELECT balance FROM snapshot), 0) + COALESCE(SUM({SIGNED_AMOUNT}), 0),
+           (SELECT snapshot_date FROM snapshot)
+    FROM all_transactions t
+    JOIN all_deposits d ON d.id = t.deposit_id
+    WHERE t.deposit_id = %(deposit_id)s
+      AND t.transaction_date < %(as_of)s::date + 1
+      AND ((SELECT snapshot_date FROM snapshot) IS NULL
+           OR t.transaction_date >= (SELECT snapshot_date FROM snapshot) + 1)
+"""
+
+# Портфель на дату: ближайший дневной снимок + операции после него
+PORTFOLIO_AS_OF_SQL = f"""
+    WITH snapshot AS (
+        SELECT snapshot_date, balance, deposit_count FROM portfolio_balance_snapshots
+        WHERE snapshot_date <= %(as_of)s
+        ORDER BY snapshot_date DESC
+        LIMIT 1
+    )
+    SELECT COALESCE((SELECT balance FROM snapshot), 0) + COALESCE(SUM({SIGNED_AMOUNT}), 0),
+           COALESCE((SELECT deposit_count FROM snapshot), 0) + COALESCE(SUM({SIGNED_COUNT}), 0),
+           (SELECT snapshot_date FROM snapshot)
+    FROM all_transactions t
+    JOIN all_deposits d ON d.id = t.deposit_id
+    WHERE t.transaction_date < %(as_of)s::date + 1
+      AND ((SELECT snapshot_date FROM snapshot) IS NULL
+           OR t.transaction_date >= (SELECT snapshot_date FROM snapshot) + 1)
+"""
+
+
+def month_end(day: date) -> date:
+    next_month = (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def get_watermark(cur, grain: str) -> Optional[date]:
+    """Дата, по которую включительно построены снимки grain ('deposit'/'portfolio')"""
+    cur.execute("SELECT built_through FROM snapshot_watermarks WHERE grain = %s", (grain,))
+    row = cur.fetchone()
+    return row[0] if row else None
+
+
+def _set_watermark(cur, grain: str, built_through: Optional[date]):
+    cur.execute("""
+        INSERT INTO snapshot_watermarks (grain, built_through) VALUES (%s, %s)
+        ON CONFLICT (grain) DO UPDATE SET built_through = EXCLUDED.built_through
+    """, (grain, built_through))
+
+
+def _rewind(cur, grain: str, table: str, rebuild_from: date, watermark: Optional[date]):
+    """Удаление снимков с даты rebuild_from (операции задним числом)"""
+    if watermark is None or rebuild_from > watermark:
+        return watermark
+    cur.execute(f"DELETE FROM {table} WHERE snapshot_date >= %s", (rebuild_from,))
+    cur.execute(f"SELECT MAX(snapshot_date) FROM {table} WHERE snapshot_date < %s",
+                (rebuild_from,))
+    watermark = cur.fetchone()[0]
+    _set_watermark(cur, grain, watermark)
+    return watermark
+
+
+def build_deposit_snapshots(conn, through: date, rebuild_from: Optional[date] = None) -> int:
+    """
+    Снимки вкладов на концы месяцев, закончившихся не позже through.
+    Каждый месяц - отдельная транзакция; возвращает число построенных месяцев.
+    """
+    months = 0
+    try:
+        with conn.cursor() as cur:
+            watermark = get_watermark(cur, 'deposit')
+            if rebuild_from is not None:
+                watermark = _rewind(cur, 'deposit', 'deposit_balance_snapshots',
+                                    month_end(rebuild_from), watermark)
+            conn.commit()
+
+            if watermark is None:
+                cur.execute("SELECT MIN(transaction_date)::date FROM all_transactions")
+                first = cur.fetchone()[0]
+                if first is None:
+                    return 0
+                target = month_end(first)
+            else:
+                target = month_end(watermark + timedelta(days=1))
+
+            while target <= through:
+                cur.execute(DEPOSIT_SNAPSHOT_SQL, {'snapshot_date': target, 'previous': watermark})
+                _set_watermark(cur, 'deposit', target)
+                conn.commit()
+                watermark, target = target, month_end(target + timedelta(days=1))
+                months += 1
+    except Exception:
+        conn.rollback()
+        raise
+    return months
+
+
+def build_portfolio_snapshots(conn, through: date, rebuild_from: Optional[date] = None) -> int:
+    """Дневные снимки портфеля по through включительно; возвращает число новых дней"""
+    try:
+        with conn.cursor() as cur:
+            watermark = get_watermark(cur, 'portfolio')
+            if rebuild_from is not None:
+                watermark = _rewind(cur, 'portfolio', 'portfolio_balance_snapshots',
+                                    rebuild_from, watermark)
+            if watermark is not None and watermark >= through:
+                conn.commit()
+                return 0
+            cur.execute(PORTFOLIO_SNAPSHOT_SQL, {'from_date': watermark, 'to_date': through})
+            days = cur.rowcount
+            _set_watermark(cur, 'portfolio', through)
+        conn.commit()
+        return days
+    except Exception:
+        conn.rollback()
+        raise
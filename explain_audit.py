@@ -0,0 +1,399 @@
+"""
+Регрессионная проверка планов запросов DatabaseManager и советник индексов.
+
+Скрипт наполняет отдельную базу большим синтетическим набором данных,
+вызывает читающие методы DatabaseManager, перехватывает выполненные ими
+SQL-запросы и прогоняет каждый через EXPLAIN (ANALYZE, BUFFERS).
+В планах ищутся последовательные сканирования больших таблиц, сортировки
+и промахи оценки числа строк; по фильтрам предлагаются индексы.
+Результат сравнивается с сохраненным базовым файлом: новые находки или
+заметный рост стоимости плана считаются регрессией (код выхода 1).
+Публичный метод DatabaseManager без сценария и не внесенный в
+EXCLUDED_METHODS тоже считается ошибкой.
+
+    python explain_audit.py --clients 200000 --update-baseline
+    python explain_audit.py
+"""
+import argparse
+import inspect
+import json
+import re
+import sys
+import threading
+
+import psycopg2
+import psycopg2.extensions
+
+from config import DB_CONFIG
+from database.database_manager import (DEPOSIT_PAGE_FIELDS, TRANSACTION_PAGE_FIELDS,
+                                       DatabaseManager)
+
+BASELINE_FILE = "explain_baseline.json"
+
+# Seq Scan по таблице меньше этого числа строк не считается проблемой
+SEQ_SCAN_MIN_ROWS = 10000
+# Во сколько раз фактическое число строк может расходиться с оценкой
+ESTIMATE_MISS_FACTOR = 10
+# Допустимый рост стоимости плана относительно базового
+COST_TOLERANCE = 0.5
+
+# Публичные методы DatabaseManager, которые не проверяются: служебные
+# и пишущие (EXPLAIN ANALYZE выполнил бы запись)
+EXCLUDED_METHODS = {
+    'connect', 'close', 'pooled_cursor', 'run_parallel', 'copy_to', 'read_session',
+    'mark_write', 'create_tables', 'warmup', 'enable_group_commit', 'disable_group_commit',
+    'enable_deposit_cache', 'submit_write',
+    'create_client', 'create_deposit_plan', 'update_deposit_plan', 'delete_deposit_plan',
+    'open_deposit', 'claim_pending_deposits', 'release_claims', 'approve_deposit',
+    'reject_deposit', 'process_deposits', 'close_deposit',
+}
+
+
+class RecordingCursor(psycopg2.extensions.cursor):
+    """Курсор, запоминающий выполненные запросы, пока включена запись"""
+    recorded = None
+    lock = threading.Lock()
+
+    def execute(self, query, vars=None):
+        if RecordingCursor.recorded is not None:
+            with RecordingCursor.lock:
+                RecordingCursor.recorded.append((query, vars))
+        return super().execute(query, vars)
+
+
+def record_queries(func):
+    """Вызов func с перехватом всех SQL-запросов"""
+    RecordingCursor.recorded = []
+    try:
+        func()
+        return RecordingCursor.recorded
+    finally:
+        RecordingCursor.recorded = None
+
+
+def generate_dataset(conn, clients, deposits_per_client):
+    """Синтетические клиенты, депозиты и операции (триггеры на время отключаются)"""
+    with conn.cursor() as cur:
+        cur.execute("SELECT COUNT(*) FROM clients")
+        if cur.fetchone()[0] >= clients:
+            return False
+
+        print(f"Генерация данных: {clients} клиентов, по {deposits_per_client} депозита...")
+        cur.execute("TRUNCATE transactions, deposits, clients RESTART IDENTITY CASCADE")
+        cur.execute("ALTER TABLE deposits DISABLE TRIGGER USER")
+        cur.execute("""
+            INSERT INTO clients (full_name, passport_data, phone_number, email, address)
+            SELECT 'Клиент ' || g, 'EX' || lpad(g::text, 10, '0'),
+                   '+375' || lpad(g::text, 9, '0'), 'client' || g || '@example.com', 'Адрес ' || g
+            FROM generate_series(1, %s) g
+        """, (clients,))
+        cur.execute("""
+            WITH plan_list AS (
+                SELECT row_number() OVER (ORDER BY id) - 1 AS idx, id, name, interest_rate
+                FROM deposit_plans
+            ), n AS (SELECT COUNT(*) AS cnt FROM deposit_plans)
+            INSERT INTO deposits (client_id, deposit_plan_id, deposit_type, amount,
+                                  interest_rate, open_date, close_date, status)
+            SELECT c.id, p.id, p.name, round((1000 + random() * 100000)::numeric, 2),
+                   p.interest_rate, d.open_date,
+                   CASE WHEN d.status = 'closed' THEN d.open_date + 180 END, d.status
+            FROM clients c
+            CROSS JOIN generate_series(1, %s) g
+            CROSS JOIN n
+            JOIN plan_list p ON p.idx = (c.id + g) %% n.cnt
+            CROSS JOIN LATERAL (
+                SELECT CURRENT_DATE - (random() * 1000)::int AS open_date,
+                       (ARRAY['active', 'active', 'active', 'closed', 'pending', 'rejected'])
+                           [1 + floor(random() * 6)::int] AS status
+                WHERE g > 0  -- ссылка на g: подзапрос вычисляется для каждой строки
+            ) d
+        """, (deposits_per_client,))
+        cur.execute("""
+            INSERT INTO transactions (deposit_id, type, amount, description, transaction_date)
+            SELECT id, 'open', amount, 'Вклад одобрен и открыт', open_date
+            FROM deposits WHERE status IN ('active', 'closed')
+        """)
+        cur.execute("""
+            INSERT INTO transactions (deposit_id, type, amount, description, transaction_date)
+            SELECT id, 'close', amount, 'Закрытие депозита с выплатой', close_date
+            FROM deposits WHERE status = 'closed'
+        """)
+        cur.execute("ALTER TABLE deposits ENABLE TRIGGER USER")
+        # Сводка по клиентам поддерживается триггерами - пересчитываем целиком
+        cur.execute("SELECT rebuild_client_summary()")
+    conn.commit()
+    conn.autocommit = True
+    with conn.cursor() as cur:
+        cur.execute("ANALYZE")
+    conn.autocommit = False
+    return True
+
+
+def pick_samples(conn):
+    """Параметры для вызова методов: "тяжелый" клиент, депозит, план"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT client_id FROM deposits GROUP BY client_id ORDER BY COUNT(*) DESC LIMIT 1
+        """)
+        client_id = cur.fetchone()[0]
+        cur.execute("SELECT email, full_name FROM clients WHERE id = %s", (client_id,))
+        email, full_name = cur.fetchone()
+        cur.execute("""
+            SELECT t.deposit_id, d.client_id FROM transactions t
+            JOIN deposits d ON d.id = t.deposit_id LIMIT 1
+        """)
+        deposit_id, deposit_client_id = cur.fetchone()
+        cur.execute("""
+            SELECT id, LEAST(GREATEST(min_amount, 1000), COALESCE(max_amount, 1000))
+            FROM deposit_plans WHERE is_active ORDER BY id LIMIT 1
+        """)
+        plan_id, quote_amount = cur.fetchone()
+        cur.execute("SELECT id FROM deposits WHERE status = 'pending' ORDER BY id LIMIT 20")
+        pending_ids = [row[0] for row in cur.fetchall()]
+        # Водяной знак с небольшим отставанием: выборка не пустая
+        cur.execute("SELECT MAX(change_xid) - 1000 FROM clients")
+        changed_since = cur.fetchone()[0]
+        cur.execute("SELECT CURRENT_DATE - 90")
+        as_of = cur.fetchone()[0]
+    conn.rollback()
+    return {
+        'client_id': client_id, 'email': email, 'search': full_name.split()[-1],
+        'deposit_id': deposit_id, 'deposit_client_id': deposit_client_id,
+        'plan_id': plan_id, 'quote_amount': quote_amount, 'pending_ids': pending_ids,
+        'changed_since': changed_since, 'as_of': as_of,
+    }
+
+
+def scenarios(samples):
+    """
+    Читающие методы DatabaseManager с параметрами. Варианты одного метода
+    называются method[вариант] и сравниваются с базовым файлом отдельно.
+    """
+    s = samples
+    deposit_fields = list(DEPOSIT_PAGE_FIELDS)
+    transaction_fields = list(TRANSACTION_PAGE_FIELDS)
+    return [
+        ('get_all_clients', lambda db: db.get_all_clients()),
+        ('get_all_clients[name]', lambda db: db.get_all_clients('name')),
+        ('get_all_clients[balance]', lambda db: db.get_all_clients('balance')),
+        ('search_clients', lambda db: db.search_clients(s['search'])),
+        ('search_clients[created]', lambda db: db.search_clients(s['search'], 'created')),
+        ('search_clients[balance]', lambda db: db.search_clients(s['search'], 'balance')),
+        ('get_clients_changed_since', lambda db: db.get_clients_changed_since(s['changed_since'])),
+        ('get_clients_changed_since[all]', lambda db: db.get_clients_changed_since(None)),
+        ('get_client_credentials', lambda db: db.get_client_credentials(s['email'])),
+        ('get_all_deposit_plans', lambda db: db.get_all_deposit_plans()),
+        ('get_active_deposit_plans', lambda db: db.get_active_deposit_plans()),
+        ('get_data_version', lambda db: db.get_data_version('plans')),
+        ('get_data_version[deposits]', lambda db: db.get_data_version('deposits')),
+        ('get_deposit_quote', lambda db: db.get_deposit_quote(s['plan_id'], s['quote_amount'])),
+        ('get_deposit_plan_stats', lambda db: db.get_deposit_plan_stats(s['plan_id'])),
+        ('get_pending_deposits', lambda db: db.get_pending_deposits()),
+        ('get_pending_deposits[ids]', lambda db: db.get_pending_deposits(s['pending_ids'])),
+        ('get_client_deposits', lambda db: db.get_client_deposits(s['client_id'])),
+        ('get_client_deposits[archived]',
+         lambda db: db.get_client_deposits(s['client_id'], include_archived=True)),
+        ('get_client_deposit_summary', lambda db: db.get_client_deposit_summary(s['client_id'])),
+        ('get_deposits_page', lambda db: db.get_deposits_page(s['client_id'], deposit_fields)),
+        ('get_deposits_page[filtered]',
+         lambda db: db.get_deposits_page(s['client_id'], deposit_fields, status='active',
+                                         date_from=s['as_of'])),
+        ('get_deposits_page[archived]',
+         lambda db: db.get_deposits_page(s['client_id'], deposit_fields, include_archived=True)),
+        ('get_transactions_page',
+         lambda db: db.get_transactions_page(s['deposit_client_id'], s['deposit_id'],
+                                             transaction_fields)),
+        ('get_transactions_page[archived]',
+         lambda db: db.get_transactions_page(s['deposit_client_id'], s['deposit_id'],
+                                             transaction_fields, include_archived=True)),
+        ('get_client_dashboard', lambda db: db.get_client_dashboard(s['client_id'])),
+        ('calculate_interest', lambda db: db.calculate_interest(s['deposit_id'])),
+        ('calculate_portfolio_interest', lambda db: db.calculate_portfolio_interest()),
+        ('calculate_portfolio_interest[ids]',
+         lambda db: db.calculate_portfolio_interest([s['deposit_id']] + s['pending_ids'])),
+        ('get_deposit_transactions', lambda db: db.get_deposit_transactions(s['deposit_id'])),
+        ('get_deposit_transactions[archived]',
+         lambda db: db.get_deposit_transactions(s['deposit_id'], include_archived=True)),
+        ('get_balance_as_of', lambda db: db.get_balance_as_of(s['deposit_id'], s['as_of'])),
+        ('get_portfolio_as_of', lambda db: db.get_portfolio_as_of(s['as_of'])),
+        ('get_deposits_by_type_stats', lambda db: db.get_deposits_by_type_stats()),
+        ('get_deposits_timeline', lambda db: db.get_deposits_timeline()),
+        ('get_all_active_amounts', lambda db: db.get_all_active_amounts()),
+    ]
+
+
+def coverage_problems(names):
+    """Публичные методы без сценария и устаревшие исключения"""
+    public = {name for name, _ in inspect.getmembers(DatabaseManager, inspect.isfunction)
+              if not name.startswith('_')}
+    covered = {name.split('[')[0] for name in names}
+    problems = [f"нет сценария для DatabaseManager.{name}"
+                for name in sorted(public - covered - EXCLUDED_METHODS)]
+    problems += [f"исключен несуществующий метод DatabaseManager.{name}"
+                 for name in sorted(EXCLUDED_METHODS - public)]
+    return problems
+
+
+def explain(conn, query, vars):
+    """EXPLAIN ANALYZE в транзакции, которая затем откатывается"""
+    with conn.cursor() as cur:
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query, vars)
+        plan = cur.fetchone()[0]
+    conn.rollback()
+    return plan[0]
+
+
+def walk(node):
+    yield node
+    for child in node.get('Plans', []):
+        yield from walk(child)
+
+
+def table_rows(conn, relation, cache):
+    if relation not in cache:
+        with conn.cursor() as cur:
+            cur.execute("SELECT reltuples::bigint FROM pg_class WHERE relname = %s", (relation,))
+            row = cur.fetchone()
+            cache[relation] = row[0] if row else 0
+        conn.rollback()
+    return cache[relation]
+
+
+def filter_columns(text):
+    """Колонки из условия фильтра: (равенство, ILIKE)"""
+    equality = re.findall(r"\(?(\w+)\)?\s*=\s*", text or "")
+    ilike = re.findall(r"\(?(\w+)\)?(?:::text)?\s*~~\*", text or "")
+    return [c for c in equality if not c.isdigit()], ilike
+
+
+def analyze_plan(conn, plan, rows_cache):
+    """Находки и рекомендации по индексам для одного плана"""
+    findings, advice = [], []
+    sort_keys = []
+    for node in walk(plan['Plan']):
+        if node['Node Type'] == 'Sort':
+            sort_keys = [key.split()[0].split('.')[-1] for key in node.get('Sort Key', [])]
+            findings.append({'type': 'sort', 'keys': node.get('Sort Key', []),
+                             'method': node.get('Sort Method')})
+
+        loops = node.get('Actual Loops', 1) or 1
+        actual = node.get('Actual Rows', 0) * loops
+        estimated = node.get('Plan Rows', 0) * loops
+        ratio = max(actual, 1) / max(estimated, 1)
+        if max(actual, estimated) >= 1000 and not (
+                1 / ESTIMATE_MISS_FACTOR < ratio < ESTIMATE_MISS_FACTOR):
+            findings.append({'type': 'misestimate', 'node': node['Node Type'],
+                             'estimated': estimated, 'actual': actual})
+
+    for node in walk(plan['Plan']):
+        if node['Node Type'] != 'Seq Scan':
+            continue
+        relation = node['Relation Name']
+        if table_rows(conn, relation, rows_cache) < SEQ_SCAN_MIN_ROWS:
+            continue
+        findings.append({'type': 'seq_scan', 'relation': relation, 'filter': node.get('Filter')})
+
+        equality, ilike = filter_columns(node.get('Filter'))
+        for column in ilike:
+            advice.append("CREATE EXTENSION IF NOT EXISTS pg_trgm; "
+                          f"CREATE INDEX ON {relation} USING gin ({column} gin_trgm_ops);")
+        if equality:
+            columns = list(dict.fromkeys(equality + [k for k in sort_keys if k not in equality]))
+            advice.append(f"CREATE INDEX ON {relation} ({', '.join(columns)});")
+    return findings, advice
+
+
+def finding_key(finding):
+    return finding['type'], finding.get('relation') or ','.join(finding.get('keys', [])) or finding.get('node')
+
+
+def compare(name, current, baseline):
+    """Список описаний регрессий запроса относительно базового плана"""
+    if baseline is None:
+        return []
+    problems = []
+    known = {tuple(k) for k in baseline['findings']}
+    for finding in current['findings']:
+        key = finding_key(finding)
+        if finding['type'] != 'misestimate' and key not in known:
+            problems.append(f"{name}: новая находка {key}")
+    limit = baseline['total_cost'] * (1 + COST_TOLERANCE)
+    if current['total_cost'] > limit:
+        problems.append(f"{name}: стоимость {current['total_cost']:.0f} > {limit:.0f}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка планов запросов DatabaseManager")
+    parser.add_argument("--dbname", default=DB_CONFIG['dbname'] + "_explain",
+                        help="отдельная база для синтетических данных")
+    parser.add_argument("--clients", type=int, default=100000)
+    parser.add_argument("--deposits-per-client", type=int, default=4)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args()
+
+    # Новый читающий метод без сценария не должен проходить проверку молча
+    uncovered = coverage_problems(name for name, _ in scenarios({}))
+    if uncovered:
+        print("Покрытие сценариями:")
+        for problem in uncovered:
+            print(f"  {problem}")
+        sys.exit(1)
+
+    config = dict(DB_CONFIG, dbname=args.dbname, cursor_factory=RecordingCursor)
+    db = DatabaseManager(config)
+    generate_dataset(db.conn, args.clients, args.deposits_per_client)
+    samples = pick_samples(db.conn)
+
+    explain_conn = psycopg2.connect(**dict(DB_CONFIG, dbname=args.dbname))
+    rows_cache = {}
+    results = {}
+    for method, call in scenarios(samples):
+        queries = record_queries(lambda: call(db))
+        for i, (query, vars) in enumerate(queries):
+            name = method if len(queries) == 1 else f"{method}#{i + 1}"
+            plan = explain(explain_conn, query, vars)
+            findings, advice = analyze_plan(explain_conn, plan, rows_cache)
+            results[name] = {
+                'total_cost': plan['Plan']['Total Cost'],
+                'execution_ms': plan.get('Execution Time'),
+                'findings': findings,
+                'advice': advice,
+            }
+
+    try:
+        with open(args.baseline, encoding='utf-8') as f:
+            baseline = json.load(f)
+    except FileNotFoundError:
+        baseline = {}
+
+    problems = []
+    for name, result in results.items():
+        status = "OK" if not result['findings'] else "!!"
+        print(f"[{status}] {name}: cost {result['total_cost']:.0f}, "
+              f"{result['execution_ms'] or 0:.1f} мс")
+        for finding in result['findings']:
+            print(f"      {finding}")
+        for suggestion in dict.fromkeys(result['advice']):
+            print(f"      -> {suggestion}")
+        base = baseline.get(name)
+        problems.extend(compare(name, result, base))
+
+    if args.update_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({name: {'total_cost': r['total_cost'],
+                              'findings': [finding_key(x) for x in r['findings']]}
+                       for name, r in results.items()}, f, ensure_ascii=False, indent=2)
+        print(f"\nБазовый файл обновлен: {args.baseline}")
+        return
+
+    if problems:
+        print("\nРегрессии планов:")
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
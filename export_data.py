@@ -0,0 +1,50 @@
+"""
+Выгрузка операций и вкладов для бухгалтерии.
+
+Данные идут потоком из COPY ... TO STDOUT в файл (CSV) или в писатель
+Parquet, поэтому размер выгрузки не ограничен памятью.
+
+    python export_data.py transactions --from 2024-01-01 --to 2024-01-31 -o jan.csv
+    python export_data.py deposits --plan 3 --format parquet -o plan3.parquet
+    python export_data.py transactions --client 42 > client42.csv
+"""
+import argparse
+import sys
+from datetime import date
+
+from config import DB_CONFIG, DB_REPLICAS
+from database.database_manager import DatabaseManager
+from database.export import ExportFilters, EXPORT_QUERIES, copy_csv, write_parquet
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Потоковая выгрузка операций и вкладов")
+    parser.add_argument("dataset", choices=sorted(EXPORT_QUERIES))
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat,
+                        help="дата окончания (включительно)")
+    parser.add_argument("--client", type=int, help="id клиента")
+    parser.add_argument("--plan", type=int, help="id депозитного плана")
+    parser.add_argument("--include-archived", action="store_true",
+                        help="вместе с архивом закрытых вкладов")
+    parser.add_argument("-o", "--output", help="файл (по умолчанию stdout, только CSV)")
+    args = parser.parse_args()
+
+    if args.format == "parquet" and not args.output:
+        parser.error("для Parquet нужен --output")
+
+    db = DatabaseManager(DB_CONFIG, replica_configs=DB_REPLICAS)
+    filters = ExportFilters(args.date_from, args.date_to, args.client, args.plan,
+                            args.include_archived)
+    if args.format == "parquet":
+        write_parquet(db, args.dataset, filters, args.output)
+    elif args.output:
+        with open(args.output, "wb") as out:
+            copy_csv(db, args.dataset, filters, out)
+    else:
+        copy_csv(db, args.dataset, filters, sys.stdout.buffer)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,10 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
-import numpy as np
-import pandas as pd
 from decimal import Decimal
 
+# matplotlib и NumPy импортируются внутри методов: модуль грузится
+# при открытии раздела, а тяжелые библиотеки - только при расчете.
+
 class AnalyticsFrame:
     def __init__(self, parent, db_manager, back_callback):
         self.parent = parent
@@ -13,9 +12,22 @@ class AnalyticsFrame:
         self.back_callback = back_callback
         
         self.create_widgets()
+        self.data_version = self.db_manager.get_data_version('deposits')
         self.calculate_math_stats()
         self.draw_charts()
 
+    def on_show(self):
+        """Вызывается MainWindow при повторном открытии: перерасчет, если вклады менялись"""
+        try:
+            version = self.db_manager.get_data_version('deposits')
+        except Exception as e:
+            self.stats_label.config(text=f"Ошибка расчета: {e}")
+            return
+        if version != self.data_version:
+            self.data_version = version
+            self.calculate_math_stats()
+            self.draw_charts()
+
     def create_widgets(self):
         # Верхняя панель
         top_panel = ttk.Frame(self.parent)
@@ -38,6 +50,8 @@ class AnalyticsFrame:
     def calculate_math_stats(self):
         """Выполнение математических расчетов (Мат. аппарат)"""
         try:
+            import numpy as np
+
             amounts = self.db_manager.get_all_active_amounts()
             amounts_float = [float(x) for x in amounts]
             
@@ -71,12 +85,18 @@ class AnalyticsFrame:
 
     def draw_charts(self):
         """Отрисовка графиков (FIX: Устранено наложение текста и подписей)"""
+        import numpy as np
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+
         # Очистка фрейма
         for widget in self.charts_frame.winfo_children():
             widget.destroy()
 
         # Создание двух графиков в одной фигуре. Увеличиваем размер для лучшей читаемости.
-        fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(14, 7), dpi=100)
+        # Figure без pyplot: не нужен глобальный реестр фигур и его импорт
+        fig = Figure(figsize=(14, 7), dpi=100)
+        ax1, ax2 = fig.subplots(1, 2)
         fig.suptitle('Аналитика портфеля', fontsize=16, fontweight='bold')
 
         # --- График 1: Круговая диаграмма (Объем по типам) ---
@@ -122,7 +142,7 @@ class AnalyticsFrame:
             fig.autofmt_xdate(rotation=45)
 
         # FIX 4: Убедимся, что элементы не накладываются друг на друга на общем холсте
-        plt.tight_layout(rect=[0, 0.03, 1, 0.95]) 
+        fig.tight_layout(rect=[0, 0.03, 1, 0.95]) 
 
         canvas = FigureCanvasTkAgg(fig, master=self.charts_frame)
         canvas.draw()
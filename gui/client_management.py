@@ -7,6 +7,12 @@ class ClientManagementFrame:
         self.parent = parent
         self.db_manager = db_manager
         self.back_callback = back_callback
+        # Водяной знак последнего чтения (xid, см. get_clients_changed_since)
+        self.watermark = None
+        # В режиме поиска таблица показывает результаты, а не весь список
+        self.search_mode = False
+        # Сортировка списка (см. CLIENT_LIST_ORDER): по клику на заголовок
+        self.order_by = 'created'
         
         self.create_widgets()
         self.load_clients()
@@ -38,12 +44,17 @@ class ClientManagementFrame:
                   command=self.show_add_client).grid(row=1, column=2, pady=10, padx=10)
         
         # Таблица клиентов
-        columns = ('ID', 'ФИО', 'Паспорт', 'Телефон', 'Email', 'Дата регистрации')
+        columns = ('ID', 'ФИО', 'Паспорт', 'Телефон', 'Email', 'Дата регистрации',
+                   'Вкладов', 'Сумма вкладов', 'Последняя активность')
         self.tree = ttk.Treeview(self.parent, columns=columns, show='headings', height=15)
         
         for col in columns:
             self.tree.heading(col, text=col)
             self.tree.column(col, width=120)
+        # Сортировка выполняется в БД по индексу client_summary
+        for col, order_by in (('ФИО', 'name'), ('Дата регистрации', 'created'),
+                              ('Сумма вкладов', 'balance')):
+            self.tree.heading(col, command=lambda o=order_by: self.sort_clients(o))
         
         self.tree.grid(row=2, column=0, columnspan=3, sticky=(tk.W, tk.E, tk.N, tk.S), pady=10)
         
@@ -56,21 +67,61 @@ class ClientManagementFrame:
         self.parent.columnconfigure(1, weight=1)
         self.parent.rowconfigure(2, weight=1)
 
+    def client_values(self, client):
+        return (client.id, client.full_name, client.passport_data,
+                client.phone_number, client.email, client.created_at,
+                client.active_deposits, f"{client.active_balance:,.2f}",
+                client.last_activity or "")
+
+    def sort_clients(self, order_by):
+        self.order_by = order_by
+        if self.search_mode:
+            self.search_clients()
+        else:
+            self.load_clients()
+
     def load_clients(self):
         """Загрузка списка клиентов"""
         for item in self.tree.get_children():
             self.tree.delete(item)
+        self.search_mode = False
+        self.watermark = None
             
         try:
-            clients = self.db_manager.get_all_clients()
+            clients, watermark = self.db_manager.get_clients_changed_since(None, self.order_by)
             for client in clients:
-                self.tree.insert('', tk.END, values=(
-                    client.id, client.full_name, client.passport_data,
-                    client.phone_number, client.email, client.created_at
-                ))
+                self.tree.insert('', tk.END, iid=str(client.id), values=self.client_values(client))
+            self.watermark = watermark
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось загрузить клиентов: {str(e)}")
 
+    def refresh_clients(self):
+        """Инкрементальное обновление: только клиенты, измененные после водяного знака"""
+        if self.search_mode:
+            return
+        # Вставка в начало верна только для сортировки по дате регистрации;
+        # при других сортировках изменение сводки двигает строки
+        if self.watermark is None or self.order_by != 'created':
+            self.load_clients()
+            return
+
+        try:
+            changed, watermark = self.db_manager.get_clients_changed_since(self.watermark)
+            for client in changed:
+                iid = str(client.id)
+                if self.tree.exists(iid):
+                    self.tree.item(iid, values=self.client_values(client))
+                else:
+                    # Список отсортирован по дате регистрации (новые сверху)
+                    self.tree.insert('', 0, iid=iid, values=self.client_values(client))
+            self.watermark = watermark
+        except Exception as e:
+            messagebox.showerror("Ошибка", f"Не удалось обновить клиентов: {str(e)}")
+
+    def on_show(self):
+        """Вызывается MainWindow при повторном открытии раздела"""
+        self.refresh_clients()
+
     def search_clients(self):
         """Поиск клиентов"""
         search_term = self.search_entry.get().strip()
@@ -80,14 +131,13 @@ class ClientManagementFrame:
             
         for item in self.tree.get_children():
             self.tree.delete(item)
+        self.search_mode = True
             
         try:
-            clients = self.db_manager.search_clients(search_term)
+            order_by = 'name' if self.order_by == 'created' else self.order_by
+            clients = self.db_manager.search_clients(search_term, order_by)
             for client in clients:
-                self.tree.insert('', tk.END, values=(
-                    client.id, client.full_name, client.passport_data,
-                    client.phone_number, client.email, client.created_at
-                ))
+                self.tree.insert('', tk.END, iid=str(client.id), values=self.client_values(client))
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка поиска: {str(e)}")
 
@@ -133,7 +183,7 @@ class ClientManagementFrame:
                 client_id = self.db_manager.create_client(client)
                 messagebox.showinfo("Успех", f"Клиент успешно добавлен с ID: {client_id}")
                 dialog.destroy()
-                self.load_clients()
+                self.refresh_clients()
                 
             except Exception as e:
                 messagebox.showerror("Ошибка", str(e))
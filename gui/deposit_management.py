@@ -1,13 +1,19 @@
+import threading
 import tkinter as tk
+from concurrent.futures import Future
 from tkinter import ttk, messagebox
 from datetime import date
 from decimal import Decimal, InvalidOperation
 from database.models import Deposit
 
+# Как часто GUI проверяет, закончилось ли пакетное закрытие вкладов (мс)
+MATURITY_POLL_MS = 200
+
 class DepositManagementFrame:
     def __init__(self, parent, db_manager, back_callback):
         self.parent = parent
         self.db_manager = db_manager
+        self.plans_version = None
         
         # Если back_callback передан как None (на главной), скрываем кнопку, 
         # но в новой структуре сайдбара кнопка "Назад" вообще не нужна внутри фреймов.
@@ -103,12 +109,24 @@ class DepositManagementFrame:
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
+    def on_show(self):
+        """Вызывается MainWindow при повторном открытии: планы могли измениться"""
+        try:
+            changed = self.db_manager.get_data_version('plans') != self.plans_version
+        except Exception:
+            return
+        if changed:
+            self.load_deposit_plans()
+
     def load_deposit_plans(self):
         try:
+            # Версия читается до планов: изменение между ними даст лишнюю перезагрузку, а не пропуск
+            version = self.db_manager.get_data_version('plans')
             plans = self.db_manager.get_active_deposit_plans()
             vals = [p.name for p in plans]
             vals.insert(0, "Ручной ввод")
             self.plan_combo['values'] = vals
+            self.plans_version = version
         except: pass
 
     def on_plan_selected(self, event):
@@ -133,6 +151,10 @@ class DepositManagementFrame:
         ttk.Button(search_frame, text="Найти вклады", style='Primary.TButton', 
                   command=self.load_client_deposits).pack(side=tk.LEFT)
 
+        self.include_archived_var = tk.BooleanVar(value=False)
+        ttk.Checkbutton(search_frame, text="Включая архив", variable=self.include_archived_var,
+                        command=self.load_client_deposits).pack(side=tk.LEFT, padx=(10, 0))
+
         # Таблица
         columns = ('ID', 'Тип', 'Сумма', 'Ставка %', 'Открыт', 'Статус')
         self.deposits_tree = ttk.Treeview(parent, columns=columns, show='headings', height=12)
@@ -162,10 +184,15 @@ class DepositManagementFrame:
         ttk.Button(input_frame, text="Рассчитать и Закрыть", style='Danger.TButton', 
                   command=self.close_deposit_action).pack(side=tk.LEFT)
 
+        ttk.Label(parent, text="Вклады с истекшим сроком", style='SubHeader.TLabel').pack(anchor='w', pady=(30, 10))
+        self.matured_button = ttk.Button(parent, text="Закрыть все созревшие вклады",
+                                         style='Primary.TButton', command=self.process_matured_action)
+        self.matured_button.pack(anchor='w')
+
     def load_client_deposits(self):
         try:
             cid = int(self.client_id_entry.get())
-            deposits = self.db_manager.get_client_deposits(cid)
+            deposits = self.db_manager.get_client_deposits(cid, self.include_archived_var.get())
             for i in self.deposits_tree.get_children(): self.deposits_tree.delete(i)
             for d in deposits:
                 self.deposits_tree.insert('', tk.END, values=(
@@ -173,6 +200,40 @@ class DepositManagementFrame:
                 ))
         except Exception as e: messagebox.showerror("Ошибка", str(e))
 
+    def process_matured_action(self):
+        """
+        Пакетное закрытие (и пролонгация) вкладов с истекшим сроком.
+        Выполняется в отдельном потоке, чтобы окно не зависало; отчет
+        показывается из потока Tk, когда работа закончена.
+        """
+        from maturity_scheduler import run_maturity
+        if not messagebox.askyesno("Подтверждение", "Закрыть все вклады с истекшим сроком?"):
+            return
+
+        result = Future()
+
+        def run():
+            try:
+                result.set_result(run_maturity(self.db_manager.db_config))
+            except Exception as e:
+                result.set_exception(e)
+
+        self.matured_button.state(['disabled'])
+        threading.Thread(target=run, name="maturity-run", daemon=True).start()
+        self.parent.after(MATURITY_POLL_MS, self.poll_maturity, result)
+
+    def poll_maturity(self, result):
+        """Ожидание результата пакетного закрытия (в потоке Tk)"""
+        if not result.done():
+            self.parent.after(MATURITY_POLL_MS, self.poll_maturity, result)
+            return
+        if not self.matured_button.winfo_exists():
+            return
+        self.matured_button.state(['!disabled'])
+        try:
+            messagebox.showinfo("Отчет", result.result().summary())
+        except Exception as e: messagebox.showerror("Ошибка", str(e))
+
     def close_deposit_action(self):
         try:
             did = int(self.deposit_id_entry.get())
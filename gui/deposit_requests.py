@@ -1,13 +1,29 @@
+import getpass
+import queue
+import socket
 import tkinter as tk
 from tkinter import ttk, messagebox
 from gui.styles import COLORS
+from database.notifications import shared_listener
+
+# Как часто GUI забирает события из очереди слушателя (мс)
+EVENTS_POLL_MS = 200
+
+# Сколько заявок банкир берет в работу за раз
+CLAIM_BATCH_SIZE = 50
+
+def current_banker_id():
+    """Идентификатор банкира для захвата заявок (пользователь@рабочая станция)"""
+    return f"{getpass.getuser()}@{socket.gethostname()}"[:50]
 
 class DepositRequestsFrame:
     def __init__(self, parent, db_manager, back_callback):
         self.parent = parent
         self.db_manager = db_manager
+        self.banker_id = current_banker_id()
         self.create_widgets()
         self.load_requests()
+        self.subscribe_events()
 
     def create_widgets(self):
         # Панель действий
@@ -20,6 +36,9 @@ class DepositRequestsFrame:
         ttk.Button(action_panel, text="❌ Отклонить", style='Danger.TButton', 
                   command=self.reject_selected).pack(side=tk.LEFT, padx=5)
         
+        ttk.Button(action_panel, text="📥 Взять в работу", style='Nav.TButton', 
+                  command=self.claim_batch).pack(side=tk.LEFT, padx=5)
+
         ttk.Button(action_panel, text="🔄 Обновить", style='Nav.TButton', 
                   command=self.load_requests).pack(side=tk.RIGHT, padx=5)
 
@@ -38,14 +57,101 @@ class DepositRequestsFrame:
 
         self.tree.pack(fill=tk.BOTH, expand=True)
 
-    def load_requests(self):
-        for i in self.tree.get_children(): self.tree.delete(i)
-        requests = self.db_manager.get_pending_deposits()
+    def request_values(self, req):
+        # req: (id, full_name, type, amount, date)
+        return (req[0], req[1], req[2], f"{req[3]:,.2f}", req[4])
+
+    def insert_requests(self, requests):
         for req in requests:
-            # req: (id, full_name, type, amount, date)
-            self.tree.insert('', tk.END, values=(
-                req[0], req[1], req[2], f"{req[3]:,.2f}", req[4]
-            ))
+            iid = str(req[0])
+            if not self.tree.exists(iid):
+                self.tree.insert('', tk.END, iid=iid, values=self.request_values(req))
+
+    def remove_requests(self, iids):
+        existing = [iid for iid in iids if self.tree.exists(iid)]
+        if existing:
+            self.tree.delete(*existing)
+
+    def load_requests(self):
+        """Сверка таблицы с БД: удаляются и добавляются только изменившиеся заявки"""
+        # Вызывается и по событию resync - читаем то, что уже зафиксировано
+        requests = self.db_manager.get_pending_deposits(primary=True)
+        pending = {str(req[0]) for req in requests}
+        self.remove_requests([iid for iid in self.tree.get_children() if iid not in pending])
+        self.insert_requests(requests)
+
+    def subscribe_events(self):
+        """Подписка на новые/одобренные/отклоненные заявки (LISTEN/NOTIFY)"""
+        try:
+            self.listener = shared_listener(self.db_manager.db_config)
+            self.events = self.listener.subscribe()
+        except Exception:
+            # Без уведомлений остается ручное обновление
+            self.listener = None
+            return
+        self.parent.after(EVENTS_POLL_MS, self.poll_events)
+
+    def poll_events(self):
+        """Применение накопившихся событий к таблице (в потоке Tk)"""
+        if not self.tree.winfo_exists():
+            self.listener.unsubscribe(self.events)
+            return
+
+        added, removed, resync = [], [], False
+        while True:
+            try:
+                event = self.events.get_nowait()
+            except queue.Empty:
+                break
+            if event.get('type') == 'resync':
+                resync = True
+            elif event.get('status') == 'pending':
+                added.append(event['id'])
+            elif event.get('old_status') == 'pending':
+                removed.append(str(event['id']))
+
+        try:
+            if resync:
+                self.load_requests()
+            else:
+                self.remove_requests(removed)
+                new_ids = [dep_id for dep_id in added if not self.tree.exists(str(dep_id))]
+                if new_ids:
+                    # Одним запросом только новые заявки
+                    # Уведомление приходит после COMMIT на основном сервере,
+                    # реплика заявку может еще не видеть
+                    self.insert_requests(self.db_manager.get_pending_deposits(new_ids, primary=True))
+        finally:
+            self.parent.after(EVENTS_POLL_MS, self.poll_events)
+
+    def claim_batch(self):
+        """Захват пачки заявок: другие банкиры их не получат до конца аренды"""
+        try:
+            claimed = self.db_manager.claim_pending_deposits(self.banker_id, CLAIM_BATCH_SIZE)
+        except Exception as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
+        if not claimed:
+            messagebox.showinfo("Очередь", "Свободных заявок нет")
+            return
+        self.insert_requests(claimed)
+        self.tree.selection_set([str(req[0]) for req in claimed])
+
+    def process_selected(self, approve):
+        selected = self.tree.selection()
+        ids = [self.tree.item(item)['values'][0] for item in selected]
+        report = self.db_manager.process_deposits(
+            self.banker_id,
+            approve_ids=ids if approve else (),
+            reject_ids=() if approve else ids,
+        )
+        # Конфликтные заявки тоже убираем: они обработаны или в работе у коллеги
+        self.remove_requests(selected)
+        if report['conflicts']:
+            details = "\n".join(reason for _, reason in report['conflicts'])
+            messagebox.showwarning("Конфликты",
+                f"Не обработано заявок: {len(report['conflicts'])}\n\n{details}")
+        return report
 
     def approve_selected(self):
         selected = self.tree.selection()
@@ -53,11 +159,9 @@ class DepositRequestsFrame:
         
         if messagebox.askyesno("Подтверждение", "Одобрить выбранные заявки?"):
             try:
-                for item in selected:
-                    dep_id = self.tree.item(item)['values'][0]
-                    self.db_manager.approve_deposit(dep_id)
-                messagebox.showinfo("Успех", "Заявки одобрены, депозиты активированы.")
-                self.load_requests()
+                report = self.process_selected(approve=True)
+                if report['approved']:
+                    messagebox.showinfo("Успех", "Заявки одобрены, депозиты активированы.")
             except Exception as e:
                 messagebox.showerror("Ошибка", str(e))
 
@@ -67,9 +171,6 @@ class DepositRequestsFrame:
         
         if messagebox.askyesno("Подтверждение", "Отклонить заявки?"):
             try:
-                for item in selected:
-                    dep_id = self.tree.item(item)['values'][0]
-                    self.db_manager.reject_deposit(dep_id)
-                self.load_requests()
+                self.process_selected(approve=False)
             except Exception as e:
-                messagebox.showerror("Ошибка", str(e))
\ No newline at end of file
+                messagebox.showerror("Ошибка", str(e))
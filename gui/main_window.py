@@ -1,12 +1,27 @@
+import importlib
 import tkinter as tk
 from tkinter import ttk, messagebox
-from gui.client_management import ClientManagementFrame
-from gui.deposit_management import DepositManagementFrame
-from gui.transaction_views import TransactionViewsFrame
-from gui.deposit_plans import DepositPlansFrame
-from gui.analytics import AnalyticsFrame
-from gui.deposit_requests import DepositRequestsFrame
 from gui.styles import setup_styles, COLORS
+from config import PROFILE_DIR, PROFILE_GUI_ACTIONS, PROFILE_SAMPLE_RATE
+from config import PROFILE_INTERVAL_MS, PROFILE_MIN_MS
+
+# Модули фреймов импортируются лениво, при первом открытии раздела.
+# Аналитика тянет matplotlib и NumPy, поэтому её импорт не должен
+# задерживать появление окна.
+FRAME_CLASSES = {
+    'requests': ('gui.deposit_requests', 'DepositRequestsFrame'),
+    'analytics': ('gui.analytics', 'AnalyticsFrame'),
+    'clients': ('gui.client_management', 'ClientManagementFrame'),
+    'deposits': ('gui.deposit_management', 'DepositManagementFrame'),
+    'transactions': ('gui.transaction_views', 'TransactionViewsFrame'),
+    'plans': ('gui.deposit_plans', 'DepositPlansFrame'),
+}
+
+def load_frame_class(page):
+    """Импорт класса фрейма по имени раздела"""
+    module_name, class_name = FRAME_CLASSES[page]
+    module = importlib.import_module(module_name)
+    return getattr(module, class_name)
 
 class MainWindow:
     def __init__(self, root, db_manager):
@@ -14,6 +29,13 @@ class MainWindow:
         self.db_manager = db_manager
         self.root.title("Банковская Система | Admin Panel")
         self.root.geometry("1280x800")
+
+        # Профилирование действий GUI: до создания виджетов, чтобы их
+        # обработчики регистрировались уже через профилирующую обертку
+        if PROFILE_DIR and PROFILE_GUI_ACTIONS:
+            from profiler import ProfileSelector, install_tk_hooks
+            install_tk_hooks(ProfileSelector(PROFILE_GUI_ACTIONS, sample_rate=PROFILE_SAMPLE_RATE),
+                             PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MIN_MS)
         
         # Настройка стилей
         self.style = setup_styles(self.root)
@@ -26,8 +48,9 @@ class MainWindow:
         self.create_sidebar()
         self.create_content_area()
         
-        # Показываем аналитику по умолчанию (как "Дашборд")
-        self.show_analytics()
+        # Показываем аналитику по умолчанию (как "Дашборд").
+        # Построение откладывается, чтобы окно отрисовалось до загрузки графиков.
+        self.root.after(1, self.show_analytics)
 
     def create_sidebar(self):
         """Создание бокового меню"""
@@ -64,58 +87,64 @@ class MainWindow:
         self.content_frame = ttk.Frame(self.root, style='TFrame')
         self.content_frame.grid(row=0, column=1, sticky='nsew', padx=20, pady=20)
 
-    def clear_content(self):
-        """Очистка текущего окна"""
-        for widget in self.content_frame.winfo_children():
-            widget.destroy()
+        # Кэш построенных разделов: page -> (контейнер страницы, объект фрейма).
+        # Разделы строятся один раз, при навигации они только скрываются и
+        # показываются, а данные обновляются через on_show() фрейма.
+        self.pages = {}
+        self.current_page = None
+
+    def hide_current_page(self):
+        """Скрытие текущего раздела (фрейм остается в кэше)"""
+        if self.current_page is not None:
+            self.pages[self.current_page][0].pack_forget()
+            self.current_page = None
 
     # --- МЕТОДЫ ПЕРЕКЛЮЧЕНИЯ СТРАНИЦ ---
     # Мы передаем self.show_analytics как callback "назад", 
     # чтобы кнопка "Назад" во фреймах возвращала на дашборд.
 
+    def show_page(self, page, title, back_callback):
+        """Отображение раздела: построение при первом открытии, далее из кэша"""
+        if page == self.current_page:
+            return self.pages[page][1]
+        self.hide_current_page()
+
+        if page not in self.pages:
+            page_frame = ttk.Frame(self.content_frame, style='TFrame')
+            ttk.Label(page_frame, text=title, style='Header.TLabel').pack(anchor='w', pady=(0, 20))
+            container = ttk.Frame(page_frame, style='White.TFrame')
+            container.pack(fill=tk.BOTH, expand=True)
+            frame_class = load_frame_class(page)
+            self.pages[page] = (page_frame, frame_class(container, self.db_manager, back_callback))
+        else:
+            # Фрейм уже построен - обновляем только изменившиеся данные
+            frame = self.pages[page][1]
+            if hasattr(frame, 'on_show'):
+                frame.on_show()
+
+        page_frame, frame = self.pages[page]
+        page_frame.pack(fill=tk.BOTH, expand=True)
+        self.current_page = page
+        return frame
+
     def show_requests(self):
-        self.clear_content()
-        ttk.Label(self.content_frame, text="Входящие заявки на открытие", style='Header.TLabel').pack(anchor='w', pady=(0, 20))
-        container = ttk.Frame(self.content_frame, style='White.TFrame')
-        container.pack(fill=tk.BOTH, expand=True)
-        DepositRequestsFrame(container, self.db_manager, lambda: None)
+        self.show_page('requests', "Входящие заявки на открытие", lambda: None)
 
     def show_analytics(self):
-        self.clear_content()
-        # Заголовок раздела
-        ttk.Label(self.content_frame, text="Дашборд и Аналитика", style='Header.TLabel').pack(anchor='w', pady=(0, 20))
-        # Контейнер для фрейма
-        container = ttk.Frame(self.content_frame, style='White.TFrame')
-        container.pack(fill=tk.BOTH, expand=True)
-        AnalyticsFrame(container, self.db_manager, lambda: None) # lambda: None убирает кнопку "Назад"
+        # lambda: None убирает кнопку "Назад"
+        self.show_page('analytics', "Дашборд и Аналитика", lambda: None)
 
     def show_client_management(self):
-        self.clear_content()
-        ttk.Label(self.content_frame, text="Управление Клиентами", style='Header.TLabel').pack(anchor='w', pady=(0, 20))
-        container = ttk.Frame(self.content_frame, style='White.TFrame')
-        container.pack(fill=tk.BOTH, expand=True)
-        ClientManagementFrame(container, self.db_manager, self.show_analytics)
+        self.show_page('clients', "Управление Клиентами", self.show_analytics)
 
     def show_deposit_management(self):
-        self.clear_content()
-        ttk.Label(self.content_frame, text="Управление Вкладами", style='Header.TLabel').pack(anchor='w', pady=(0, 20))
-        container = ttk.Frame(self.content_frame, style='White.TFrame')
-        container.pack(fill=tk.BOTH, expand=True)
-        DepositManagementFrame(container, self.db_manager, self.show_analytics)
+        self.show_page('deposits', "Управление Вкладами", self.show_analytics)
 
     def show_transaction_views(self):
-        self.clear_content()
-        ttk.Label(self.content_frame, text="История Операций", style='Header.TLabel').pack(anchor='w', pady=(0, 20))
-        container = ttk.Frame(self.content_frame, style='White.TFrame')
-        container.pack(fill=tk.BOTH, expand=True)
-        TransactionViewsFrame(container, self.db_manager, self.show_analytics)
+        self.show_page('transactions', "История Операций", self.show_analytics)
 
     def show_deposit_plans(self):
-        self.clear_content()
-        ttk.Label(self.content_frame, text="Тарифные Планы", style='Header.TLabel').pack(anchor='w', pady=(0, 20))
-        container = ttk.Frame(self.content_frame, style='White.TFrame')
-        container.pack(fill=tk.BOTH, expand=True)
-        DepositPlansFrame(container, self.db_manager, self.show_analytics)
+        self.show_page('plans', "Тарифные Планы", self.show_analytics)
 
     def show_help(self):
         messagebox.showinfo("Справка", "Банковская система v2.0\nРазработано для курсового проекта.")
\ No newline at end of file
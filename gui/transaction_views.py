@@ -52,7 +52,8 @@ class TransactionViewsFrame:
         """Загрузка транзакций по депозиту"""
         try:
             deposit_id = int(self.deposit_id_entry.get())
-            transactions = self.db_manager.get_deposit_transactions(deposit_id)
+            # Вклад ищется по id, поэтому операции берутся и из архива
+            transactions = self.db_manager.get_deposit_transactions(deposit_id, include_archived=True)
             
             # Очистка таблицы
             for item in self.transactions_tree.get_children():
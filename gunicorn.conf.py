@@ -0,0 +1,49 @@
+"""
+Настройки gunicorn для server.py.
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+    WEB_WORKERS=8 WEB_THREADS=8 gunicorn -c gunicorn.conf.py wsgi:app
+
+Воркеры - процессы с потоками (gthread): хеширование паролей уходит в
+отдельный пул процессов, а остальное время запросы ждут PostgreSQL, так
+что потоки дешевле лишних процессов. Каждый вызов DatabaseManager
+(чтение и запись) берет свое соединение из пула на время запроса к БД,
+поэтому потоки не делят транзакции, а одновременно с БД работают не
+больше DB_POOL_SIZE из них (остальные ждут соединения). Потоки воркера
+делятся на два вида: обычные запросы и потоки SSE (/api/events), которые
+занимают поток, пока открыт кабинет, но не держат соединение с БД. Число потоков
+SSE ограничено SSE_MAX_STREAMS (сверх - 503), поэтому по умолчанию
+threads = пул + SSE_MAX_STREAMS, и открытые кабинеты не вытесняют вход и API.
+"""
+import multiprocessing
+import os
+
+from config import SSE_MAX_STREAMS
+
+# Размер пула соединений DatabaseManager по умолчанию
+DB_POOL_SIZE = 5
+
+bind = os.environ.get("WEB_BIND", "0.0.0.0:5000")
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count() + 1))
+worker_class = "gthread"
+threads = int(os.environ.get("WEB_THREADS", DB_POOL_SIZE + SSE_MAX_STREAMS))
+
+# Каждый воркер сам открывает соединения после fork (см. wsgi.py)
+preload_app = False
+# Запас на прогрев пулов перед первым запросом
+timeout = int(os.environ.get("WEB_TIMEOUT", 60))
+graceful_timeout = 30
+keepalive = 5
+
+# Периодический перезапуск воркеров ограничивает рост памяти
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", 10000))
+max_requests_jitter = max_requests // 10
+
+accesslog = "-"
+errorlog = "-"
+
+
+def on_starting(server):
+    # DDL - один раз в мастере, до fork: воркеры не соревнуются за блокировки схемы
+    from server import migrate
+    migrate()
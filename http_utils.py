@@ -0,0 +1,140 @@
+"""
+HTTP-помощники для JSON API: ETag по версии данных, условные GET
+(If-None-Match -> 304), серверный кэш ответов и сжатие gzip/brotli.
+"""
+import base64
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+from flask import request, Response
+
+try:
+    import brotli
+except ImportError:  # brotli - необязательная зависимость
+    brotli = None
+
+# Суффиксы ETag для сжатых представлений (у каждого кодирования свой тег)
+ENCODING_SUFFIXES = ('-br', '-gzip')
+
+COMPRESSIBLE_MIMETYPES = {
+    'application/json', 'text/html', 'text/css', 'application/javascript', 'text/plain',
+}
+
+
+def make_etag(*parts) -> str:
+    """Сильный ETag из версии данных и ключа ответа"""
+    raw = ':'.join(str(part) for part in parts)
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def etag_matches(etag: str) -> bool:
+    """Совпадает ли ETag запроса (с учетом суффиксов сжатия)"""
+    if_none_match = request.if_none_match
+    if not if_none_match:
+        return False
+    if if_none_match.contains(etag):
+        return True
+    return any(if_none_match.contains(etag + suffix) for suffix in ENCODING_SUFFIXES)
+
+
+class ResponseCache:
+    """Ограниченный LRU-кэш сериализованных ответов: key -> (etag, body)"""
+
+    def __init__(self, max_entries: int = 1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, etag):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, etag, body: bytes):
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+def encode_cursor(value) -> str:
+    """Непрозрачный курсор страницы для клиента API"""
+    raw = json.dumps(value, separators=(',', ':'), default=str).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token: str):
+    """Обратное к encode_cursor; ValueError для испорченного курсора"""
+    try:
+        raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        return json.loads(raw)
+    except (ValueError, TypeError) as e:
+        raise ValueError("Некорректный курсор") from e
+
+
+def versioned_json(cache_key, version, build_payload, cache=None, default=None):
+    """
+    JSON-ответ с ETag по версии данных.
+
+    build_payload вызывается только если у клиента нет актуальной копии
+    (иначе 304) и ответ не найден в серверном кэше.
+    """
+    etag = make_etag(cache_key, version)
+    if etag_matches(etag):
+        response = Response(status=304)
+        response.set_etag(etag)
+        response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+
+    body = cache.get(cache_key, etag) if cache is not None else None
+    if body is None:
+        body = json.dumps(build_payload(), ensure_ascii=False, default=default).encode('utf-8')
+        if cache is not None:
+            cache.put(cache_key, etag, body)
+
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def compress_response(response, min_size: int = 1024):
+    """Сжатие ответа (after_request): brotli, если доступен, иначе gzip"""
+    if (response.status_code != 200
+            or response.direct_passthrough
+            or response.is_streamed
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return response
+
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        encoding, compress = 'br', lambda data: brotli.compress(data, quality=5)
+    elif accept['gzip']:
+        encoding, compress = 'gzip', lambda data: gzip.compress(data, compresslevel=6)
+    else:
+        return response
+
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    response.set_data(compress(data))
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(f"{etag}-{encoding}")
+    return response
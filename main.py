@@ -2,13 +2,15 @@ import tkinter as tk
 from tkinter import messagebox
 from database.database_manager import DatabaseManager
 from gui.main_window import MainWindow
-from config import DB_CONFIG
+from config import DB_CONFIG, DB_REPLICAS, READ_YOUR_WRITES_SECONDS, MAX_REPLICA_LAG_SECONDS
 
 def main():
     """Главная функция приложения"""
     try:
         # Инициализация базы данных
-        db_manager = DatabaseManager(DB_CONFIG)
+        db_manager = DatabaseManager(DB_CONFIG, replica_configs=DB_REPLICAS,
+                                     read_your_writes_seconds=READ_YOUR_WRITES_SECONDS,
+                                     max_replica_lag_seconds=MAX_REPLICA_LAG_SECONDS)
         
         # Создание графического интерфейса
         root = tk.Tk()
@@ -0,0 +1,187 @@
+"""
+Автоматическая обработка вкладов с истекшим сроком.
+
+Активные вклады с maturity_date <= даты запуска находятся по частичному
+индексу, делятся на пачки по id и обрабатываются параллельно. Каждая
+пачка - одна транзакция с set-based SQL: одно UPDATE статусов, одна
+вставка операций 'close' и, для вкладов с auto_renew, одна вставка
+новых вкладов на следующий срок с операциями 'open'. Проценты считаются
+той же функцией, что и при ручном закрытии, - до даты окончания срока.
+
+    python maturity_scheduler.py                 # на сегодня
+    python maturity_scheduler.py --as-of 2024-12-31 --report run.json
+"""
+import argparse
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from datetime import date
+from decimal import Decimal
+from typing import List, Optional
+
+import psycopg2
+
+from config import DB_CONFIG
+from database.interest import calculate_net_interest
+
+
+@dataclass
+class MaturityRunReport:
+    as_of: date
+    matured: int = 0
+    closed: int = 0
+    rolled_over: int = 0
+    payout_total: Decimal = Decimal(0)
+    chunks: int = 0
+    failed_chunks: List[dict] = field(default_factory=list)
+    duration_seconds: float = 0.0
+
+    def summary(self) -> str:
+        return (
+            f"Дата обработки: {self.as_of}\n"
+            f"Вкладов с истекшим сроком: {self.matured}\n"
+            f"Закрыто: {self.closed}, из них пролонгировано: {self.rolled_over}\n"
+            f"Сумма выплат: {self.payout_total:,.2f}\n"
+            f"Пачек: {self.chunks}, с ошибками: {len(self.failed_chunks)}\n"
+            f"Время: {self.duration_seconds:.1f} с"
+        )
+
+
+def find_matured_ids(conn, as_of: date) -> List[int]:
+    """id активных вкладов с истекшим сроком (частичный индекс по maturity_date)"""
+    with conn.cursor() as cur:
+        cur.execute("""
+            SELECT id FROM deposits
+            WHERE status = 'active' AND maturity_date <= %s
+            ORDER BY id
+        """, (as_of,))
+        return [row[0] for row in cur.fetchall()]
+
+
+def process_chunk(db_config: dict, ids: List[int], as_of: date) -> dict:
+    """Закрытие (и пролонгация) одной пачки вкладов в одной транзакции"""
+    conn = psycopg2.connect(**db_config)
+    try:
+        with conn.cursor() as cur:
+            # Строки, которые сейчас закрывает банкир вручную, пропускаются
+            cur.execute("""
+                SELECT d.id, d.client_id, d.deposit_plan_id, d.deposit_type, d.amount,
+                       d.interest_rate, d.open_date, d.maturity_date, d.auto_renew,
+                       p.interest_rate, p.is_active
+                FROM deposits d
+                LEFT JOIN deposit_plans p ON p.id = d.deposit_plan_id
+                WHERE d.id = ANY(%s) AND d.status = 'active' AND d.maturity_date <= %s
+                ORDER BY d.id
+                FOR UPDATE OF d SKIP LOCKED
+            """, (ids, as_of))
+            rows = cur.fetchall()
+            if not rows:
+                conn.commit()
+                return {'closed': 0, 'rolled_over': 0, 'payout': Decimal(0)}
+
+            close_ids, close_dates, payouts, renew = [], [], [], []
+            for (dep_id, client_id, plan_id, dep_type, amount, rate, open_date,
+                 maturity_date, auto_renew, plan_rate, plan_active) in rows:
+                payout = amount + calculate_net_interest(amount, rate, open_date,
+                                                         'closed', maturity_date)
+                close_ids.append(dep_id)
+                close_dates.append(maturity_date)
+                payouts.append(payout)
+                # Пролонгация по текущей ставке плана, если план еще действует
+                if auto_renew and plan_active:
+                    renew.append((dep_id, client_id, plan_id, dep_type, payout,
+                                  plan_rate, maturity_date))
+
+            cur.execute("""
+                UPDATE deposits d
+                SET status = 'closed', close_date = v.close_date
+                FROM unnest(%s::int[], %s::date[]) AS v(id, close_date)
+                WHERE d.id = v.id
+            """, (close_ids, close_dates))
+            cur.execute("""
+                INSERT INTO transactions (deposit_id, type, amount, description, transaction_date)
+                SELECT v.id, 'close', v.amount, 'Закрытие по окончании срока', v.close_date
+                FROM unnest(%s::int[], %s::numeric[], %s::date[]) AS v(id, amount, close_date)
+            """, (close_ids, payouts, close_dates))
+
+            if renew:
+                # psycopg2 превращает в ARRAY только списки (кортежи - в ROW)
+                cols = [list(col) for col in zip(*renew)]
+                cur.execute("""
+                    WITH new_deposits AS (
+                        INSERT INTO deposits (client_id, deposit_plan_id, deposit_type, amount,
+                                              interest_rate, open_date, status, auto_renew)
+                        SELECT v.client_id, v.plan_id, v.deposit_type, v.amount,
+                               v.rate, v.open_date, 'active', TRUE
+                        FROM unnest(%s::int[], %s::int[], %s::varchar[], %s::numeric[],
+                                    %s::numeric[], %s::date[])
+                             AS v(client_id, plan_id, deposit_type, amount, rate, open_date)
+                        RETURNING id, amount, open_date
+                    )
+                    INSERT INTO transactions (deposit_id, type, amount, description, transaction_date)
+                    SELECT id, 'open', amount, 'Пролонгация вклада', open_date FROM new_deposits
+                """, cols[1:])
+        conn.commit()
+        return {'closed': len(close_ids), 'rolled_over': len(renew),
+                'payout': sum(payouts, Decimal(0))}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        conn.close()
+
+
+def run_maturity(db_config: dict = DB_CONFIG, as_of: Optional[date] = None,
+                 chunk_size: int = 1000, workers: int = 4) -> MaturityRunReport:
+    """Обработка всех вкладов с истекшим сроком на дату as_of"""
+    as_of = as_of or date.today()
+    report = MaturityRunReport(as_of=as_of)
+    started = time.perf_counter()
+
+    conn = psycopg2.connect(**db_config)
+    try:
+        ids = find_matured_ids(conn, as_of)
+    finally:
+        conn.close()
+    report.matured = len(ids)
+
+    chunks = [ids[i:i + chunk_size] for i in range(0, len(ids), chunk_size)]
+    report.chunks = len(chunks)
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(process_chunk, db_config, chunk, as_of): chunk for chunk in chunks}
+        for future in as_completed(futures):
+            chunk = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # Пачка откатилась целиком; повторный запуск подберет ее снова
+                report.failed_chunks.append({'first_id': chunk[0], 'last_id': chunk[-1],
+                                             'error': str(e)})
+                continue
+            report.closed += result['closed']
+            report.rolled_over += result['rolled_over']
+            report.payout_total += result['payout']
+
+    report.duration_seconds = time.perf_counter() - started
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Закрытие вкладов с истекшим сроком")
+    parser.add_argument("--as-of", type=date.fromisoformat, default=None,
+                        help="дата обработки (по умолчанию сегодня)")
+    parser.add_argument("--chunk-size", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--report", help="файл для отчета в JSON")
+    args = parser.parse_args()
+
+    report = run_maturity(DB_CONFIG, args.as_of, args.chunk_size, args.workers)
+    print(report.summary())
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(asdict(report), f, ensure_ascii=False, indent=2, default=str)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""
+Хеширование и проверка паролей в отдельном пуле процессов.
+
+Хеши (pbkdf2/scrypt) намеренно дорогие по CPU. В потоке запроса они
+держат GIL и тормозят все остальные маршруты, поэтому расчет вынесен в
+ограниченный пул процессов. Очередь тоже ограничена: при "шторме"
+входов лишние запросы сразу получают отказ, а не копятся бесконечно.
+"""
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from werkzeug.security import generate_password_hash, check_password_hash
+
+
+class HasherBusyError(RuntimeError):
+    """Очередь пула хеширования переполнена"""
+
+
+class PasswordHasher:
+    def __init__(self, max_workers: int = 2, max_pending: int = 32, timeout: float = 10.0):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        # Выполняющиеся и ожидающие операции вместе
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def _get_executor(self):
+        # Пул создается при первом использовании, то есть уже после fork воркера.
+        # Процессы пула стартуют через forkserver, а не fork: в воркере gthread
+        # другие потоки в этот момент могут держать блокировки (пул соединений,
+        # logging), и в дочернем процессе они остались бы захвачены навсегда
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context('forkserver'))
+            return self._executor
+
+    def _run(self, func, *args):
+        if not self._slots.acquire(blocking=False):
+            raise HasherBusyError("Слишком много одновременных операций с паролями")
+        try:
+            future = self._get_executor().submit(func, *args)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future.result(timeout=self.timeout)
+
+    def hash(self, password: str) -> str:
+        return self._run(generate_password_hash, password)
+
+    def verify(self, pwhash: str, password: str) -> bool:
+        return self._run(check_password_hash, pwhash, password)
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False)
+                self._executor = None
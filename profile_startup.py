@@ -0,0 +1,96 @@
+"""
+Профиль холодного старта GUI.
+
+Запускает интерпретатор с `-X importtime`, собирает разбивку времени
+импорта по модулям и сравнивает время старта с целевым значением.
+
+    python profile_startup.py            # только импорты main.py
+    python profile_startup.py --with-db  # до первой отрисовки окна (нужна БД)
+"""
+import argparse
+import subprocess
+import sys
+import time
+
+# Целевое время холодного старта main.py до появления окна (секунды)
+STARTUP_TARGET_SECONDS = 1.5
+
+IMPORT_ONLY_SCRIPT = "import main"
+
+# Окно создается целиком, затем закрывается после первой отрисовки
+WITH_DB_SCRIPT = """
+import tkinter as tk
+from database.database_manager import DatabaseManager
+from gui.main_window import MainWindow
+from config import DB_CONFIG
+root = tk.Tk()
+MainWindow(root, DatabaseManager(DB_CONFIG))
+root.after_idle(root.destroy)
+root.mainloop()
+"""
+
+def run_importtime(script):
+    """Запуск скрипта с -X importtime, возвращает (время, stderr)"""
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", script],
+        capture_output=True, text=True
+    )
+    elapsed = time.perf_counter() - start
+    if proc.returncode != 0:
+        raise RuntimeError(f"Процесс завершился с ошибкой:\n{proc.stderr[-2000:]}")
+    return elapsed, proc.stderr
+
+def parse_importtime(stderr):
+    """Разбор строк 'import time: self | cumulative | package'"""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        parts = line[len("import time:"):].split("|")
+        if len(parts) != 3:
+            continue
+        self_us, cumulative_us, name = parts
+        rows.append((name.strip(), int(self_us), int(cumulative_us)))
+    return rows
+
+def top_level_breakdown(rows):
+    """Суммарное собственное время по пакетам верхнего уровня"""
+    totals = {}
+    for name, self_us, _ in rows:
+        package = name.split(".")[0]
+        totals[package] = totals.get(package, 0) + self_us
+    return sorted(totals.items(), key=lambda item: item[1], reverse=True)
+
+def print_report(elapsed, rows, top, target):
+    print(f"Время холодного старта: {elapsed:.3f} с (цель {target:.3f} с)")
+    print(f"Импортировано модулей: {len(rows)}")
+    print()
+    print("Пакеты по собственному времени импорта:")
+    for package, self_us in top_level_breakdown(rows)[:top]:
+        print(f"  {self_us / 1000:9.1f} мс  {package}")
+    print()
+    print("Самые дорогие импорты (кумулятивно):")
+    for name, _, cumulative_us in sorted(rows, key=lambda r: r[2], reverse=True)[:top]:
+        print(f"  {cumulative_us / 1000:9.1f} мс  {name}")
+
+def main():
+    parser = argparse.ArgumentParser(description="Профиль времени старта GUI")
+    parser.add_argument("--with-db", action="store_true",
+                        help="мерить старт до первой отрисовки окна (требуется БД)")
+    parser.add_argument("--top", type=int, default=15, help="строк в отчете")
+    parser.add_argument("--target", type=float, default=STARTUP_TARGET_SECONDS,
+                        help="целевое время старта в секундах")
+    args = parser.parse_args()
+
+    script = WITH_DB_SCRIPT if args.with_db else IMPORT_ONLY_SCRIPT
+    elapsed, stderr = run_importtime(script)
+    rows = parse_importtime(stderr)
+    print_report(elapsed, rows, args.top, args.target)
+
+    if elapsed > args.target:
+        print(f"\nЦель не достигнута: {elapsed:.3f} с > {args.target:.3f} с")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Профилирование отдельных запросов Flask и действий GUI по требованию.
+
+Выбранный запрос (или обработчик Tk) выполняется под семплирующим
+профайлером: фоновый поток каждые несколько миллисекунд снимает стек
+профилируемого потока. Результат - файл свернутых стеков (.folded,
+формат flamegraph.pl / speedscope) и сводка (.json), в которой время
+разделено на ожидание в методах DatabaseManager и прочую работу Python.
+
+Включается переменными окружения (см. config.py):
+    PROFILE_DIR=profiles PROFILE_ROUTES=get_my_deposits,batch python server.py
+    PROFILE_DIR=profiles PROFILE_TOKEN=secret ...   # + заголовок X-Profile: secret
+    PROFILE_DIR=profiles PROFILE_GUI_ACTIONS='*' python main.py
+Без PROFILE_DIR хуки не регистрируются и ничего не стоят.
+"""
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+# Кадры из пакета database считаются временем работы с БД
+DATABASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'database') + os.sep
+
+
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class SamplingProfiler:
+    """Семплирование стека одного потока из фонового потока"""
+
+    def __init__(self, label: str, thread_id: int = None, interval_ms: float = 2.0):
+        self.label = label
+        self.thread_id = thread_id or threading.get_ident()
+        self.interval = interval_ms / 1000
+        self.stacks = Counter()
+        self.db_methods = Counter()
+        self.samples = 0
+        self.db_samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+        self._started = None
+        self.duration = 0.0
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self._started
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is not None:
+                self._record(frame)
+
+    def _record(self, frame):
+        names = []
+        db_method = None
+        while frame is not None:
+            names.append(frame_name(frame))
+            # Внешний (ближайший к корню) кадр пакета database - вызванный метод
+            if frame.f_code.co_filename.startswith(DATABASE_DIR):
+                db_method = getattr(frame.f_code, 'co_qualname', frame.f_code.co_name)
+            frame = frame.f_back
+        if db_method is not None:
+            # Отдельная ветка под корнем flamegraph: сразу видно долю БД
+            names.append("[db]")
+            self.db_samples += 1
+            self.db_methods[db_method] += 1
+        else:
+            names.append("[python]")
+        names.append(self.label)
+        self.samples += 1
+        self.stacks[";".join(reversed(names))] += 1
+
+    def summary(self) -> dict:
+        share = lambda n: round(n / self.samples, 3) if self.samples else 0.0
+        return {
+            'label': self.label,
+            'duration_ms': round(self.duration * 1000, 1),
+            'samples': self.samples,
+            'interval_ms': self.interval * 1000,
+            'db_share': share(self.db_samples),
+            'python_share': share(self.samples - self.db_samples),
+            'db_methods': {name: share(n) for name, n in self.db_methods.most_common()},
+        }
+
+    def write(self, out_dir: str) -> str:
+        """Запись .folded и .json; возвращает путь без расширения"""
+        os.makedirs(out_dir, exist_ok=True)
+        slug = re.sub(r'[^A-Za-z0-9_.-]+', '_', self.label).strip('_')[:80]
+        base = os.path.join(out_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{slug}")
+        with open(base + '.folded', 'w', encoding='utf-8') as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+        with open(base + '.json', 'w', encoding='utf-8') as f:
+            json.dump(self.summary(), f, ensure_ascii=False, indent=2)
+        return base
+
+
+class ProfileSelector:
+    """Какие запросы/действия профилировать: по имени, токену заголовка и доле"""
+
+    def __init__(self, names: str = '', token: str = None, sample_rate: float = 1.0):
+        self.names = {n.strip() for n in names.split(',') if n.strip()}
+        self.token = token
+        self.sample_rate = sample_rate
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.names) or self.token is not None
+
+    def selects(self, name: str, header: str = None) -> bool:
+        if self.token is not None and header == self.token:
+            return True
+        if '*' in self.names or name in self.names:
+            return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+        return False
+
+
+def finish(profiler: SamplingProfiler, out_dir: str, min_ms: float):
+    """Остановка профайлера и запись результата, если действие было достаточно долгим"""
+    profiler.stop()
+    if profiler.duration * 1000 >= min_ms:
+        profiler.write(out_dir)
+
+
+def install_flask_hooks(app, selector: ProfileSelector, out_dir: str,
+                        interval_ms: float = 2.0, min_ms: float = 0.0):
+    """Профилирование выбранных маршрутов (имя endpoint или заголовок X-Profile)"""
+    from flask import g, request
+
+    @app.before_request
+    def start_request_profile():
+        endpoint = request.endpoint or ''
+        if selector.selects(endpoint, request.headers.get('X-Profile')):
+            g.profiler = SamplingProfiler(f"{request.method} {request.path}",
+                                          interval_ms=interval_ms).start()
+
+    @app.teardown_request
+    def stop_request_profile(exc):
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            finish(profiler, out_dir, min_ms)
+
+
+def install_tk_hooks(selector: ProfileSelector, out_dir: str,
+                     interval_ms: float = 2.0, min_ms: float = 0.0):
+    """
+    Профилирование обработчиков Tk (кнопки, привязки, after).
+
+    Все обработчики вызываются через tkinter.CallWrapper, поэтому его
+    подмена охватывает обработчики, зарегистрированные после установки.
+    Имя действия - __qualname__ обработчика (например,
+    MainWindow.show_analytics или DepositRequestsFrame.approve_selected).
+    """
+    import tkinter
+
+    base = tkinter.CallWrapper
+
+    class ProfilingCallWrapper(base):
+        def __call__(self, *args):
+            name = getattr(self.func, '__qualname__', None) or repr(self.func)
+            if not selector.selects(name):
+                return base.__call__(self, *args)
+            profiler = SamplingProfiler(f"gui {name}", interval_ms=interval_ms).start()
+            try:
+                return base.__call__(self, *args)
+            finally:
+                finish(profiler, out_dir, min_ms)
+
+    tkinter.CallWrapper = ProfilingCallWrapper
@@ -0,0 +1,230 @@
+"""
+Сверка журнала операций (transactions) с вкладами (deposits).
+
+Инварианты по каждому вкладу:
+    active           - ровно одна операция 'open' на сумму вклада, без 'close'
+    closed           - ровно одна 'open' на сумму вклада и ровно одна 'close'
+                       не меньше вложенной суммы
+    pending/rejected - операций нет
+Кроме того, у каждой операции есть вклад и известный тип.
+
+Вклады делятся на диапазоны id, и диапазоны проверяются параллельно
+set-based запросами (одна агрегация операций диапазона + соединение с
+вкладами). Все воркеры читают один снимок БД (pg_export_snapshot), поэтому
+отчет соответствует одному моменту времени, хотя рабочая база не стоит.
+
+    python reconcile_ledger.py -o discrepancies.csv
+    python reconcile_ledger.py --include-archived --workers 8 --report run.json
+"""
+import argparse
+import csv
+import json
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+
+import psycopg2
+import psycopg2.extensions
+
+from config import DB_CONFIG
+
+# Нарушения по вкладам диапазона [lo, hi): одна строка на вклад с кодами нарушений
+RECONCILE_RANGE_SQL = """
+    WITH d AS (
+        SELECT id, client_id, status, amount FROM {deposits}
+        WHERE id >= %(lo)s AND id < %(hi)s
+    ),
+    t AS (
+        SELECT deposit_id,
+               COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE type = 'open') AS opens,
+               COUNT(*) FILTER (WHERE type = 'close') AS closes,
+               COUNT(*) FILTER (WHERE type NOT IN ('open', 'close')) AS unknown,
+               MIN(amount) FILTER (WHERE type = 'open') AS open_min,
+               MAX(amount) FILTER (WHERE type = 'open') AS open_max,
+               MIN(amount) FILTER (WHERE type = 'close') AS close_min
+        FROM {transactions}
+        WHERE deposit_id >= %(lo)s AND deposit_id < %(hi)s
+        GROUP BY deposit_id
+    ),
+    checked AS (
+        SELECT COALESCE(d.id, t.deposit_id) AS deposit_id, d.client_id, d.status, d.amount,
+               COALESCE(t.opens, 0) AS opens, COALESCE(t.closes, 0) AS closes,
+               t.open_min, t.close_min,
+               array_remove(ARRAY[
+                   CASE WHEN d.id IS NULL THEN 'orphan_transactions' END,
+                   CASE WHEN d.status IN ('active', 'closed') AND COALESCE(t.opens, 0) = 0
+                        THEN 'missing_open' END,
+                   CASE WHEN t.opens > 1 THEN 'duplicate_open' END,
+                   CASE WHEN t.opens > 0 AND (t.open_min <> d.amount OR t.open_max <> d.amount)
+                        THEN 'open_amount_mismatch' END,
+                   CASE WHEN d.status = 'closed' AND COALESCE(t.closes, 0) = 0
+                        THEN 'missing_close' END,
+                   CASE WHEN t.closes > 1 THEN 'duplicate_close' END,
+                   CASE WHEN d.status = 'active' AND t.closes > 0 THEN 'unexpected_close' END,
+                   CASE WHEN t.close_min < d.amount THEN 'close_below_principal' END,
+                   CASE WHEN d.status IN ('pending', 'rejected') AND t.total > 0
+                        THEN 'unexpected_transactions' END,
+                   CASE WHEN t.unknown > 0 THEN 'unknown_type' END,
+                   CASE WHEN d.status NOT IN ('pending', 'active', 'closed', 'rejected')
+                        THEN 'unknown_status' END
+               ], NULL) AS problems
+        FROM d
+        FULL JOIN t ON t.deposit_id = d.id
+    )
+    SELECT deposit_id, client_id, status, amount, opens, closes, open_min, close_min, problems
+    FROM checked
+    WHERE cardinality(problems) > 0
+    ORDER BY deposit_id
+"""
+
+RANGE_STATS_SQL = """
+    SELECT (SELECT COUNT(*) FROM {deposits} WHERE id >= %(lo)s AND id < %(hi)s),
+           (SELECT COUNT(*) FROM {transactions} WHERE deposit_id >= %(lo)s AND deposit_id < %(hi)s)
+"""
+
+DISCREPANCY_COLUMNS = ['deposit_id', 'client_id', 'status', 'amount', 'opens', 'closes',
+                       'open_amount', 'close_amount', 'problems']
+
+
+@dataclass
+class ReconciliationReport:
+    deposits_checked: int = 0
+    transactions_checked: int = 0
+    deposits_with_problems: int = 0
+    problems: Dict[str, int] = field(default_factory=dict)
+    ranges: int = 0
+    failed_ranges: List[dict] = field(default_factory=list)
+    include_archived: bool = False
+    duration_seconds: float = 0.0
+
+    def summary(self) -> str:
+        lines = [
+            f"Проверено вкладов: {self.deposits_checked}, операций: {self.transactions_checked}"
+            + (" (с архивом)" if self.include_archived else ""),
+            f"Вкладов с расхождениями: {self.deposits_with_problems}",
+        ]
+        lines += [f"  {code}: {count}" for code, count in sorted(self.problems.items())]
+        lines.append(f"Диапазонов: {self.ranges}, с ошибками: {len(self.failed_ranges)}")
+        lines.append(f"Время: {self.duration_seconds:.1f} с")
+        return "\n".join(lines)
+
+
+def tables(include_archived: bool) -> dict:
+    if include_archived:
+        return {'deposits': 'all_deposits', 'transactions': 'all_transactions'}
+    return {'deposits': 'deposits', 'transactions': 'transactions'}
+
+
+def id_ranges(conn, include_archived: bool, range_size: int) -> List[tuple]:
+    """Диапазоны [lo, hi) по id вкладов и deposit_id операций (сироты тоже попадают)"""
+    names = tables(include_archived)
+    with conn.cursor() as cur:
+        cur.execute(f"""
+            SELECT LEAST((SELECT MIN(id) FROM {names['deposits']}),
+                         (SELECT MIN(deposit_id) FROM {names['transactions']})),
+                   GREATEST((SELECT MAX(id) FROM {names['deposits']}),
+                            (SELECT MAX(deposit_id) FROM {names['transactions']}))
+        """)
+        low, high = cur.fetchone()
+    if low is None:
+        return []
+    return [(lo, min(lo + range_size, high + 1)) for lo in range(low, high + 1, range_size)]
+
+
+def check_range(db_config: dict, snapshot: Optional[str], lo: int, hi: int,
+                include_archived: bool) -> dict:
+    """Проверка одного диапазона в общем снимке; (статистика, расхождения)"""
+    names = tables(include_archived)
+    conn = psycopg2.connect(**db_config)
+    try:
+        conn.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ,
+                         readonly=True)
+        with conn.cursor() as cur:
+            if snapshot is not None:
+                cur.execute("SET TRANSACTION SNAPSHOT %s", (snapshot,))
+            params = {'lo': lo, 'hi': hi}
+            cur.execute(RANGE_STATS_SQL.format(**names), params)
+            deposits, transactions = cur.fetchone()
+            cur.execute(RECONCILE_RANGE_SQL.format(**names), params)
+            rows = cur.fetchall()
+        conn.rollback()
+        return {'deposits': deposits, 'transactions': transactions, 'discrepancies': rows}
+    finally:
+        conn.close()
+
+
+def run_reconciliation(db_config: dict = DB_CONFIG, include_archived: bool = False,
+                       range_size: int = 100000, workers: int = 4,
+                       output: Optional[str] = None) -> ReconciliationReport:
+    """Сверка всего журнала; расхождения пишутся в CSV output по мере готовности диапазонов"""
+    report = ReconciliationReport(include_archived=include_archived)
+    problems = Counter()
+    started = time.perf_counter()
+
+    # Соединение-координатор держит экспортированный снимок до конца работы воркеров
+    coordinator = psycopg2.connect(**db_config)
+    out = open(output, 'w', newline='', encoding='utf-8') if output else None
+    try:
+        coordinator.set_session(isolation_level=psycopg2.extensions.ISOLATION_LEVEL_REPEATABLE_READ,
+                                readonly=True)
+        with coordinator.cursor() as cur:
+            cur.execute("SELECT pg_export_snapshot()")
+            snapshot = cur.fetchone()[0]
+        ranges = id_ranges(coordinator, include_archived, range_size)
+        report.ranges = len(ranges)
+
+        writer = csv.writer(out) if out else None
+        if writer:
+            writer.writerow(DISCREPANCY_COLUMNS)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {pool.submit(check_range, db_config, snapshot, lo, hi, include_archived): (lo, hi)
+                       for lo, hi in ranges}
+            for future in as_completed(futures):
+                lo, hi = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    report.failed_ranges.append({'first_id': lo, 'last_id': hi - 1, 'error': str(e)})
+                    continue
+                report.deposits_checked += result['deposits']
+                report.transactions_checked += result['transactions']
+                report.deposits_with_problems += len(result['discrepancies'])
+                for row in result['discrepancies']:
+                    problems.update(row[-1])
+                    if writer:
+                        writer.writerow(list(row[:-1]) + [";".join(row[-1])])
+    finally:
+        if out:
+            out.close()
+        coordinator.close()
+
+    report.problems = dict(problems)
+    report.duration_seconds = time.perf_counter() - started
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сверка журнала операций с вкладами")
+    parser.add_argument("--include-archived", action="store_true",
+                        help="вместе с архивом закрытых вкладов")
+    parser.add_argument("--range-size", type=int, default=100000, help="id вкладов в диапазоне")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("-o", "--output", help="CSV со списком расхождений")
+    parser.add_argument("--report", help="файл для отчета в JSON")
+    args = parser.parse_args()
+
+    report = run_reconciliation(DB_CONFIG, args.include_archived, args.range_size,
+                                args.workers, args.output)
+    print(report.summary())
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(asdict(report), f, ensure_ascii=False, indent=2, default=str)
+    # Ненулевой код возврата - сигнал для планировщика
+    raise SystemExit(1 if report.deposits_with_problems or report.failed_ranges else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,115 @@
-from flask import Flask, request, jsonify, session
+import hmac
+import json
+import os
+import queue
+import threading
+from flask import Flask, request, jsonify, session, Response, stream_with_context, g
 from flask_cors import CORS
-from werkzeug.security import generate_password_hash, check_password_hash
-from database.database_manager import DatabaseManager
+from werkzeug.exceptions import HTTPException
+from database.database_manager import DatabaseManager, normalize_email
+from database.database_manager import DEPOSIT_PAGE_FIELDS, TRANSACTION_PAGE_FIELDS
 from database.models import Client, Deposit
-from config import DB_CONFIG
-from datetime import date
+from database.interest import calculate_net_interest
+from database.notifications import shared_listener
+from database.deposit_cache import follow_deposit_events
+from database.export import ExportFilters, EXPORT_QUERIES, iter_csv, iter_parquet
+from config import DB_CONFIG, RESPONSE_CACHE_ENABLED, RESPONSE_CACHE_MAX_ENTRIES, COMPRESSION_MIN_SIZE
+from config import SSE_HEARTBEAT_SECONDS, SSE_MAX_STREAMS, PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING
+from config import GROUP_COMMIT_ENABLED, GROUP_COMMIT_INTERVAL_MS, DEPOSIT_CACHE_MAX_BYTES
+from config import GROUP_COMMIT_LOCK_TIMEOUT_MS, GROUP_COMMIT_RESULT_TIMEOUT
+from config import DB_REPLICAS, READ_YOUR_WRITES_SECONDS, MAX_REPLICA_LAG_SECONDS
+from config import EXPORT_TOKEN, METRICS_TOKEN
+from config import PROFILE_DIR, PROFILE_ROUTES, PROFILE_TOKEN, PROFILE_SAMPLE_RATE
+from config import PROFILE_INTERVAL_MS, PROFILE_MIN_MS
+from config import TRACE_FILE, TRACE_FORMAT
+from http_utils import ResponseCache, versioned_json, compress_response, encode_cursor, decode_cursor
+from password_pool import PasswordHasher, HasherBusyError
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from contextlib import ExitStack
+from datetime import date, datetime
 from decimal import Decimal
 
 app = Flask(__name__, static_folder='web', static_url_path='')
 app.secret_key = 'super_secret_key_for_session' # В продакшене заменить!
 CORS(app) # Разрешаем запросы с браузера
 
-# Инициализация менеджера БД
-db = DatabaseManager(DB_CONFIG)
+# Ресурсы процесса создаются в init_worker (после fork воркера), а не при импорте:
+# соединения и потоки нельзя делить между процессами pre-fork сервера
+db = None
+password_hasher = None
+trace_exporter = None
+# Серверный кэш ответов, ключ - (маршрут, версия данных)
+response_cache = None
+# Свободные места для потоков SSE в этом процессе
+sse_slots = threading.BoundedSemaphore(SSE_MAX_STREAMS)
+
+# Трассировка: маршрут -> методы DatabaseManager -> SQL (только если включена)
+if TRACE_FILE:
+    from tracing import start_trace, finish_trace
+
+    @app.before_request
+    def start_request_trace():
+        route = request.url_rule.rule if request.url_rule else request.path
+        g.trace = start_trace(f"{request.method} {route}", request.headers.get('X-Request-ID'),
+                              **{'http.method': request.method, 'http.route': route,
+                                 'http.target': request.full_path.rstrip('?')})
+
+    @app.after_request
+    def add_request_id(response):
+        if 'trace' in g:
+            span, _ = g.trace
+            span.attributes['http.status_code'] = response.status_code
+            response.headers['X-Request-ID'] = span.trace.trace_id
+        return response
+
+    @app.teardown_request
+    def finish_request_trace(exc):
+        trace = g.pop('trace', None)
+        if trace is not None:
+            finished = finish_trace(*trace, error=exc)
+            if trace_exporter is not None:
+                trace_exporter.submit(finished)
+
+# Маршруты с ETag по версии данных читают с основного сервера: кабинет
+# перечитывает их по событию SSE сразу после COMMIT, и ответ с отстающей
+# реплики со старой версией вернул бы 304 до следующего изменения.
+# Пакет вызывает эти же маршруты внутри своего запроса.
+PRIMARY_READ_ENDPOINTS = {'get_my_deposits', 'get_plans', 'get_dashboard',
+                          'list_deposits', 'list_deposit_transactions', 'batch'}
+
+@app.before_request
+def bind_read_session():
+    # Чтения запроса идут с одной реплики; после своей записи клиент
+    # какое-то время читает с основного сервера. Время записи хранится в
+    # подписанной cookie сессии: следующий запрос может попасть в другой воркер
+    g.read_stack = ExitStack()
+    g.read_writes = g.read_stack.enter_context(
+        db.read_session(session.get('user_id') or request.remote_addr,
+                        session.get('last_write_at'),
+                        primary=request.endpoint in PRIMARY_READ_ENDPOINTS))
+
+@app.after_request
+def remember_write(response):
+    writes = g.get('read_writes')
+    if writes is not None and writes['last_write_at'] != session.get('last_write_at'):
+        session['last_write_at'] = writes['last_write_at']
+    return response
+
+@app.teardown_request
+def release_read_session(exc):
+    stack = g.pop('read_stack', None)
+    if stack is not None:
+        stack.close()
+
+# Профилирование выбранных запросов (регистрируется, только если включено)
+if PROFILE_DIR:
+    from profiler import ProfileSelector, install_flask_hooks
+    install_flask_hooks(app, ProfileSelector(PROFILE_ROUTES, PROFILE_TOKEN, PROFILE_SAMPLE_RATE),
+                        PROFILE_DIR, PROFILE_INTERVAL_MS, PROFILE_MIN_MS)
+
+@app.after_request
+def compress(response):
+    return compress_response(response, COMPRESSION_MIN_SIZE)
 
 # --- ВСПОМОГАТЕЛЬНЫЕ ФУНКЦИИ ---
 def decimal_default(obj):
@@ -22,6 +119,12 @@ def decimal_default(obj):
         return obj.isoformat()
     raise TypeError
 
+def hasher_busy_response():
+    response = jsonify({"success": False, "error": "Сервер перегружен, повторите попытку"})
+    response.status_code = 503
+    response.headers['Retry-After'] = '1'
+    return response
+
 # --- РОУТИНГ (API) ---
 
 @app.route('/')
@@ -39,22 +142,24 @@ def register():
     try:
         # Проверка существования (упрощено)
         # Хешируем пароль
-        pwd_hash = generate_password_hash(data['password'])
+        pwd_hash = password_hasher.hash(data['password'])
         
         # Используем существующий метод, но нам нужно модифицировать create_client 
         # или выполнить прямой SQL здесь для добавления пароля.
-        # Для простоты сделаем прямой SQL вставку через db.conn
-        with db.conn.cursor() as cur:
+        # Для простоты - прямой SQL на своем соединении из пула (COMMIT/ROLLBACK
+        # только этого запроса)
+        with db.pooled_cursor() as cur:
             cur.execute("""
                 INSERT INTO clients (full_name, passport_data, phone_number, email, address, password_hash)
                 VALUES (%s, %s, %s, %s, %s, %s) RETURNING id
-            """, (data['full_name'], data['passport'], data['phone'], data['email'], data.get('address', ''), pwd_hash))
+            """, (data['full_name'], data['passport'], data['phone'], normalize_email(data['email']), data.get('address', ''), pwd_hash))
             new_id = cur.fetchone()[0]
-            db.conn.commit()
+        db.mark_write()
             
         return jsonify({"success": True, "id": new_id})
+    except (HasherBusyError, FutureTimeoutError):
+        return hasher_busy_response()
     except Exception as e:
-        db.conn.rollback()
         return jsonify({"success": False, "error": str(e)}), 400
 
 # 2. ВХОД
@@ -64,11 +169,15 @@ def login():
     email = data.get('email')
     password = data.get('password')
     
-    with db.conn.cursor() as cur:
-        cur.execute("SELECT id, full_name, password_hash FROM clients WHERE email = %s", (email,))
-        user = cur.fetchone()
+    user = db.get_client_credentials(email)
     
-    if user and user[2] and check_password_hash(user[2], password):
+    try:
+        valid = bool(user and user[2] and password_hasher.verify(user[2], password))
+    except (HasherBusyError, FutureTimeoutError):
+        # Очередь пула переполнена или хеш не успел посчитаться - пул перегружен
+        return hasher_busy_response()
+
+    if valid:
         session['user_id'] = user[0]
         session['user_name'] = user[1]
         return jsonify({"success": True, "name": user[1]})
@@ -76,48 +185,261 @@ def login():
     return jsonify({"success": False, "error": "Неверный email или пароль"}), 401
 
 # 3. ПОЛУЧЕНИЕ ВКЛАДОВ КЛИЕНТА
+def deposit_to_json(d, profit):
+    return {
+        "id": d.id,
+        "type": d.deposit_type,
+        "amount": float(d.amount),
+        "rate": float(d.interest_rate),
+        "open_date": d.open_date.isoformat(),
+        "close_date": d.close_date.isoformat() if d.close_date else None, # <--- ДОБАВЛЕНО
+        "status": d.status,
+        "profit": float(profit)
+    }
+
+def build_my_deposits(client_id):
+    # Вклады с накопленными процентами (из кэша сводок, если он включен)
+    return [deposit_to_json(d, profit) for d, profit in db.get_client_deposit_summary(client_id)]
+
 @app.route('/api/my_deposits', methods=['GET'])
 def get_my_deposits():
     if 'user_id' not in session:
         return jsonify({"error": "Unauthorized"}), 401
     
-    deposits = db.get_client_deposits(session['user_id'])
-    
-    # Конвертируем объекты Deposit в словарь для JSON
-    result = []
-    for d in deposits:
-        # Считаем накопленный процент на лету
-        try:
-            profit = db.calculate_interest(d.id) if d.status == 'active' else 0
-        except:
-            profit = 0
-            
-        result.append({
-            "id": d.id,
-            "type": d.deposit_type,
-            "amount": float(d.amount),
-            "rate": float(d.interest_rate),
-            "open_date": d.open_date.isoformat(),
-            "close_date": d.close_date.isoformat() if d.close_date else None, # <--- ДОБАВЛЕНО
-            "status": d.status,
-            "profit": float(profit)
-        })
-    return jsonify(result)
+    client_id = session['user_id']
+    # Проценты начисляются ежедневно, поэтому дата входит в версию
+    version = (db.get_data_version(f"deposits:{client_id}"), date.today().isoformat())
+    return versioned_json(("my_deposits", client_id), version,
+                          lambda: build_my_deposits(client_id), response_cache)
 
 # 4. СПИСОК ДОСТУПНЫХ ПЛАНОВ
+def plan_to_json(p):
+    return {
+        "id": p.id,
+        "name": p.name,
+        "rate": float(p.interest_rate),
+        "min_amount": float(p.min_amount),
+        "desc": p.description
+    }
+
+def build_plans():
+    return [plan_to_json(p) for p in db.get_active_deposit_plans()]
+
 @app.route('/api/plans', methods=['GET'])
 def get_plans():
-    plans = db.get_active_deposit_plans()
-    result = []
-    for p in plans:
-        result.append({
-            "id": p.id,
-            "name": p.name,
-            "rate": float(p.interest_rate),
-            "min_amount": float(p.min_amount),
-            "desc": p.description
-        })
-    return jsonify(result)
+    return versioned_json(("plans",), db.get_data_version("plans"), build_plans, response_cache)
+
+# 4.1 ДАННЫЕ ЛИЧНОГО КАБИНЕТА ОДНИМ ЗАПРОСОМ
+def build_dashboard(client_id):
+    data = db.get_client_dashboard(client_id)
+    profile = data['profile']
+    return {
+        "profile": {
+            "id": profile.id,
+            "name": profile.full_name,
+            "email": profile.email,
+            "phone": profile.phone_number,
+        } if profile else None,
+        "deposits": [deposit_to_json(d, profit) for d, profit in data['deposits']],
+        "plans": [plan_to_json(p) for p in data['plans']],
+        "total_accrued": float(data['total_accrued']),
+    }
+
+@app.route('/api/dashboard', methods=['GET'])
+def get_dashboard():
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    client_id = session['user_id']
+    version = (db.get_data_version(f"deposits:{client_id}"),
+               db.get_data_version("plans"),
+               date.today().isoformat())
+    return versioned_json(("dashboard", client_id), version,
+                          lambda: build_dashboard(client_id), response_cache)
+
+# 4.2 ИСТОРИЯ ВКЛАДОВ И ОПЕРАЦИЙ ПОСТРАНИЧНО
+PAGE_DEFAULT_LIMIT = 50
+PAGE_MAX_LIMIT = 200
+
+def parse_page_args(args, allowed_fields, default_fields):
+    """Общие параметры страницы: fields, limit, date_from, date_to, cursor"""
+    fields = [f for f in args.get('fields', '').split(',') if f] or list(default_fields)
+    unknown = [f for f in fields if f not in allowed_fields]
+    if unknown:
+        raise ValueError(f"Неизвестные поля: {', '.join(unknown)}")
+    # id нужен для курсора, даже если клиент его не просил
+    if 'id' not in fields:
+        fields.insert(0, 'id')
+    limit = min(max(int(args.get('limit', PAGE_DEFAULT_LIMIT)), 1), PAGE_MAX_LIMIT)
+    date_from = date.fromisoformat(args['date_from']) if args.get('date_from') else None
+    date_to = date.fromisoformat(args['date_to']) if args.get('date_to') else None
+    cursor = decode_cursor(args['cursor']) if args.get('cursor') else None
+    return fields, limit, date_from, date_to, cursor
+
+def is_cursor_id(value):
+    # bool - подкласс int, а 1.5 или "12" int() пропустил бы молча
+    return isinstance(value, int) and not isinstance(value, bool)
+
+def deposit_cursor(cursor):
+    """Курсор страницы вкладов: id последнего вклада"""
+    if cursor is None:
+        return None
+    if not is_cursor_id(cursor):
+        raise ValueError("Некорректный курсор")
+    return cursor
+
+def transaction_cursor(cursor):
+    """Курсор страницы операций: [дата ISO, id] последней операции"""
+    if cursor is None:
+        return None
+    if not (isinstance(cursor, list) and len(cursor) == 2
+            and isinstance(cursor[0], str) and is_cursor_id(cursor[1])):
+        raise ValueError("Некорректный курсор")
+    return datetime.fromisoformat(cursor[0]), cursor[1]
+
+def page_response(rows, limit, make_cursor):
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    return {"items": rows,
+            "next_cursor": encode_cursor(make_cursor(rows[-1])) if has_more else None}
+
+@app.route('/api/deposits', methods=['GET'])
+def list_deposits():
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    client_id = session['user_id']
+    try:
+        fields, limit, date_from, date_to, cursor = parse_page_args(
+            request.args, set(DEPOSIT_PAGE_FIELDS) | {'profit'}, DEPOSIT_PAGE_FIELDS)
+        after_id = deposit_cursor(cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    status = request.args.get('status') or None
+    include_archived = request.args.get('include_archived') == '1'
+
+    def build():
+        # Проценты считаются по строке вклада, поэтому нужные колонки
+        # добавляются к выборке и убираются из ответа
+        with_profit = 'profit' in fields
+        sql_fields = [f for f in fields if f != 'profit']
+        extra = [f for f in ('amount', 'rate', 'open_date', 'status', 'close_date')
+                 if with_profit and f not in sql_fields]
+        rows = db.get_deposits_page(client_id, sql_fields + extra, status, date_from, date_to,
+                                    after_id, limit, include_archived)
+        if with_profit:
+            today = date.today()
+            for row in rows:
+                row['profit'] = (calculate_net_interest(row['amount'], row['rate'], row['open_date'],
+                                                        row['status'], row['close_date'], today)
+                                 if row['status'] == 'active' else 0)
+                for name in extra:
+                    del row[name]
+        return page_response(rows, limit, lambda row: row['id'])
+
+    version = (db.get_data_version(f"deposits:{client_id}"), date.today().isoformat())
+    cache_key = ("deposits_page", client_id, request.query_string.decode())
+    return versioned_json(cache_key, version, build, response_cache, default=decimal_default)
+
+@app.route('/api/deposits/<int:deposit_id>/transactions', methods=['GET'])
+def list_deposit_transactions(deposit_id):
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    client_id = session['user_id']
+    try:
+        fields, limit, date_from, date_to, cursor = parse_page_args(
+            request.args, TRANSACTION_PAGE_FIELDS, TRANSACTION_PAGE_FIELDS)
+        after = transaction_cursor(cursor)
+    except ValueError as e:
+        return jsonify({"error": str(e) or "Некорректный курсор"}), 400
+    tx_type = request.args.get('type') or None
+    include_archived = request.args.get('include_archived') == '1'
+
+    def build():
+        # Дата операции нужна для курсора, даже если клиент ее не просил
+        extra = [] if 'date' in fields else ['date']
+        rows = db.get_transactions_page(client_id, deposit_id, fields + extra, tx_type,
+                                        date_from, date_to, after, limit, include_archived)
+        if rows is None:
+            raise LookupError(deposit_id)
+        page = page_response(rows, limit, lambda row: [row['date'].isoformat(), row['id']])
+        for row in page['items']:
+            for name in extra:
+                del row[name]
+        return page
+
+    # Операции пишутся вместе с изменением вклада, поэтому версия - та же
+    version = db.get_data_version(f"deposits:{client_id}")
+    cache_key = ("transactions_page", client_id, deposit_id, request.query_string.decode())
+    try:
+        return versioned_json(cache_key, version, build, response_cache, default=decimal_default)
+    except LookupError:
+        return jsonify({"error": "Вклад не найден"}), 404
+
+# 4.3 ПРЕДЛОЖЕНИЕ ПО ВКЛАДУ ДО ОТКРЫТИЯ
+def quote_to_json(q):
+    return {
+        "plan_id": q.plan_id,
+        "plan_name": q.plan_name,
+        "amount": q.amount,
+        "rate": q.rate,
+        "term_months": q.term_months,
+        "capitalization": q.capitalization,
+        "start_date": q.start_date,
+        "maturity_date": q.maturity_date,
+        "interest": q.interest,
+        "payout": q.payout,
+        "tax_rate": q.tax_rate,
+        "schedule": [{"month": p.month, "date": p.date, "days": p.days, "interest": p.interest,
+                      "payout": p.payout, "penalty": p.penalty} for p in q.schedule],
+    }
+
+@app.route('/api/quote', methods=['GET'])
+def get_quote():
+    args = request.args
+    try:
+        quote = db.get_deposit_quote(int(args['plan_id']), Decimal(args['amount']),
+                                     int(args['term']) if args.get('term') else None,
+                                     args.get('capitalization') in ('1', 'true'))
+    except (KeyError, ArithmeticError, ValueError) as e:
+        message = f"Не указан параметр {e}" if isinstance(e, KeyError) else str(e)
+        return jsonify({"error": message or "Некорректные параметры"}), 400
+    return app.response_class(json.dumps(quote_to_json(quote), default=decimal_default),
+                              mimetype='application/json')
+
+# 4.4 ПАКЕТ ЧТЕНИЙ В ОДНОМ HTTP-ЗАПРОСЕ
+# Через пакет доступны только маршруты чтения без побочных эффектов
+BATCH_ENDPOINTS = {'get_my_deposits', 'get_plans', 'get_dashboard',
+                   'list_deposits', 'list_deposit_transactions', 'get_quote'}
+BATCH_MAX_REQUESTS = 10
+
+@app.route('/api/batch', methods=['POST'])
+def batch():
+    items = (request.json or {}).get('requests', [])
+    if not isinstance(items, list) or len(items) > BATCH_MAX_REQUESTS:
+        return jsonify({"error": f"Ожидается список не более {BATCH_MAX_REQUESTS} запросов"}), 400
+
+    adapter = app.url_map.bind('localhost')
+    # Подзапросы выполняются с той же сессией (cookie), что и пакет
+    headers = {'Cookie': request.headers.get('Cookie', '')}
+    responses = []
+    for item in items:
+        path = item.get('path', '') if isinstance(item, dict) else ''
+        try:
+            endpoint, args = adapter.match(path.split('?', 1)[0], method='GET')
+        except HTTPException as e:
+            responses.append({"path": path, "status": e.code, "body": None})
+            continue
+        if endpoint not in BATCH_ENDPOINTS:
+            responses.append({"path": path, "status": 400, "body": {"error": "Маршрут недоступен в пакете"}})
+            continue
+
+        with app.test_request_context(path, method='GET', headers=headers):
+            rv = app.make_response(app.view_functions[endpoint](**args))
+            responses.append({"path": path, "status": rv.status_code, "body": rv.get_json(silent=True)})
+
+    return jsonify({"responses": responses})
 
 # 5. ОТКРЫТИЕ ВКЛАДА
 @app.route('/api/open_deposit', methods=['POST'])
@@ -139,14 +461,180 @@ def open_deposit_api():
         # Открываем через существующую логику
         new_id = db.open_deposit(dep, plan_id=data['plan_id'])
         return jsonify({"success": True, "id": new_id})
+    except FutureTimeoutError:
+        # Ожидающая операция снята с очереди; сохраниться могла только уже
+        # начатая, поэтому перед повтором нужно проверить список вкладов
+        return jsonify({"success": False,
+                        "error": "Сервер не успел подтвердить заявку. Заявка, скорее всего, "
+                                 "не создана; перед повтором проверьте список вкладов"}), 503
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 400
 
+# 5.1 ПОТОК СОБЫТИЙ (Server-Sent Events)
+@app.route('/api/events')
+def events():
+    if 'user_id' not in session:
+        return jsonify({"error": "Unauthorized"}), 401
+
+    # Каждый поток держит поток воркера, пока открыта страница: без предела
+    # несколько кабинетов заняли бы все потоки, и вход/API ждали бы за ними
+    if not sse_slots.acquire(blocking=False):
+        response = jsonify({"error": "Слишком много подписок, повторите позже"})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+
+    try:
+        listener = shared_listener(DB_CONFIG)
+        subscription = listener.subscribe(session['user_id'])
+    except Exception:
+        # Без подписки место не занято: иначе сбои LISTEN исчерпали бы все места
+        sse_slots.release()
+        raise
+
+    def stream():
+        yield "retry: 5000\n\n"
+        while True:
+            try:
+                event = subscription.get(timeout=SSE_HEARTBEAT_SECONDS)
+            except queue.Empty:
+                # Комментарий держит соединение открытым через прокси
+                yield ": keepalive\n\n"
+                continue
+            yield f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
+
+    def release():
+        # Вызывается при закрытии ответа, даже если поток так и не начался
+        listener.unsubscribe(subscription)
+        sse_slots.release()
+
+    response = Response(stream_with_context(stream()), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    response.call_on_close(release)
+    return response
+
+# 5.2 ВЫГРУЗКА ДЛЯ БУХГАЛТЕРИИ (потоково, по токену)
+EXPORT_FORMATS = {
+    'csv': (iter_csv, 'text/csv'),
+    'parquet': (iter_parquet, 'application/vnd.apache.parquet'),
+}
+
+def export_filters_from_args(args) -> ExportFilters:
+    def optional(name, convert):
+        value = args.get(name)
+        return convert(value) if value else None
+
+    return ExportFilters(date_from=optional('date_from', date.fromisoformat),
+                         date_to=optional('date_to', date.fromisoformat),
+                         client_id=optional('client_id', int),
+                         plan_id=optional('plan_id', int),
+                         include_archived=args.get('include_archived') == '1')
+
+@app.route('/api/export/<dataset>', methods=['GET'])
+def export_data(dataset):
+    if EXPORT_TOKEN is None:
+        return jsonify({"error": "Выгрузка отключена"}), 403
+    auth = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(auth.encode(), f"Bearer {EXPORT_TOKEN}".encode()):
+        return jsonify({"error": "Unauthorized"}), 401
+    fmt = request.args.get('format', 'csv')
+    if dataset not in EXPORT_QUERIES or fmt not in EXPORT_FORMATS:
+        return jsonify({"error": "Неизвестный набор данных или формат"}), 400
+    try:
+        filters = export_filters_from_args(request.args)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    produce, mimetype = EXPORT_FORMATS[fmt]
+    filename = f"{dataset}.{fmt}"
+    # Без stream_with_context: генератор не трогает контекст запроса
+    return Response(produce(db, dataset, filters), mimetype=mimetype,
+                    headers={'Content-Disposition': f'attachment; filename="{filename}"',
+                             'X-Accel-Buffering': 'no'})
+
+# 5.3 МЕТРИКИ КЭШЕЙ (для администратора)
+@app.route('/api/cache_metrics', methods=['GET'])
+def cache_metrics():
+    if METRICS_TOKEN is None:
+        return jsonify({"error": "Метрики отключены"}), 403
+    auth = request.headers.get('Authorization', '')
+    if not hmac.compare_digest(auth.encode(), f"Bearer {METRICS_TOKEN}".encode()):
+        return jsonify({"error": "Unauthorized"}), 401
+    from database.quotes import quote_cache_metrics
+    # Кэши у каждого воркера свои: ответ - по процессу, обработавшему запрос
+    return jsonify({
+        "pid": os.getpid(),
+        "deposit_summary": db.deposit_cache.metrics() if db.deposit_cache is not None else None,
+        "quotes": quote_cache_metrics(),
+    })
+
 # 6. ВЫХОД
 @app.route('/api/logout')
 def logout():
     session.clear()
     return jsonify({"success": True})
 
+# --- ФАБРИКА ПРИЛОЖЕНИЯ ---
+def create_db(create_schema: bool, traced: bool = False) -> DatabaseManager:
+    db_config, replicas = DB_CONFIG, DB_REPLICAS
+    if traced:
+        from tracing import traced_config, instrument_methods
+        db_config, replicas = traced_config(DB_CONFIG), [traced_config(r) for r in DB_REPLICAS]
+    manager = DatabaseManager(db_config, replica_configs=replicas,
+                              read_your_writes_seconds=READ_YOUR_WRITES_SECONDS,
+                              max_replica_lag_seconds=MAX_REPLICA_LAG_SECONDS,
+                              create_schema=create_schema)
+    if traced:
+        # Служебные методы (контексты, пулы, жизненный цикл) - без своих спанов
+        instrument_methods(manager, 'DatabaseManager',
+                           exclude={'read_session', 'pooled_cursor', 'mark_write', 'close',
+                                    'warmup', 'connect', 'create_tables',
+                                    'enable_group_commit', 'disable_group_commit',
+                                    'enable_deposit_cache'})
+    return manager
+
+def migrate():
+    """Создание/обновление схемы; выполняется один раз до запуска воркеров"""
+    create_db(create_schema=True).close()
+
+def warmup():
+    """Прогрев соединений и кэша популярных ответов до приема трафика"""
+    db.warmup()
+    with app.test_request_context('/api/plans'):
+        get_plans()
+
+def init_worker(warm: bool = True):
+    """Ресурсы текущего процесса: соединения, пулы, писатель, кэш"""
+    global db, password_hasher, response_cache, trace_exporter
+    if TRACE_FILE:
+        from tracing import TraceExporter
+        trace_exporter = TraceExporter(TRACE_FILE, TRACE_FORMAT)
+    db = create_db(create_schema=False, traced=bool(TRACE_FILE))
+    if GROUP_COMMIT_ENABLED:
+        db.enable_group_commit(GROUP_COMMIT_INTERVAL_MS,
+                               lock_timeout_ms=GROUP_COMMIT_LOCK_TIMEOUT_MS,
+                               result_timeout=GROUP_COMMIT_RESULT_TIMEOUT)
+    if DEPOSIT_CACHE_MAX_BYTES:
+        db.enable_deposit_cache(DEPOSIT_CACHE_MAX_BYTES)
+        follow_deposit_events(db.deposit_cache, shared_listener(DB_CONFIG))
+    # Хеширование паролей вне потоков запросов (пул процессов создается лениво)
+    password_hasher = PasswordHasher(PASSWORD_HASH_WORKERS, PASSWORD_HASH_MAX_PENDING)
+    response_cache = ResponseCache(RESPONSE_CACHE_MAX_ENTRIES) if RESPONSE_CACHE_ENABLED else None
+    if warm:
+        warmup()
+
+def create_app(init_schema: bool = True, warm: bool = True) -> Flask:
+    """
+    Приложение, готовое к приему запросов в текущем процессе.
+
+    Под pre-fork сервером вызывается в каждом воркере с init_schema=False
+    (см. wsgi.py): схему один раз обновляет мастер (gunicorn.conf.py).
+    """
+    if init_schema:
+        migrate()
+    init_worker(warm)
+    return app
+
 if __name__ == '__main__':
-    app.run(debug=True, port=5000)
\ No newline at end of file
+    # Сервер разработки; для продакшена: gunicorn -c gunicorn.conf.py wsgi:app
+    create_app().run(debug=True, port=5000)
\ No newline at end of file
@@ -0,0 +1,331 @@
+"""
+Генерация выписок клиентов за период (обычно - за месяц).
+
+Журнал вкладов и операций читается один раз: именованный (серверный)
+курсор отдает строки, упорядоченные по клиенту, а они собираются в
+пачки по несколько сотен клиентов. Пачки рендерятся (CSV/HTML/PDF) в
+пуле процессов. После каждой пачки, когда все предыдущие тоже готовы,
+в файл контрольной точки пишется последний обработанный клиент, и
+прерванный запуск продолжается с него.
+
+    python statements.py --month 2024-05 --out statements/2024-05
+    python statements.py --from 2024-05-01 --to 2024-05-31 --format csv --format pdf
+"""
+import argparse
+import csv
+import html
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from datetime import date, timedelta
+from decimal import Decimal
+from typing import Iterator, List, Optional
+
+import psycopg2
+
+from config import DB_CONFIG
+from database.interest import calculate_net_interest
+
+STATEMENT_FORMATS = ('csv', 'html', 'pdf')
+
+LEDGER_QUERY = """
+    SELECT c.id, c.full_name, c.email,
+           d.id, d.deposit_type, d.amount, d.interest_rate, d.open_date, d.close_date, d.status,
+           COALESCE(tx.items, '[]')
+    FROM {deposits} d
+    JOIN clients c ON c.id = d.client_id
+    LEFT JOIN LATERAL (
+        SELECT json_agg(json_build_object(
+                   'date', t.transaction_date, 'type', t.type,
+                   'amount', t.amount::text, 'description', t.description)
+                   ORDER BY t.transaction_date, t.id) AS items
+        FROM {transactions} t
+        WHERE t.deposit_id = d.id
+          AND t.transaction_date >= %(start)s AND t.transaction_date < %(end)s::date + 1
+    ) tx ON TRUE
+    WHERE d.client_id > %(after)s
+      AND d.status IN ('active', 'closed')
+      AND d.open_date <= %(end)s
+      AND (d.close_date IS NULL OR d.close_date >= %(start)s)
+    ORDER BY d.client_id, d.id
+"""
+
+
+# Есть ли в архиве вклады, действовавшие в периоде с %(start)s
+ARCHIVE_OVERLAP_QUERY = """
+    SELECT EXISTS (SELECT 1 FROM deposits_archive
+                   WHERE status = 'closed' AND close_date >= %(start)s)
+"""
+
+
+def ledger_tables(conn, start: date) -> dict:
+    """
+    Таблицы журнала для периода: если период начинается раньше даты
+    отсечки архива (archive_deposits.py), нужны представления all_*
+    """
+    with conn.cursor() as cur:
+        cur.execute(ARCHIVE_OVERLAP_QUERY, {'start': start})
+        overlaps = cur.fetchone()[0]
+    if overlaps:
+        return {'deposits': 'all_deposits', 'transactions': 'all_transactions'}
+    return {'deposits': 'deposits', 'transactions': 'transactions'}
+
+
+def month_period(month: str):
+    """'2024-05' -> (2024-05-01, 2024-05-31)"""
+    start = date.fromisoformat(f"{month}-01")
+    end = (start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return start, end
+
+
+def previous_month(today: Optional[date] = None) -> str:
+    first = (today or date.today()).replace(day=1)
+    return (first - timedelta(days=1)).strftime('%Y-%m')
+
+
+def deposit_entry(row, start: date, end: date) -> dict:
+    """Строка вклада в выписке: остатки на начало и конец, проценты за период"""
+    (_, _, _, dep_id, dep_type, amount, rate, open_date, close_date, status, items) = row
+    closed_at = close_date if status == 'closed' else None
+    opening = amount if open_date < start and (closed_at is None or closed_at >= start) else Decimal(0)
+    closing = amount if closed_at is None or closed_at > end else Decimal(0)
+    # Проценты за часть периода, в которую вклад был открыт (последний день включительно)
+    period_close = end + timedelta(days=1)
+    accrual_end = min(period_close, closed_at) if closed_at else period_close
+    accrued = calculate_net_interest(amount, rate, max(open_date, start), 'active', None,
+                                     today=accrual_end)
+    return {
+        'id': dep_id, 'type': dep_type, 'amount': amount, 'rate': rate,
+        'open_date': open_date, 'close_date': close_date, 'status': status,
+        'opening': opening, 'closing': closing, 'accrued': accrued,
+        'transactions': [dict(item, amount=Decimal(item['amount'])) for item in items],
+    }
+
+
+def iter_statements(conn, start: date, end: date, after_client: int = 0,
+                    itersize: int = 2000) -> Iterator[dict]:
+    """Выписки клиентов по порядку id - за один проход по журналу"""
+    tables = ledger_tables(conn, start)
+    with conn.cursor(name='statement_ledger') as cur:
+        cur.itersize = itersize
+        cur.execute(LEDGER_QUERY.format(**tables),
+                    {'start': start, 'end': end, 'after': after_client})
+        statement = None
+        for row in cur:
+            client_id = row[0]
+            if statement is None or statement['client_id'] != client_id:
+                if statement is not None:
+                    yield finish_statement(statement)
+                statement = {'client_id': client_id, 'full_name': row[1], 'email': row[2],
+                             'period_start': start, 'period_end': end, 'deposits': []}
+            statement['deposits'].append(deposit_entry(row, start, end))
+        if statement is not None:
+            yield finish_statement(statement)
+
+
+def finish_statement(statement: dict) -> dict:
+    for key in ('opening', 'closing', 'accrued'):
+        statement[f'total_{key}'] = sum((d[key] for d in statement['deposits']), Decimal(0))
+    return statement
+
+
+def iter_batches(statements: Iterator[dict], batch_size: int) -> Iterator[List[dict]]:
+    batch = []
+    for statement in statements:
+        batch.append(statement)
+        if len(batch) >= batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+# --- РЕНДЕРИНГ (выполняется в процессах пула) ---
+
+def render_csv(statement: dict, path: str):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(['Клиент', statement['full_name'], statement['email']])
+        writer.writerow(['Период', statement['period_start'], statement['period_end']])
+        writer.writerow([])
+        writer.writerow(['Вклад', 'Тип', 'Ставка', 'Остаток на начало', 'Остаток на конец',
+                         'Проценты за период', 'Дата операции', 'Операция', 'Сумма', 'Описание'])
+        for d in statement['deposits']:
+            writer.writerow([d['id'], d['type'], d['rate'], d['opening'], d['closing'], d['accrued']])
+            for t in d['transactions']:
+                writer.writerow(['', '', '', '', '', '', t['date'], t['type'], t['amount'],
+                                 t['description'] or ''])
+        writer.writerow(['Итого', '', '', statement['total_opening'], statement['total_closing'],
+                         statement['total_accrued']])
+
+
+def render_html(statement: dict, path: str):
+    esc = lambda value: html.escape(str(value if value is not None else ''))
+    rows = []
+    for d in statement['deposits']:
+        rows.append(f"<tr><td>{esc(d['id'])}</td><td>{esc(d['type'])}</td><td>{esc(d['rate'])}%</td>"
+                    f"<td>{d['opening']:,.2f}</td><td>{d['closing']:,.2f}</td>"
+                    f"<td>{d['accrued']:,.2f}</td></tr>")
+        for t in d['transactions']:
+            rows.append(f"<tr class='tx'><td></td><td colspan='2'>{esc(t['date'])}</td>"
+                        f"<td>{esc(t['type'])}</td><td>{t['amount']:,.2f}</td>"
+                        f"<td>{esc(t['description'])}</td></tr>")
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(f"""<!DOCTYPE html>
+<html lang="ru"><head><meta charset="utf-8"><title>Выписка {esc(statement['full_name'])}</title>
+<style>table{{border-collapse:collapse}}td,th{{border:1px solid #ccc;padding:4px 8px}}.tx{{color:#555}}</style>
+</head><body>
+<h2>Выписка по вкладам: {esc(statement['full_name'])}</h2>
+<p>Период: {statement['period_start']} — {statement['period_end']}</p>
+<table>
+<tr><th>Вклад</th><th>Тип</th><th>Ставка</th><th>На начало</th><th>На конец</th><th>Проценты</th></tr>
+{''.join(rows)}
+<tr><th colspan="3">Итого</th><th>{statement['total_opening']:,.2f}</th>
+<th>{statement['total_closing']:,.2f}</th><th>{statement['total_accrued']:,.2f}</th></tr>
+</table></body></html>
+""")
+
+
+def render_pdf(statement: dict, path: str):
+    # reportlab нужен только для PDF
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    pdf = canvas.Canvas(path, pagesize=A4)
+    _, height = A4
+    y = height - 50
+
+    def line(text, indent=0):
+        nonlocal y
+        if y < 50:
+            pdf.showPage()
+            y = height - 50
+        pdf.drawString(50 + indent, y, text)
+        y -= 16
+
+    line(f"Statement: {statement['full_name']} ({statement['email']})")
+    line(f"Period: {statement['period_start']} - {statement['period_end']}")
+    for d in statement['deposits']:
+        line(f"#{d['id']} {d['type']} {d['rate']}%: opening {d['opening']:,.2f}, "
+             f"closing {d['closing']:,.2f}, interest {d['accrued']:,.2f}")
+        for t in d['transactions']:
+            line(f"{t['date']} {t['type']} {t['amount']:,.2f}", indent=20)
+    line(f"Total: opening {statement['total_opening']:,.2f}, closing {statement['total_closing']:,.2f}, "
+         f"interest {statement['total_accrued']:,.2f}")
+    pdf.save()
+
+
+RENDERERS = {'csv': render_csv, 'html': render_html, 'pdf': render_pdf}
+
+
+def render_batch(statements: List[dict], out_dir: str, formats: List[str]) -> int:
+    for statement in statements:
+        for fmt in formats:
+            path = os.path.join(out_dir, f"client_{statement['client_id']}.{fmt}")
+            RENDERERS[fmt](statement, path + '.tmp')
+            os.replace(path + '.tmp', path)
+    return len(statements)
+
+
+# --- КОНТРОЛЬНАЯ ТОЧКА ---
+
+def load_checkpoint(path: str, start: date, end: date) -> int:
+    """Последний клиент, для которого выписки готовы (0 - начать сначала)"""
+    if not os.path.exists(path):
+        return 0
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    if data.get('period_start') != str(start) or data.get('period_end') != str(end):
+        return 0
+    return data['last_client_id']
+
+
+def save_checkpoint(path: str, start: date, end: date, last_client_id: int):
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump({'period_start': str(start), 'period_end': str(end),
+                   'last_client_id': last_client_id}, f)
+    os.replace(path + '.tmp', path)
+
+
+def generate_statements(start: date, end: date, out_dir: str, formats: List[str],
+                        db_config: dict = DB_CONFIG, batch_size: int = 200,
+                        workers: int = 4, restart: bool = False) -> int:
+    """Выписки всех клиентов за период; возвращает число выписок за этот запуск"""
+    os.makedirs(out_dir, exist_ok=True)
+    checkpoint = os.path.join(out_dir, 'checkpoint.json')
+    after_client = 0 if restart else load_checkpoint(checkpoint, start, end)
+
+    generated = 0
+    conn = psycopg2.connect(**db_config)
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            in_flight = {}   # future -> номер пачки
+            last_ids = {}    # номер пачки -> последний клиент пачки
+            done = set()
+            next_to_commit = 0
+
+            def collect(futures):
+                nonlocal generated, next_to_commit
+                for future in futures:
+                    generated += future.result()
+                    done.add(in_flight.pop(future))
+                # Контрольная точка двигается только по непрерывному префиксу пачек
+                committed = None
+                while next_to_commit in done:
+                    done.discard(next_to_commit)
+                    committed = last_ids.pop(next_to_commit)
+                    next_to_commit += 1
+                if committed is not None:
+                    save_checkpoint(checkpoint, start, end, committed)
+
+            statements = iter_statements(conn, start, end, after_client)
+            for index, batch in enumerate(iter_batches(statements, batch_size)):
+                # Не читаем журнал сильно быстрее, чем успевают рендерить
+                while len(in_flight) >= workers * 2:
+                    finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                    collect(finished)
+                last_ids[index] = batch[-1]['client_id']
+                in_flight[pool.submit(render_batch, batch, out_dir, formats)] = index
+            while in_flight:
+                finished, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                collect(finished)
+        conn.commit()
+    finally:
+        conn.close()
+    return generated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выписки клиентов за период")
+    parser.add_argument("--month", help="месяц ГГГГ-ММ (по умолчанию прошлый)")
+    parser.add_argument("--from", dest="date_from", type=date.fromisoformat)
+    parser.add_argument("--to", dest="date_to", type=date.fromisoformat)
+    parser.add_argument("--format", action="append", choices=STATEMENT_FORMATS,
+                        help="можно указать несколько раз (по умолчанию html)")
+    parser.add_argument("--out", help="каталог для выписок")
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4)
+    parser.add_argument("--restart", action="store_true",
+                        help="игнорировать контрольную точку")
+    args = parser.parse_args()
+
+    if args.date_from or args.date_to:
+        if not (args.date_from and args.date_to):
+            parser.error("--from и --to указываются вместе")
+        start, end = args.date_from, args.date_to
+        label = f"{start}_{end}"
+    else:
+        label = args.month or previous_month()
+        start, end = month_period(label)
+
+    out_dir = args.out or os.path.join("statements", label)
+    started = time.perf_counter()
+    count = generate_statements(start, end, out_dir, args.format or ['html'],
+                                batch_size=args.batch_size, workers=args.workers,
+                                restart=args.restart)
+    print(f"Выписок: {count} за {time.perf_counter() - started:.1f} с -> {out_dir}")
+
+
+if __name__ == "__main__":
+    main()
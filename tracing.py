@@ -0,0 +1,257 @@
+"""
+Трассировка запросов: маршрут Flask -> метод DatabaseManager -> SQL.
+
+Каждый запрос получает идентификатор трассы (X-Request-ID: входящий или
+новый), который возвращается в заголовке ответа. Спаны хранят длительность,
+число строк и SQL-шаблон с плейсхолдерами (значения параметров не пишутся).
+Готовая трасса уходит в очередь, а фоновый поток дописывает ее в файл:
+JSONL (спан на строку) или OTLP/JSON (ExportTraceServiceRequest на строку).
+
+SQL-спаны создает курсор TracingCursor: он передается как cursor_factory в
+параметрах подключения, поэтому охватывает основное соединение, пулы и
+писатель групповой фиксации без изменений в DatabaseManager.
+"""
+import contextvars
+import functools
+import inspect
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+from collections import Counter
+from typing import Optional
+
+from psycopg2.extensions import cursor as base_cursor
+
+# Текущий спан (родитель для вложенных)
+_current_span = contextvars.ContextVar('trace_span', default=None)
+
+SQL_MAX_LENGTH = 2000
+# Чужой X-Request-ID, не ставший идентификатором трассы, хранится обрезанным
+REQUEST_ID_MAX_LENGTH = 128
+
+
+class Trace:
+    def __init__(self, trace_id: str):
+        self.trace_id = trace_id
+        self.spans = []
+
+
+class Span:
+    def __init__(self, trace: Trace, name: str, kind: str, parent: Optional['Span'] = None,
+                 attributes: Optional[dict] = None):
+        self.trace = trace
+        self.name = name
+        self.kind = kind
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+
+    def end(self, error: Optional[BaseException] = None):
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+        self.trace.spans.append(self)
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1e6
+
+    def to_jsonl(self) -> dict:
+        return {
+            'trace_id': self.trace.trace_id, 'span_id': self.span_id, 'parent_id': self.parent_id,
+            'name': self.name, 'kind': self.kind, 'start_ns': self.start_ns,
+            'duration_ms': round(self.duration_ms, 3), 'attributes': self.attributes,
+            'error': self.error,
+        }
+
+    def to_otlp(self) -> dict:
+        def value(v):
+            if isinstance(v, bool):
+                return {'boolValue': v}
+            if isinstance(v, int):
+                return {'intValue': str(v)}
+            if isinstance(v, float):
+                return {'doubleValue': v}
+            return {'stringValue': str(v)}
+
+        span = {
+            'traceId': self.trace.trace_id, 'spanId': self.span_id, 'name': self.name,
+            'kind': 2 if self.kind == 'server' else (3 if self.kind == 'client' else 1),
+            'startTimeUnixNano': str(self.start_ns), 'endTimeUnixNano': str(self.end_ns),
+            'attributes': [{'key': k, 'value': value(v)} for k, v in self.attributes.items()],
+            'status': {'code': 2, 'message': self.error} if self.error else {'code': 1},
+        }
+        if self.parent_id:
+            span['parentSpanId'] = self.parent_id
+        return span
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_trace(name: str, request_id: Optional[str] = None, **attributes):
+    """
+    Корневой спан новой трассы; возвращает (спан, токен контекста).
+    Входящий request_id становится идентификатором трассы, если приводится
+    к 32 hex-символам (например, UUID с дефисами); иначе трасса получает
+    новый идентификатор, а исходный сохраняется в атрибуте request.id.
+    """
+    trace_id = _normalize_trace_id(request_id) if request_id else None
+    if trace_id is None:
+        trace_id = uuid.uuid4().hex
+        if request_id:
+            attributes['request.id'] = request_id[:REQUEST_ID_MAX_LENGTH]
+    span = Span(Trace(trace_id), name, 'server', attributes=attributes)
+    return span, _current_span.set(span)
+
+
+def _normalize_trace_id(value: str) -> Optional[str]:
+    """Идентификатор трассы OTLP (32 hex-символа в нижнем регистре) или None"""
+    value = value.strip().replace('-', '').lower()
+    if len(value) == 32 and all(c in '0123456789abcdef' for c in value) and value != '0' * 32:
+        return value
+    return None
+
+
+def finish_trace(span: Span, token, error: Optional[BaseException] = None) -> Trace:
+    """Завершение корневого спана и сводка по SQL (видно N+1)"""
+    _current_span.reset(token)
+    statements = Counter(s.attributes.get('db.statement') for s in span.trace.spans if s.kind == 'client')
+    span.attributes['sql.count'] = sum(statements.values())
+    span.attributes['sql.distinct'] = len(statements)
+    span.attributes['sql.max_repeats'] = max(statements.values(), default=0)
+    span.end(error)
+    return span.trace
+
+
+class child_span:
+    """Вложенный спан текущей трассы (без трассы - ничего не делает)"""
+
+    def __init__(self, name: str, kind: str = 'internal', **attributes):
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.span = None
+        self.token = None
+
+    def __enter__(self):
+        parent = _current_span.get()
+        if parent is not None:
+            self.span = Span(parent.trace, self.name, self.kind, parent, self.attributes)
+            self.token = _current_span.set(self.span)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self.span is not None:
+            _current_span.reset(self.token)
+            self.span.end(exc)
+        return False
+
+
+class TracingCursor(base_cursor):
+    """Курсор psycopg2, создающий спан на каждый execute/executemany/copy_expert"""
+
+    def _span(self, query):
+        statement = query if isinstance(query, str) else (
+            query.decode('utf-8', 'replace') if isinstance(query, bytes) else repr(query))
+        return child_span('sql', 'client', **{
+            'db.system': 'postgresql',
+            'db.statement': " ".join(statement.split())[:SQL_MAX_LENGTH],
+        })
+
+    def execute(self, query, vars=None):
+        with self._span(query) as span:
+            result = super().execute(query, vars)
+            if span is not None:
+                span.attributes['db.rows'] = self.rowcount
+            return result
+
+    def executemany(self, query, vars_list):
+        with self._span(query) as span:
+            result = super().executemany(query, vars_list)
+            if span is not None:
+                span.attributes['db.rows'] = self.rowcount
+            return result
+
+    def copy_expert(self, sql, file, size=8192):
+        with self._span(sql):
+            return super().copy_expert(sql, file, size)
+
+
+def traced_config(db_config: dict) -> dict:
+    """Параметры подключения, в которых курсоры создают SQL-спаны"""
+    return dict(db_config, cursor_factory=TracingCursor)
+
+
+def instrument_methods(obj, prefix: str, exclude=()):
+    """Спан на каждый публичный метод объекта (подмена на уровне экземпляра)"""
+    for name, attr in inspect.getmembers(type(obj)):
+        if name.startswith('_') or name in exclude or not inspect.isfunction(attr):
+            continue
+        method = getattr(obj, name)
+
+        def make_wrapper(method, span_name):
+            @functools.wraps(method)
+            def wrapper(*args, **kwargs):
+                with child_span(span_name):
+                    return method(*args, **kwargs)
+            return wrapper
+
+        setattr(obj, name, make_wrapper(method, f"{prefix}.{name}"))
+
+
+class TraceExporter:
+    """Фоновая запись трасс в файл (JSONL или OTLP/JSON)"""
+
+    def __init__(self, path: str, fmt: str = 'jsonl', service_name: str = 'deposit-server',
+                 max_queue: int = 10000):
+        if fmt not in ('jsonl', 'otlp'):
+            raise ValueError(f"Неизвестный формат трасс: {fmt}")
+        self.path = path
+        self.fmt = fmt
+        self.service_name = service_name
+        self._queue = queue.Queue(max_queue)
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, trace: Trace):
+        # Поток запроса не ждет записи: при переполненной очереди трасса теряется
+        try:
+            self._queue.put_nowait(trace)
+        except queue.Full:
+            self.dropped += 1
+
+    def _lines(self, trace: Trace):
+        if self.fmt == 'jsonl':
+            return [json.dumps(span.to_jsonl(), ensure_ascii=False) for span in trace.spans]
+        return [json.dumps({'resourceSpans': [{
+            'resource': {'attributes': [{'key': 'service.name',
+                                         'value': {'stringValue': self.service_name}}]},
+            'scopeSpans': [{'scope': {'name': 'tracing'},
+                            'spans': [span.to_otlp() for span in trace.spans]}],
+        }]}, ensure_ascii=False)]
+
+    def _run(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(self.path, 'a', encoding='utf-8') as f:
+            while True:
+                trace = self._queue.get()
+                f.write("\n".join(self._lines(trace)) + "\n")
+                # Пишем пачкой все, что накопилось, и сбрасываем буфер
+                while True:
+                    try:
+                        trace = self._queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    f.write("\n".join(self._lines(trace)) + "\n")
+                f.flush()
@@ -0,0 +1,12 @@
+"""
+Точка входа WSGI для pre-fork сервера.
+
+Модуль импортируется в каждом воркере уже после fork (preload_app
+выключен), поэтому соединения, пулы и потоки у каждого воркера свои.
+Схему заранее обновляет мастер (on_starting в gunicorn.conf.py).
+
+    gunicorn -c gunicorn.conf.py wsgi:app
+"""
+from server import create_app
+
+app = create_app(init_schema=False)